@@ -2,6 +2,8 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import NUMERIC
+from sqlalchemy_utils import UUIDType
 
 from alembic import context
 
@@ -30,6 +32,15 @@ target_metadata = SQLModel.metadata
 # ... etc.
 
 
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    """SQLite reflects the BINARY(16) of the binary UUIDType columns as NUMERIC(16), which isn't a change"""
+    if isinstance(metadata_type, UUIDType) and metadata_type.binary and isinstance(inspected_type, NUMERIC):
+        return inspected_type.precision != 16
+
+    # the default comparison
+    return None
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -67,12 +78,25 @@ def run_migrations_online() -> None:
     connectable = engine
 
     with connectable.connect() as connection:
+        sqlite = connection.dialect.name == "sqlite"
+        if sqlite:
+            # batch mode recreates tables, which fails while rows in other tables reference them if foreign keys
+            # are enforced, so check them once the migrations are done instead
+            connection.exec_driver_sql("pragma foreign_keys=OFF")
+            connection.commit()
+
         context.configure(
-            connection=connection, target_metadata=target_metadata, render_as_batch=True
+            connection=connection, target_metadata=target_metadata, render_as_batch=True, compare_type=compare_type
         )
 
         with context.begin_transaction():
             context.run_migrations()
+            if sqlite and connection.exec_driver_sql("pragma foreign_key_check").first() is not None:
+                raise RuntimeError("Migrations left rows that violate foreign key constraints")
+
+        if sqlite:
+            connection.exec_driver_sql("pragma foreign_keys=ON")
+            connection.commit()
 
 
 if context.is_offline_mode():
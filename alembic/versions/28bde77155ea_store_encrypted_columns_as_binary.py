@@ -0,0 +1,102 @@
+"""store encrypted columns as binary
+
+Revision ID: 28bde77155ea
+Revises: b83fb7a90c1c
+Create Date: 2026-10-19 18:01:09.328597
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+from tinymotion_backend.core.encryption import decrypt_column_value, encrypt_column_value_legacy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '28bde77155ea'
+down_revision: Union[str, None] = 'b83fb7a90c1c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# encrypted columns of each table, with the table's primary key
+ENCRYPTED_COLUMNS = {
+    'user': ('user_id', ['email', 'access_key']),
+    'infant': ('infant_id', ['full_name', 'nhi_number', 'birth_date', 'due_date']),
+    'consent': ('consent_id', ['consent_giver_name', 'consent_giver_email']),
+}
+
+# number of rows to convert at a time when downgrading
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    # existing values keep their format (base64 text, now stored as bytes), which can still be read, and are
+    # replaced with the new format as rows are updated
+    for table_name, (_, columns) in ENCRYPTED_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.VARCHAR(),
+                    type_=sa.LargeBinary(),
+                    postgresql_using=f"convert_to({column}, 'UTF8')",
+                )
+
+
+def reencrypt_legacy(table_name: str, key_column: str, columns: list[str]) -> None:
+    """Rewrite every value in the legacy format, in batches ordered by primary key"""
+    if context.is_offline_mode():
+        # the values are re-encrypted with the key, which an SQL script can't do
+        op.execute(f"-- {table_name} values are not converted back to the legacy format, "
+                   f"run this downgrade online on a database that has any rows")
+        return
+
+    table = sa.table(
+        table_name,
+        sa.column(key_column, sqlalchemy_utils.types.uuid.UUIDType(binary=False)),
+        *[sa.column(column, sa.LargeBinary()) for column in columns],
+    )
+    update = (
+        table.update()
+        .where(table.c[key_column] == sa.bindparam("_key"))
+        .values({column: sa.bindparam(f"_{column}") for column in columns})
+    )
+
+    connection = op.get_bind()
+    last_key = None
+    while True:
+        query = sa.select(table).order_by(table.c[key_column]).limit(BATCH_SIZE)
+        if last_key is not None:
+            query = query.where(table.c[key_column] > last_key)
+        rows = connection.execute(query).mappings().all()
+        if not len(rows):
+            break
+
+        connection.execute(update, [
+            {
+                "_key": row[key_column],
+                **{
+                    f"_{column}": None if row[column] is None else
+                    encrypt_column_value_legacy(decrypt_column_value(row[column])).encode("ascii")
+                    for column in columns
+                },
+            }
+            for row in rows
+        ])
+        last_key = rows[-1][key_column]
+
+
+def downgrade() -> None:
+    for table_name, (key_column, columns) in ENCRYPTED_COLUMNS.items():
+        reencrypt_legacy(table_name, key_column, columns)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.LargeBinary(),
+                    type_=sa.VARCHAR(),
+                    postgresql_using=f"convert_from({column}, 'UTF8')",
+                )
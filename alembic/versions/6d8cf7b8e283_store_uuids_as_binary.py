@@ -0,0 +1,101 @@
+"""store uuids as binary
+
+Revision ID: 6d8cf7b8e283
+Revises: 18c65669be67
+Create Date: 2026-10-19 18:37:27.228991
+
+"""
+import uuid
+from typing import Callable, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d8cf7b8e283'
+down_revision: Union[str, None] = '18c65669be67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# uuid columns of each table, primary key first
+UUID_COLUMNS = {
+    'user': ['user_id'],
+    'infant': ['infant_id', 'created_by'],
+    'consent': ['consent_id', 'infant_id', 'created_by'],
+    'video': ['video_id', 'infant_id', 'created_by'],
+}
+
+# the column referenced by each foreign key column
+FOREIGN_KEYS = {
+    'infant_id': 'infant.infant_id',
+    'created_by': 'user.user_id',
+}
+
+# number of rows to convert at a time
+BATCH_SIZE = 1000
+
+
+def convert_values(table_name: str, columns: list[str], convert: Callable[[bytes | str], bytes | str]) -> None:
+    """Rewrite the uuids of every row with `convert`, in batches ordered by rowid (which updates don't change)"""
+    table = sa.table(table_name, *[sa.column(column) for column in columns])
+    rowid = sa.literal_column('rowid')
+    update = (
+        table.update()
+        .where(rowid == sa.bindparam('_rowid'))
+        .values({column: sa.bindparam(f'_{column}') for column in columns})
+    )
+
+    connection = op.get_bind()
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            sa.select(rowid, *table.c).where(rowid > last_rowid).order_by(rowid).limit(BATCH_SIZE)
+        ).all()
+        if not len(rows):
+            break
+
+        connection.execute(update, [
+            {
+                '_rowid': row[0],
+                **{f'_{column}': None if value is None else convert(value) for column, value in zip(columns, row[1:])},
+            }
+            for row in rows
+        ])
+        last_rowid = rows[-1][0]
+
+
+def alter_types(type_: sa.types.TypeEngine) -> None:
+    for table_name, columns in UUID_COLUMNS.items():
+        # the columns are reflected with the new type, so that batch mode copies the values to the new table as
+        # they are, rather than CASTing them to the new type (which gives BINARY(16) numeric affinity on SQLite);
+        # this replaces the reflected foreign keys too, so they are given again
+        reflect_args = [sa.Column(columns[0], type_, primary_key=True, nullable=False)] + [
+            sa.Column(column, type_, sa.ForeignKey(FOREIGN_KEYS[column]), nullable=False) for column in columns[1:]
+        ]
+        with op.batch_alter_table(table_name, schema=None, reflect_args=reflect_args) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=type_, existing_nullable=False)
+
+
+def upgrade() -> None:
+    # PostgreSQL already stores them with its native uuid type, whether binary or not
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # the values are converted while the columns still have text affinity, so SQLite keeps them as blobs
+    for table_name, columns in UUID_COLUMNS.items():
+        convert_values(table_name, columns, lambda value: uuid.UUID(value).bytes)
+    alter_types(sqlalchemy_utils.types.uuid.UUIDType(binary=True))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # the reverse order, so the hex strings are never stored in a column with numeric affinity
+    alter_types(sa.CHAR(length=32))
+    for table_name, columns in UUID_COLUMNS.items():
+        convert_values(table_name, columns, lambda value: uuid.UUID(bytes=value).hex)
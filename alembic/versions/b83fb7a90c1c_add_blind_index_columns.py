@@ -0,0 +1,104 @@
+"""add blind index columns
+
+Revision ID: b83fb7a90c1c
+Revises: 3faaf18c4161
+Create Date: 2026-10-19 17:57:35.139176
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy_utils import StringEncryptedType, UUIDType
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.blind_index import blind_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83fb7a90c1c'
+down_revision: Union[str, None] = '3faaf18c4161'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# number of rows to read and update at a time while filling in the blind indexes
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_blind_index(table_name: str, key_column: str, column: str, index_column: str) -> None:
+    """Compute the blind index of every existing row, in batches ordered by primary key"""
+    if context.is_offline_mode():
+        # the blind indexes are computed with the key, which an SQL script can't do, so the script only works on
+        # empty tables (otherwise it stops at making the column required)
+        op.execute(f"-- {table_name}.{index_column} is not filled in for existing rows, "
+                   f"run this migration online on a database that has any")
+        return
+
+    table = sa.table(
+        table_name,
+        sa.column(key_column, UUIDType(binary=False)),
+        sa.column(column, StringEncryptedType(
+            sa.VARCHAR,
+            settings.DATABASE_SECRET_KEY,
+            AesEngine,
+            'pkcs5',
+        )),
+        sa.column(index_column, sa.String(length=64)),
+    )
+    update = (
+        table.update()
+        .where(table.c[key_column] == sa.bindparam("_key"))
+        .values({index_column: sa.bindparam("_index")})
+    )
+
+    connection = op.get_bind()
+    last_key = None
+    while True:
+        query = sa.select(table.c[key_column], table.c[column]).order_by(table.c[key_column]).limit(BACKFILL_BATCH_SIZE)
+        if last_key is not None:
+            query = query.where(table.c[key_column] > last_key)
+        rows = connection.execute(query).all()
+        if not len(rows):
+            break
+
+        connection.execute(update, [{"_key": key, "_index": blind_index(value)} for key, value in rows])
+        last_key = rows[-1][0]
+
+
+def upgrade() -> None:
+    # add the columns as nullable, fill them in, then make them required and unique
+    with op.batch_alter_table('infant', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nhi_number_bidx', sa.String(length=64), nullable=True))
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('access_key_bidx', sa.String(length=64), nullable=True))
+
+    backfill_blind_index('infant', 'infant_id', 'nhi_number', 'nhi_number_bidx')
+    backfill_blind_index('user', 'user_id', 'access_key', 'access_key_bidx')
+
+    # lookups and uniqueness now use the blind indexes instead of the encrypted columns
+    with op.batch_alter_table('infant', schema=None) as batch_op:
+        batch_op.alter_column('nhi_number_bidx', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_index(batch_op.f('ix_infant_nhi_number'))
+        batch_op.create_index(batch_op.f('ix_infant_nhi_number_bidx'), ['nhi_number_bidx'], unique=True)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('access_key_bidx', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_index(batch_op.f('ix_user_access_key'))
+        batch_op.create_index(batch_op.f('ix_user_access_key_bidx'), ['access_key_bidx'], unique=True)
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_access_key_bidx'))
+        batch_op.create_index(batch_op.f('ix_user_access_key'), ['access_key'], unique=1)
+        batch_op.drop_column('access_key_bidx')
+
+    with op.batch_alter_table('infant', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_infant_nhi_number_bidx'))
+        batch_op.create_index(batch_op.f('ix_infant_nhi_number'), ['nhi_number'], unique=1)
+        batch_op.drop_column('nhi_number_bidx')
+
+    # ### end Alembic commands ###
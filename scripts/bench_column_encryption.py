@@ -0,0 +1,107 @@
+"""
+Benchmark encrypting and decrypting database columns with the previous
+column type (sqlalchemy_utils' StringEncryptedType with AesEngine) and the
+current one (EncryptedString), both per value and when listing rows with
+several encrypted columns from an SQLite database. The current type is also
+run with the decrypt cache enabled, where the rows are listed twice and the
+second (cached) listing is timed.
+
+    python scripts/bench_column_encryption.py --rows 100000
+
+"""
+import time
+import secrets
+
+import click
+import sqlalchemy
+from sqlalchemy_utils import StringEncryptedType
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.encryption import decrypt_cache
+from tinymotion_backend.models import EncryptedString
+
+
+COLUMNS = ["full_name", "nhi_number", "birth_date", "due_date"]
+
+
+def make_types() -> dict[str, sqlalchemy.types.TypeEngine]:
+    return {
+        "StringEncryptedType": StringEncryptedType(
+            sqlalchemy.VARCHAR,
+            settings.DATABASE_SECRET_KEY,
+            AesEngine,
+            'pkcs5',
+        ),
+        "EncryptedString": EncryptedString(),
+    }
+
+
+def bench_values(column_type, values: list[str]) -> tuple[float, float]:
+    start = time.perf_counter()
+    encrypted = [column_type.process_bind_param(value, None) for value in values]
+    encrypt_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in encrypted:
+        column_type.process_result_value(value, None)
+    decrypt_time = time.perf_counter() - start
+
+    return encrypt_time, decrypt_time
+
+
+def bench_rows(column_type, rows: list[dict], selects: int = 1) -> tuple[float, float]:
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata = sqlalchemy.MetaData()
+    table = sqlalchemy.Table(
+        "infant",
+        metadata,
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+        *[sqlalchemy.Column(column, column_type) for column in COLUMNS],
+    )
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        conn.execute(table.insert(), rows)
+        insert_time = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        for _ in range(selects):
+            start = time.perf_counter()
+            conn.execute(sqlalchemy.select(table)).all()
+            select_time = time.perf_counter() - start
+
+    engine.dispose()
+
+    return insert_time, select_time
+
+
+@click.command()
+@click.option("-n", "--rows", type=int, default=100000, show_default=True, help="Number of rows to list")
+def main(rows: int):
+    if settings.DATABASE_SECRET_KEY is None:
+        settings.DATABASE_SECRET_KEY = secrets.token_urlsafe()
+
+    values = [f"ABC{i:07d}" for i in range(rows)]
+    row_values = [
+        {"full_name": f"Infant {i}", "nhi_number": f"ABC{i:07d}", "birth_date": "2024-01-01", "due_date": "2024-02-01"}
+        for i in range(rows)
+    ]
+
+    click.echo(f"{rows} values / rows with {len(COLUMNS)} encrypted columns")
+    click.echo(f"{'type':>20} {'encrypt/s':>12} {'decrypt/s':>12} {'insert rows/s':>14} {'list rows/s':>12}")
+    for name, column_type in make_types().items():
+        encrypt_time, decrypt_time = bench_values(column_type, values)
+        insert_time, select_time = bench_rows(column_type, row_values)
+        click.echo(f"{name:>20} {rows / encrypt_time:>12.0f} {rows / decrypt_time:>12.0f} "
+                   f"{rows / insert_time:>14.0f} {rows / select_time:>12.0f}")
+
+    settings.DATABASE_DECRYPT_CACHE_SIZE = rows * len(COLUMNS)
+    insert_time, select_time = bench_rows(EncryptedString(), row_values, selects=2)
+    click.echo(f"{'(cached)':>20} {'':>12} {'':>12} {rows / insert_time:>14.0f} {rows / select_time:>12.0f}")
+    click.echo(f"decrypt cache: {decrypt_cache.info()}")
+
+
+if __name__ == "__main__":
+    main()
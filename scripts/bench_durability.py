@@ -0,0 +1,80 @@
+"""
+Benchmark the throughput of writing encrypted videos with each of the
+storage durability policies (settings.VIDEO_DURABILITY), with and without
+preallocation, and the rate of small SQLite commits in WAL mode with each
+`synchronous` setting (settings.DATABASE_SQLITE_SYNCHRONOUS).
+
+Run against the volume that will hold the data, since the cost of fsync
+depends on it, e.g.:
+
+    python scripts/bench_durability.py --directory /data/bench --size-mb 100 --count 5
+
+"""
+import io
+import os
+import time
+import sqlite3
+import tempfile
+
+import click
+from cryptography.fernet import Fernet
+
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.encryption import encrypt_file
+
+
+@click.command()
+@click.option("-d", "--directory", type=click.Path(file_okay=False), default=None,
+              help="Directory to write the test files to (default: a temporary directory)")
+@click.option("-s", "--size-mb", type=int, default=50, show_default=True, help="Size of each test file in MB")
+@click.option("-n", "--count", type=int, default=5, show_default=True, help="Number of files to write per mode")
+@click.option("-c", "--commits", type=int, default=500, show_default=True,
+              help="Number of SQLite commits per synchronous setting")
+def main(directory: str | None, size_mb: int, count: int, commits: int):
+    if settings.VIDEO_SECRET_KEY is None:
+        settings.VIDEO_SECRET_KEY = Fernet.generate_key().decode("ascii")
+
+    content = os.urandom(size_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        click.echo(f"Writing {count} x {size_mb} MB files to {tmp_dir}")
+        click.echo(f"{'durability':>12} {'preallocate':>12} {'MB/s':>10} {'s/file':>10}")
+        for durability in ("none", "fsync", "fsync_dir"):
+            for preallocate in (False, True):
+                settings.VIDEO_DURABILITY = durability
+                settings.VIDEO_PREALLOCATE = preallocate
+
+                elapsed = 0.0
+                for i in range(count):
+                    output_path = os.path.join(tmp_dir, f"{durability}-{preallocate}-{i}.enc")
+                    start = time.perf_counter()
+                    encrypt_file(io.BytesIO(content), output_path, expected_size=len(content))
+                    elapsed += time.perf_counter() - start
+                    os.unlink(output_path)
+
+                click.echo(f"{durability:>12} {str(preallocate):>12} {size_mb * count / elapsed:>10.1f} "
+                           f"{elapsed / count:>10.3f}")
+
+        click.echo(f"Committing {commits} single-row SQLite transactions in WAL mode")
+        click.echo(f"{'synchronous':>12} {'commits/s':>12} {'ms/commit':>10}")
+        for synchronous in ("OFF", "NORMAL", "FULL"):
+            db_path = os.path.join(tmp_dir, f"bench-{synchronous}.db")
+            conn = sqlite3.connect(db_path, isolation_level=None)
+            conn.execute("pragma journal_mode=WAL")
+            conn.execute(f"pragma synchronous={synchronous}")
+            conn.execute("create table bench (id integer primary key, value blob)")
+            value = os.urandom(200)
+
+            start = time.perf_counter()
+            for _ in range(commits):
+                conn.execute("begin")
+                conn.execute("insert into bench (value) values (?)", (value,))
+                conn.execute("commit")
+            elapsed = time.perf_counter() - start
+            conn.close()
+
+            click.echo(f"{synchronous:>12} {commits / elapsed:>12.0f} {elapsed / commits * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
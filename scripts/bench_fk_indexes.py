@@ -0,0 +1,208 @@
+"""
+Benchmark the lookups by foreign key and the keyset pagination on a large
+synthetic SQLite database, with and without the foreign key and created_at
+indexes, and the cost of the indexes when inserting.
+
+    python scripts/bench_fk_indexes.py --infants 100000 --consents 2 --videos 8
+
+"""
+import os
+import time
+import uuid
+import random
+import datetime
+import tempfile
+
+import click
+import sqlalchemy
+from sqlmodel import SQLModel, select, func
+
+from tinymotion_backend import database
+from tinymotion_backend.models import Consent, Video
+
+
+# the indexes added for the foreign keys and pagination
+INDEXES = [
+    "ix_infant_created_by",
+    "ix_infant_created_at",
+    "ix_consent_infant_id",
+    "ix_consent_created_by",
+    "ix_consent_created_at",
+    "ix_video_infant_id",
+    "ix_video_created_by",
+    "ix_video_created_at",
+]
+
+INSERT_BATCH_SIZE = 10000
+
+
+def _timestamp(i: int) -> str:
+    created_at = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i)
+    return created_at.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _insert(conn, statement: str, rows) -> None:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            conn.exec_driver_sql(statement, batch)
+            batch = []
+    if len(batch):
+        conn.exec_driver_sql(statement, batch)
+
+
+def populate(engine, num_infants: int, consents_per_infant: int, videos_per_infant: int, num_users: int):
+    """Insert the synthetic rows directly, with placeholder bytes for the encrypted columns"""
+    users = [uuid.uuid4().bytes for _ in range(num_users)]
+    infants = [uuid.uuid4().bytes for _ in range(num_infants)]
+    with engine.begin() as conn:
+        _insert(conn, "insert into user (user_id, email, access_key, access_key_bidx) values (?, ?, ?, ?)", (
+            (user_id, b"x", b"x", user_id.hex()) for user_id in users
+        ))
+        _insert(conn, (
+            "insert into infant (infant_id, created_at, created_by, full_name, nhi_number, nhi_number_bidx, "
+            "birth_date, due_date) values (?, ?, ?, ?, ?, ?, ?, ?)"
+        ), (
+            (infant_id, _timestamp(i), random.choice(users), b"x", b"x", infant_id.hex(), b"x", b"x")
+            for i, infant_id in enumerate(infants)
+        ))
+        _insert(conn, (
+            "insert into consent (consent_id, infant_id, created_at, created_by, collected_physically) "
+            "values (?, ?, ?, ?, 1)"
+        ), (
+            (uuid.uuid4().bytes, random.choice(infants), _timestamp(i), random.choice(users))
+            for i in range(num_infants * consents_per_infant)
+        ))
+        _insert(conn, video_insert_statement(), video_rows(infants, users, num_infants * videos_per_infant))
+
+    return users, infants
+
+
+def video_insert_statement() -> str:
+    return (
+        "insert into video (video_id, infant_id, created_at, created_by, video_name, sha256sum, video_size, "
+        "storage_tier) values (?, ?, ?, ?, ?, ?, ?, 'hot')"
+    )
+
+
+def video_rows(infants: list[bytes], users: list[bytes], count: int):
+    for i in range(count):
+        video_id = uuid.uuid4()
+        yield video_id.bytes, random.choice(infants), _timestamp(i), random.choice(users), video_id.hex, "0" * 64, 1000
+
+
+def lookups(infant_ids: list[uuid.UUID], user_ids: list[uuid.UUID], video_cursors: list[tuple]) -> dict:
+    """The statements to time by name, one for each lookup"""
+    return {
+        "consents of infant": [
+            select(Consent.consent_id).where(Consent.infant_id == infant_id) for infant_id in infant_ids
+        ],
+        "videos of infant": [
+            select(Video.video_name).where(Video.infant_id == infant_id) for infant_id in infant_ids
+        ],
+        "recount infant": [
+            select(
+                select(func.count()).where(Consent.infant_id == infant_id).scalar_subquery(),
+                select(func.sum(Video.video_size)).where(Video.infant_id == infant_id).scalar_subquery(),
+            )
+            for infant_id in infant_ids
+        ],
+        "videos of user": [
+            select(func.count()).select_from(Video).where(Video.created_by == user_id) for user_id in user_ids
+        ],
+        "video page (keyset)": [
+            select(Video.video_id)
+            .where(sqlalchemy.tuple_(Video.created_at, Video.video_id) > sqlalchemy.tuple_(*cursor))
+            .order_by(Video.created_at, Video.video_id)
+            .limit(100)
+            for cursor in video_cursors
+        ],
+    }
+
+
+def time_lookups(engine, statements: dict) -> dict[str, float]:
+    """Mean time of each lookup, in milliseconds"""
+    timings = {}
+    with engine.connect() as conn:
+        for name, queries in statements.items():
+            start = time.perf_counter()
+            for query in queries:
+                conn.execute(query).all()
+            timings[name] = (time.perf_counter() - start) / len(queries) * 1000
+
+    return timings
+
+
+def time_inserts(engine, infants: list[bytes], users: list[bytes], count: int) -> float:
+    """Videos inserted per second"""
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        _insert(conn, video_insert_statement(), video_rows(infants, users, count))
+
+    return count / (time.perf_counter() - start)
+
+
+def drop_indexes(engine) -> None:
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.exec_driver_sql(f"drop index {name}")
+
+
+def create_indexes(engine) -> None:
+    indexes = {index.name: index for table in SQLModel.metadata.tables.values() for index in table.indexes}
+    with engine.begin() as conn:
+        for name in INDEXES:
+            indexes[name].create(conn)
+
+
+@click.command()
+@click.option("-i", "--infants", type=int, default=100000, show_default=True, help="Number of infants")
+@click.option("-c", "--consents", type=int, default=2, show_default=True, help="Number of consents per infant")
+@click.option("-v", "--videos", type=int, default=8, show_default=True, help="Number of videos per infant")
+@click.option("-u", "--users", type=int, default=20, show_default=True, help="Number of users")
+@click.option("-n", "--lookups", "num_lookups", type=int, default=50, show_default=True,
+              help="Number of times to run each lookup")
+@click.option("--inserts", type=int, default=20000, show_default=True,
+              help="Number of extra videos to insert to measure the write cost of the indexes")
+def main(infants: int, consents: int, videos: int, users: int, num_lookups: int, inserts: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        engine = database.create_db_engine(f"sqlite:///{db_path}")
+        SQLModel.metadata.create_all(engine)
+        drop_indexes(engine)
+
+        start = time.perf_counter()
+        user_ids, infant_ids = populate(engine, infants, consents, videos, users)
+        rows = len(user_ids) + infants * (1 + consents + videos)
+        click.echo(f"Inserted {rows} rows in {time.perf_counter() - start:.1f} s")
+
+        with engine.connect() as conn:
+            video_cursors = conn.execute(
+                select(Video.created_at, Video.video_id).order_by(func.random()).limit(num_lookups)
+            ).all()
+        statements = lookups(
+            [uuid.UUID(bytes=infant_id) for infant_id in random.sample(infant_ids, num_lookups)],
+            [uuid.UUID(bytes=random.choice(user_ids)) for _ in range(num_lookups)],
+            video_cursors,
+        )
+
+        without_indexes = time_lookups(engine, statements)
+        inserts_without_indexes = time_inserts(engine, infant_ids, user_ids, inserts)
+
+        start = time.perf_counter()
+        create_indexes(engine)
+        click.echo(f"Created the indexes in {time.perf_counter() - start:.1f} s")
+
+        with_indexes = time_lookups(engine, statements)
+        inserts_with_indexes = time_inserts(engine, infant_ids, user_ids, inserts)
+        engine.dispose()
+
+    click.echo(f"{'lookup':>22} {'no indexes (ms)':>16} {'indexes (ms)':>13}")
+    for name in statements:
+        click.echo(f"{name:>22} {without_indexes[name]:>16.3f} {with_indexes[name]:>13.3f}")
+    click.echo(f"{'video inserts/s':>22} {inserts_without_indexes:>16.0f} {inserts_with_indexes:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
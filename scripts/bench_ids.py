@@ -0,0 +1,119 @@
+"""
+Benchmark inserting videos with random (uuid4) or time-ordered (uuid7) ids
+into a growing SQLite database, in small transactions as the API does: the
+insert rate as the table grows, and the state of the primary key index
+afterwards (how full its pages are, and how many of them are out of order
+on disk).
+
+    python scripts/bench_ids.py --rows 1000000 --cache-kib 2000
+
+"""
+import os
+import time
+import uuid
+import tempfile
+import datetime
+from typing import Callable
+
+import click
+from sqlmodel import SQLModel
+
+from tinymotion_backend import database, models  # noqa: F401 (registers the tables)
+from tinymotion_backend.core import ids
+from tinymotion_backend.core.config import settings
+
+
+GENERATORS: dict[str, Callable[[], uuid.UUID]] = {
+    "uuid4": uuid.uuid4,
+    "uuid7": ids.uuid7,
+}
+
+# the automatic index of video's primary key
+PRIMARY_KEY_INDEX = "sqlite_autoindex_video_1"
+
+
+def insert_videos(
+    engine, new_id: Callable[[], uuid.UUID], rows: int, batch_size: int, report_every: int,
+) -> list[float]:
+    """Insert the videos, returning the insert rate (rows/s) of each `report_every` rows"""
+    user_id, infant_id = uuid.uuid4().bytes, uuid.uuid4().bytes
+    created_at = datetime.datetime(2024, 1, 1).strftime("%Y-%m-%d %H:%M:%S.%f")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "insert into user (user_id, email, access_key, access_key_bidx) values (?, ?, ?, ?)",
+            (user_id, b"x", b"x", user_id.hex()),
+        )
+        conn.exec_driver_sql(
+            "insert into infant (infant_id, created_at, created_by, full_name, nhi_number, nhi_number_bidx, "
+            "birth_date, due_date) values (?, ?, ?, ?, ?, ?, ?, ?)",
+            (infant_id, created_at, user_id, b"x", b"x", infant_id.hex(), b"x", b"x"),
+        )
+
+    statement = (
+        "insert into video (video_id, infant_id, created_at, created_by, video_name, sha256sum, video_size, "
+        "storage_tier) values (?, ?, ?, ?, ?, ?, ?, 'hot')"
+    )
+    rates = []
+    start = time.perf_counter()
+    for inserted in range(0, rows, batch_size):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(statement, [
+                (new_id().bytes, infant_id, created_at, user_id, str(uuid.uuid4()), "0" * 64, 1000)
+                for _ in range(batch_size)
+            ])
+        if (inserted + batch_size) % report_every == 0:
+            rates.append(report_every / (time.perf_counter() - start))
+            start = time.perf_counter()
+
+    return rates
+
+
+def index_stats(engine) -> dict[str, float]:
+    """Number of leaf pages of the primary key index, how full they are and how many are out of order in the file"""
+    with engine.connect() as conn:
+        pages = conn.exec_driver_sql(
+            "select pageno, pgsize, unused from dbstat where name = ? and pagetype = 'leaf' order by path",
+            (PRIMARY_KEY_INDEX,),
+        ).all()
+
+    # leaf pages (in key order) that are before the previous one in the file, i.e. scanning the index goes back
+    # and forth through the file. Pages of the other tables and indexes are interleaved with them either way.
+    out_of_order = sum(1 for previous, page in zip(pages, pages[1:]) if page.pageno < previous.pageno)
+    return {
+        "leaf pages": len(pages),
+        "fill (%)": 100 * sum(page.pgsize - page.unused for page in pages) / sum(page.pgsize for page in pages),
+        "out of order (%)": 100 * out_of_order / max(len(pages) - 1, 1),
+    }
+
+
+@click.command()
+@click.option("-r", "--rows", type=int, default=1000000, show_default=True, help="Number of videos to insert")
+@click.option("-b", "--batch-size", type=int, default=100, show_default=True, help="Videos per transaction")
+@click.option("--cache-kib", type=int, default=2000, show_default=True,
+              help="SQLite page cache size (memory mapping is disabled so that the cache is the limit)")
+def main(rows: int, batch_size: int, cache_kib: int):
+    settings.DATABASE_SQLITE_CACHE_SIZE = -cache_kib
+    settings.DATABASE_SQLITE_MMAP_SIZE = 0
+    report_every = max(rows // 5 // batch_size * batch_size, batch_size)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, new_id in GENERATORS.items():
+            engine = database.create_db_engine(f"sqlite:///{os.path.join(tmp_dir, name)}.db")
+            SQLModel.metadata.create_all(engine)
+
+            rates = insert_videos(engine, new_id, rows, batch_size, report_every)
+            results[name] = (rates, index_stats(engine))
+            engine.dispose()
+            click.echo(f"Inserted {rows} videos with {name} ids")
+
+    click.echo(f"{'':>24}" + "".join(f"{name:>10}" for name in results))
+    for i in range(len(results["uuid4"][0])):
+        label = f"inserts/s to {(i + 1) * report_every}"
+        click.echo(f"{label:>24}" + "".join(f"{rates[i]:>10.0f}" for rates, _ in results.values()))
+    for stat in results["uuid4"][1]:
+        click.echo(f"{'pk ' + stat:>24}" + "".join(f"{stats[stat]:>10.1f}" for _, stats in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark SQLite throughput with several processes reading and writing the
+same database file at once (like the gunicorn workers do), comparing the
+previous connection setup with the tuned pragmas from settings.
+
+    python scripts/bench_sqlite_contention.py --processes 4 --operations 500
+
+"""
+import os
+import time
+import tempfile
+import multiprocessing
+
+import click
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from tinymotion_backend import database
+from tinymotion_backend.core.config import settings
+
+
+PROFILES = {
+    # what the backend did before: rollback journal, sqlite defaults, python's 5 second busy timeout
+    "baseline": {
+        "DATABASE_SQLITE_JOURNAL_MODE": "DELETE",
+        "DATABASE_SQLITE_BUSY_TIMEOUT_MS": 5000,
+        "DATABASE_SQLITE_SYNCHRONOUS": "FULL",
+        "DATABASE_SQLITE_CACHE_SIZE": -2000,
+        "DATABASE_SQLITE_MMAP_SIZE": 0,
+        "DATABASE_SQLITE_TEMP_STORE": "DEFAULT",
+    },
+    # the defaults in settings
+    "tuned": {},
+}
+
+
+def _worker(db_path: str, profile: str, operations: int, read_ratio: int, results):
+    for key, value in PROFILES[profile].items():
+        setattr(settings, key, value)
+    engine = database.create_db_engine(f"sqlite:///{db_path}")
+
+    errors = 0
+    for i in range(operations):
+        try:
+            with engine.begin() as conn:
+                if i % (read_ratio + 1) == 0:
+                    conn.execute(text("insert into item (payload) values (:payload)"), {"payload": os.urandom(200)})
+                else:
+                    conn.execute(text("select count(*), max(id) from item")).one()
+        except OperationalError as exc:
+            if "database is locked" not in str(exc):
+                raise
+            errors += 1
+
+    engine.dispose()
+    results.put(errors)
+
+
+def run_profile(profile: str, processes: int, operations: int, read_ratio: int) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        for key, value in PROFILES[profile].items():
+            setattr(settings, key, value)
+        engine = database.create_db_engine(f"sqlite:///{db_path}")
+        with engine.begin() as conn:
+            conn.execute(text("create table item (id integer primary key, payload blob)"))
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_worker, args=(db_path, profile, operations, read_ratio, results))
+            for _ in range(processes)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        errors = sum(results.get() for _ in workers)
+
+    return processes * operations / elapsed, errors
+
+
+@click.command()
+@click.option("-p", "--processes", type=int, default=4, show_default=True, help="Number of concurrent processes")
+@click.option("-n", "--operations", type=int, default=500, show_default=True,
+              help="Number of transactions per process")
+@click.option("-r", "--read-ratio", type=int, default=4, show_default=True,
+              help="Number of read transactions per write transaction")
+def main(processes: int, operations: int, read_ratio: int):
+    defaults = {key: getattr(settings, key) for key in PROFILES["baseline"]}
+    click.echo(f"{processes} processes x {operations} transactions ({read_ratio} reads per write)")
+    click.echo(f"{'profile':>10} {'tx/s':>10} {'locked errors':>14}")
+    for profile in PROFILES:
+        for key, value in defaults.items():
+            setattr(settings, key, value)
+        throughput, errors = run_profile(profile, processes, operations, read_ratio)
+        click.echo(f"{profile:>10} {throughput:>10.0f} {errors:>14}")
+
+
+if __name__ == "__main__":
+    main()
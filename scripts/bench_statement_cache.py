@@ -0,0 +1,107 @@
+"""
+Benchmark the per-call overhead of the hot lookups (by NHI number, by access
+key and by primary key) with and without SQLAlchemy's compiled statement
+cache, and with the statements built once (see `LookupStatement`).
+
+Before `DateTimeAware` was marked `cache_ok`, the statements comparing
+against a created_at (such as the keyset pages after the first) were never
+cached, which is what the "no cache" column measures for the page.
+
+    python scripts/bench_statement_cache.py --calls 5000
+
+"""
+import time
+import datetime
+
+import click
+import sqlalchemy
+from sqlmodel import Session, SQLModel, select
+
+from tinymotion_backend import database
+from tinymotion_backend.core.blind_index import blind_index
+from tinymotion_backend.models import Infant, User
+from tinymotion_backend.services.base import LookupStatement
+
+
+NUM_INFANTS = 1000
+
+
+def populate(engine) -> tuple[list[Infant], User]:
+    with Session(engine, expire_on_commit=False) as session:
+        user = User(email="bench@test.com", access_key="bench-access-key")
+        session.add(user)
+        session.commit()
+        infants = [
+            Infant(
+                full_name=f"Infant {i}",
+                nhi_number=f"ABC{i:04d}",
+                birth_date=datetime.date(2024, 1, 1),
+                due_date=datetime.date(2024, 1, 2),
+                created_by=user.user_id,
+            )
+            for i in range(NUM_INFANTS)
+        ]
+        session.add_all(infants)
+        session.commit()
+
+    return infants, user
+
+
+def time_calls(engine, cached: bool, calls: int, lookup) -> float:
+    """Mean time of a call, in microseconds"""
+    bind = engine if cached else engine.execution_options(compiled_cache=None)
+    with Session(bind) as session:
+        start = time.perf_counter()
+        for i in range(calls):
+            lookup(session, i)
+            # so the primary key lookups aren't answered from the identity map
+            session.expunge_all()
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+@click.command()
+@click.option("-n", "--calls", type=int, default=5000, show_default=True, help="Number of calls of each lookup")
+def main(calls: int):
+    engine = database.create_db_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    infants, user = populate(engine)
+    nhi_number_bidxs = [blind_index(infant.nhi_number) for infant in infants]
+    infant_ids = [infant.infant_id for infant in infants]
+    access_key_bidx = blind_index(user.access_key)
+    cursors = [sqlalchemy.tuple_(infant.created_at, infant.infant_id) for infant in infants]
+
+    by_nhi_number = LookupStatement(Infant.nhi_number_bidx)
+    by_access_key = LookupStatement(User.access_key_bidx)
+    lookups = {
+        "infant by NHI (select)": lambda session, i: session.exec(
+            select(Infant).where(Infant.nhi_number_bidx == nhi_number_bidxs[i % NUM_INFANTS])
+        ).one(),
+        "infant by NHI (built once)": lambda session, i: session.exec(
+            by_nhi_number(), params={"nhi_number_bidx": nhi_number_bidxs[i % NUM_INFANTS]}
+        ).one(),
+        "user by key (select)": lambda session, i: session.exec(
+            select(User).where(User.access_key_bidx == access_key_bidx)
+        ).one(),
+        "user by key (built once)": lambda session, i: session.exec(
+            by_access_key(), params={"access_key_bidx": access_key_bidx}
+        ).one(),
+        "infant by id (get)": lambda session, i: session.get(Infant, infant_ids[i % NUM_INFANTS]),
+        "infant page (keyset)": lambda session, i: session.exec(
+            select(Infant)
+            .where(sqlalchemy.tuple_(Infant.created_at, Infant.infant_id) > cursors[i % NUM_INFANTS])
+            .order_by(Infant.created_at, Infant.infant_id)
+            .limit(10)
+        ).all(),
+    }
+
+    click.echo(f"{calls} calls of each lookup, {NUM_INFANTS} infants")
+    click.echo(f"{'lookup':>26} {'no cache (us)':>14} {'cache (us)':>11}")
+    for name, lookup in lookups.items():
+        uncached = time_calls(engine, False, calls, lookup)
+        cached = time_calls(engine, True, calls, lookup)
+        click.echo(f"{name:>26} {uncached:>14.1f} {cached:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
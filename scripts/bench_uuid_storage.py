@@ -0,0 +1,197 @@
+"""
+Benchmark storing the uuid keys as 32 character hex strings (CHAR(32), as
+before) or as 16 bytes (BINARY(16)) on a large synthetic SQLite database:
+the size of the tables and their indexes, and the latency of the lookups by
+key and of the joins on the foreign keys.
+
+    python scripts/bench_uuid_storage.py --infants 100000 --consents 2 --videos 8
+
+"""
+import os
+import time
+import uuid
+import random
+import tempfile
+import datetime
+from typing import Callable
+
+import click
+import sqlalchemy
+from sqlalchemy_utils import UUIDType
+from sqlmodel import SQLModel, func
+
+from tinymotion_backend import database, models  # noqa: F401 (registers the tables)
+
+
+INSERT_BATCH_SIZE = 10000
+
+TABLES = ["user", "infant", "consent", "video"]
+
+
+def schema(binary: bool) -> sqlalchemy.MetaData:
+    """The tables of the models, with the uuid columns stored as bytes or as hex strings"""
+    metadata = sqlalchemy.MetaData()
+    for table in SQLModel.metadata.sorted_tables:
+        table = table.to_metadata(metadata)
+        for column in table.columns:
+            if isinstance(column.type, UUIDType):
+                column.type = UUIDType(binary=binary)
+
+    return metadata
+
+
+def _timestamp(i: int) -> str:
+    created_at = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i)
+    return created_at.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _insert(conn, statement: str, rows) -> None:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            conn.exec_driver_sql(statement, batch)
+            batch = []
+    if len(batch):
+        conn.exec_driver_sql(statement, batch)
+
+
+def populate(engine, key: Callable[[uuid.UUID], bytes | str], users: list[uuid.UUID], infants: list[uuid.UUID],
+             consents_per_infant: int, videos_per_infant: int) -> None:
+    """Insert the synthetic rows directly, with placeholder bytes for the encrypted columns"""
+    # the same rows (and so the same random choices) for each format
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        _insert(conn, "insert into user (user_id, email, access_key, access_key_bidx) values (?, ?, ?, ?)", (
+            (key(user_id), b"x", b"x", user_id.hex) for user_id in users
+        ))
+        _insert(conn, (
+            "insert into infant (infant_id, created_at, created_by, full_name, nhi_number, nhi_number_bidx, "
+            "birth_date, due_date) values (?, ?, ?, ?, ?, ?, ?, ?)"
+        ), (
+            (key(infant_id), _timestamp(i), key(rng.choice(users)), b"x", b"x", infant_id.hex, b"x", b"x")
+            for i, infant_id in enumerate(infants)
+        ))
+        _insert(conn, (
+            "insert into consent (consent_id, infant_id, created_at, created_by, collected_physically) "
+            "values (?, ?, ?, ?, 1)"
+        ), (
+            (key(uuid.UUID(int=rng.getrandbits(128))), key(rng.choice(infants)), _timestamp(i),
+             key(rng.choice(users)))
+            for i in range(len(infants) * consents_per_infant)
+        ))
+        _insert(conn, (
+            "insert into video (video_id, infant_id, created_at, created_by, video_name, sha256sum, video_size, "
+            "storage_tier) values (?, ?, ?, ?, ?, ?, ?, 'hot')"
+        ), (
+            (key(video_id), key(rng.choice(infants)), _timestamp(i), key(rng.choice(users)), video_id.hex, "0" * 64,
+             1000)
+            for i, video_id in enumerate(uuid.UUID(int=rng.getrandbits(128)) for _ in range(
+                len(infants) * videos_per_infant
+            ))
+        ))
+
+
+def sizes(engine) -> dict[str, int]:
+    """Bytes used by the tables and by their indexes"""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "select m.tbl_name, m.name, sum(d.pgsize) from dbstat d join sqlite_master m on d.name = m.name "
+            "group by m.tbl_name, m.name"
+        ).all()
+
+    sizes = {}
+    for table, name, size in rows:
+        if table not in TABLES:
+            continue
+        # the indexes include the primary keys' (sqlite_autoindex_<table>_1)
+        kind = "tables" if name == table else "indexes"
+        sizes[kind] = sizes.get(kind, 0) + size
+
+    return sizes
+
+
+def lookups(metadata: sqlalchemy.MetaData, user_ids: list[uuid.UUID], infant_ids: list[uuid.UUID]) -> dict:
+    """The statements to time by name, one for each lookup"""
+    user, infant, consent, video = (metadata.tables[table] for table in TABLES)
+    return {
+        "user by id": [
+            sqlalchemy.select(user.c.access_key_bidx).where(user.c.user_id == user_id) for user_id in user_ids
+        ],
+        "infant by id": [
+            sqlalchemy.select(infant.c.nhi_number_bidx).where(infant.c.infant_id == infant_id)
+            for infant_id in infant_ids
+        ],
+        "consents of infant": [
+            sqlalchemy.select(consent.c.consent_id).where(consent.c.infant_id == infant_id)
+            for infant_id in infant_ids
+        ],
+        "videos of infants of user (join)": [
+            sqlalchemy.select(func.count(video.c.video_id))
+            .select_from(infant.join(video))
+            .where(infant.c.created_by == user_id)
+            for user_id in user_ids[:5]
+        ],
+        "all consents with infant (join)": [
+            sqlalchemy.select(func.count(infant.c.nhi_number_bidx)).select_from(consent.join(infant))
+        ] * 3,
+    }
+
+
+def time_lookups(engine, statements: dict) -> dict[str, float]:
+    """Mean time of each lookup, in milliseconds"""
+    timings = {}
+    with engine.connect() as conn:
+        for name, queries in statements.items():
+            start = time.perf_counter()
+            for query in queries:
+                conn.execute(query).all()
+            timings[name] = (time.perf_counter() - start) / len(queries) * 1000
+
+    return timings
+
+
+@click.command()
+@click.option("-i", "--infants", type=int, default=100000, show_default=True, help="Number of infants")
+@click.option("-c", "--consents", type=int, default=2, show_default=True, help="Number of consents per infant")
+@click.option("-v", "--videos", type=int, default=8, show_default=True, help="Number of videos per infant")
+@click.option("-u", "--users", type=int, default=20, show_default=True, help="Number of users")
+@click.option("-n", "--lookups", "num_lookups", type=int, default=200, show_default=True,
+              help="Number of times to run each lookup by id")
+def main(infants: int, consents: int, videos: int, users: int, num_lookups: int):
+    rng = random.Random(0)
+    user_ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(users)]
+    infant_ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(infants)]
+    sample_user_ids = [rng.choice(user_ids) for _ in range(num_lookups)]
+    sample_infant_ids = rng.sample(infant_ids, num_lookups)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, binary in (("hex", False), ("binary", True)):
+            engine = database.create_db_engine(f"sqlite:///{os.path.join(tmp_dir, name)}.db")
+            metadata = schema(binary)
+            metadata.create_all(engine)
+
+            start = time.perf_counter()
+            populate(engine, (lambda key: key.bytes) if binary else (lambda key: key.hex), user_ids, infant_ids,
+                     consents, videos)
+            click.echo(f"Inserted the {name} rows in {time.perf_counter() - start:.1f} s")
+
+            results[name] = (
+                sizes(engine),
+                time_lookups(engine, lookups(metadata, sample_user_ids, sample_infant_ids)),
+                os.path.getsize(os.path.join(tmp_dir, f"{name}.db")),
+            )
+            engine.dispose()
+
+    (hex_sizes, hex_timings, hex_file), (binary_sizes, binary_timings, binary_file) = results.values()
+    click.echo(f"{'':>38} {'hex':>10} {'binary':>10}")
+    for name in ("tables", "indexes"):
+        click.echo(f"{name + ' (MB)':>38} {hex_sizes[name] / 1e6:>10.1f} {binary_sizes[name] / 1e6:>10.1f}")
+    click.echo(f"{'database file (MB)':>38} {hex_file / 1e6:>10.1f} {binary_file / 1e6:>10.1f}")
+    for name in hex_timings:
+        click.echo(f"{name + ' (ms)':>38} {hex_timings[name]:>10.3f} {binary_timings[name]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 
 from tinymotion_backend.api import deps
 from tinymotion_backend import models
-from tinymotion_backend.services.consent_service import ConsentService
+from tinymotion_backend.services.consent_service import AsyncConsentService
 from tinymotion_backend.core.exc import NotFoundError, InvalidInputError
 
 
@@ -47,9 +47,9 @@ router = APIRouter()
         },
     },
 )
-def create_consent(
+async def create_consent(
     consent_in: models.ConsentCreateViaNHI,
-    consent_service: ConsentService = Depends(deps.get_consent_service),
+    consent_service: AsyncConsentService = Depends(deps.get_consent_service),
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
     """
@@ -60,7 +60,7 @@ def create_consent(
     logger.debug(f"Current user: {current_user!r}")
 
     try:
-        new_consent = consent_service.create_using_nhi_number(consent_in)
+        new_consent = await consent_service.create_using_nhi_number(consent_in)
     except NotFoundError as exc:
         logger.error(f"Error creating consent: {exc}")
         raise HTTPException(
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 
 from tinymotion_backend.api import deps
 from tinymotion_backend import models
-from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.infant_service import AsyncInfantService
 from tinymotion_backend.core.exc import UniqueConstraintError
 
 
@@ -27,9 +27,9 @@ router = APIRouter()
         },
     },
 )
-def create_infant(
+async def create_infant(
     infant_in: models.InfantCreate,
-    infant_service: InfantService = Depends(deps.get_infant_service),
+    infant_service: AsyncInfantService = Depends(deps.get_infant_service),
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
     """
@@ -40,7 +40,7 @@ def create_infant(
     logger.debug(f"Current user: {current_user!r}")
 
     try:
-        new_infant = infant_service.create(infant_in)
+        new_infant = await infant_service.create(infant_in)
     except UniqueConstraintError as exc:
         logger.error(f"Error creating infant: {exc}")
         raise HTTPException(
@@ -8,7 +8,7 @@ from tinymotion_backend.core import security
 from tinymotion_backend.core.config import settings
 from tinymotion_backend.core.exc import InvalidAccessKeyError, UniqueConstraintError, NotFoundError
 from tinymotion_backend import models
-from tinymotion_backend.services.user_service import UserService
+from tinymotion_backend.services.user_service import AsyncUserService
 
 
 logger = logging.getLogger(__name__)
@@ -34,9 +34,9 @@ router = APIRouter()
         },
     },
 )
-def login_for_tokens(
+async def login_for_tokens(
     form_data: security.OAuth2PasswordAndRefreshRequestForm = Depends(),
-    user_service: UserService = Depends(deps.get_user_service)
+    user_service: AsyncUserService = Depends(deps.get_user_service)
 ):
     """
     Login to get access and refresh tokens to use with future requests.
@@ -49,7 +49,7 @@ def login_for_tokens(
             secret_key=settings.REFRESH_TOKEN_SECRET_KEY,
         )
         try:
-            user = user_service.get(token_data.user_id)
+            user = await user_service.get(token_data.user_id)
         except NotFoundError:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -57,7 +57,7 @@ def login_for_tokens(
         logger.debug("Running login grant_type=password ...")
         # the username in the form is the access key
         try:
-            user = user_service.authenticate(form_data.username)
+            user = await user_service.authenticate(form_data.username)
         except (InvalidAccessKeyError, UniqueConstraintError) as exc:
             logger.error(f"Failed to authenticate user: {exc}")
             raise HTTPException(
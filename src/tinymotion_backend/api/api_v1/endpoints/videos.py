@@ -2,6 +2,7 @@ import os
 import time
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated
 
 from fastapi import UploadFile, File, Form, Depends, HTTPException, APIRouter
@@ -10,8 +11,10 @@ from tinymotion_backend.core.config import settings
 from tinymotion_backend import models
 from tinymotion_backend.api import deps
 from tinymotion_backend.services.video_service import VideoService
-from tinymotion_backend.core.exc import NotFoundError, NoConsentError
+from tinymotion_backend.core.exc import NotFoundError, NoConsentError, UniqueConstraintError
 from tinymotion_backend.core.encryption import encrypt_file
+from tinymotion_backend.core.mp4 import Mp4MetadataParser
+from tinymotion_backend.core import storage
 
 
 logger = logging.getLogger(__name__)
@@ -86,12 +89,22 @@ def upload_video(
     # path to the stored file on disk
     stored_file = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
 
+    # the same encrypted chunks are written to the mirror volume, if configured
+    mirror = storage.start_mirror(video_name)
+
     # if anything goes wrong we want to delete the database entry
     try:
         # next we store the (encrypted) video file to disk
         logger.debug(f"Receiving video: {video.filename} (size: {video.size}; content_type: {video.content_type})")
         logger.debug(f"Storing video locally: {stored_file}")
-        stored_hash_orig, stored_hash_enc = encrypt_file(video.file, stored_file)
+        metadata_parser = Mp4MetadataParser()
+        stored_hash_orig, stored_hash_enc = encrypt_file(
+            video.file,
+            stored_file,
+            metadata_parser=metadata_parser,
+            expected_size=video.size,
+            mirror=mirror,
+        )
 
         # now we verify the checksum
         if checksum_sha256 != stored_hash_orig:
@@ -102,16 +115,20 @@ def upload_video(
             # and delete the file
             if os.path.exists(stored_file):
                 os.unlink(stored_file)
+            if mirror is not None:
+                mirror.abort()
 
             raise HTTPException(
                 status_code=409,
                 detail=f"Verification of the SHA256 checksum of the uploaded video failed ({stored_hash_orig})",
             )
 
-        # now we update the video size in the database
+        # now we update the video size and metadata in the database
+        metadata = metadata_parser.metadata or models.VideoMetadata()
         update_obj = models.VideoUpdate(
             video_size=os.path.getsize(stored_file),
             sha256sum_enc=stored_hash_enc,
+            **metadata.model_dump(),
         )
         video_service.update(video_record.video_id, update_obj)
 
@@ -125,12 +142,200 @@ def upload_video(
         logger.error(f"Exception was: {exc!r}")
         if os.path.exists(stored_file):
             os.unlink(stored_file)
+        if mirror is not None:
+            mirror.abort()
         video_service.delete(video_record.video_id)
         raise
 
+    storage.finish_mirror(mirror)
+
     # TODO: option to use object storage?
 
     upload_time = time.perf_counter() - upload_time
     logger.debug(f"Received video file in {upload_time:.3f} seconds")
 
     return video_record
+
+
+def _store_batch_part(video: UploadFile, checksum_sha256: str) -> dict:
+    """
+    Encrypt and store one part of a batch upload, verifying its checksum.
+
+    Returns a dict describing the outcome; the stored file is removed again if
+    anything goes wrong.
+
+    """
+    video_name = str(uuid.uuid4()) + os.path.splitext(video.filename or "")[1] + ".enc"
+    stored_file = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
+    result = {
+        "filename": video.filename,
+        "video_name": video_name,
+        "stored_file": stored_file,
+        "success": False,
+        "detail": None,
+        "mirror": storage.start_mirror(video_name),
+    }
+
+    try:
+        logger.debug(f"Receiving video: {video.filename} (size: {video.size}; content_type: {video.content_type})")
+        logger.debug(f"Storing video locally: {stored_file}")
+        metadata_parser = Mp4MetadataParser()
+        stored_hash_orig, stored_hash_enc = encrypt_file(
+            video.file,
+            stored_file,
+            metadata_parser=metadata_parser,
+            expected_size=video.size,
+            mirror=result["mirror"],
+        )
+
+        if checksum_sha256 != stored_hash_orig:
+            logger.error(f"Checksums do not match (theirs: {checksum_sha256} ; ours: {stored_hash_orig})")
+            if os.path.exists(stored_file):
+                os.unlink(stored_file)
+            if result["mirror"] is not None:
+                result["mirror"].abort()
+            result["detail"] = f"Verification of the SHA256 checksum of the uploaded video failed ({stored_hash_orig})"
+            return result
+
+        metadata = metadata_parser.metadata or models.VideoMetadata()
+        result["video_in"] = models.VideoCreateBatch(
+            video_name=video_name,
+            sha256sum=checksum_sha256,
+            video_size=os.path.getsize(stored_file),
+            sha256sum_enc=stored_hash_enc,
+            **metadata.model_dump(),
+        )
+        result["success"] = True
+
+    except Exception as exc:
+        logger.error("Caught exception while writing video file, removing file")
+        logger.error(f"Exception was: {exc!r}")
+        if os.path.exists(stored_file):
+            os.unlink(stored_file)
+        if result["mirror"] is not None:
+            result["mirror"].abort()
+        result["detail"] = "Failed to store the uploaded video"
+
+    return result
+
+
+@router.post(
+    "/batch",
+    response_model=models.VideoBatchOut,
+    responses={
+        400: {
+            "description": "Bad Request Error",
+            "content": {"application/json": {"example": {"detail": "No consent exists"}}},
+        },
+        401: {
+            "description": "Unauthorized",
+            "content": {"application/json": {"example": {"detail": "Not authenticated"}}},
+        },
+        404: {
+            "description": "Not Found Error",
+            "content": {"application/json": {"example": {"detail": "An infant with the specified NHI number "
+                                                         "does not exist"}}},
+        },
+        422: {
+            "description": "Validation Error",
+            "content": {"application/json": {"example": {"detail": "The number of checksums must match the "
+                                                         "number of videos"}}},
+        },
+    },
+)
+def upload_video_batch(
+    videos: Annotated[list[UploadFile], File(description="Video files")],
+    nhi_number: Annotated[str, Form(description="NHI number of the infant in the videos", min_length=1)],
+    checksums_sha256: Annotated[list[str], Form(
+        description="The SHA256 checksums to verify the integrity of the uploaded videos, in the same order "
+                    "as the videos",
+    ),],
+    current_user: Annotated[models.User, Depends(deps.get_current_active_user)],
+    video_service: VideoService = Depends(deps.get_video_service),
+):
+    """
+    Upload several videos associated with one infant
+
+    The infant and consent are checked once for the whole batch and the
+    records for all successfully stored videos are created in a single
+    transaction. The outcome of each part is reported separately.
+
+    """
+    upload_time = time.perf_counter()
+
+    if len(videos) != len(checksums_sha256):
+        raise HTTPException(status_code=422, detail="The number of checksums must match the number of videos")
+    if len(videos) > settings.VIDEO_BATCH_MAX_PARTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Cannot upload more than {settings.VIDEO_BATCH_MAX_PARTS} videos in one batch",
+        )
+    for checksum_sha256 in checksums_sha256:
+        if len(checksum_sha256) != 64:
+            raise HTTPException(status_code=422, detail="Each checksum must be 64 characters long")
+
+    # resolve the infant and check consent once for the whole batch
+    try:
+        infant = video_service.get_infant_for_upload(nhi_number)
+
+    except NotFoundError as exc:
+        logger.error(f"Error creating video records: {exc}")
+        raise HTTPException(
+            status_code=404,
+            detail="An infant with the specified NHI number does not exist",
+        )
+
+    except NoConsentError as exc:
+        logger.error(f"Error creating video records: {exc}")
+        raise HTTPException(
+            status_code=400,
+            detail="No consent exists",
+        )
+
+    # encrypt and store each part, in parallel if configured
+    if settings.VIDEO_BATCH_MAX_WORKERS > 1 and len(videos) > 1:
+        with ThreadPoolExecutor(max_workers=settings.VIDEO_BATCH_MAX_WORKERS) as executor:
+            results = list(executor.map(_store_batch_part, videos, checksums_sha256))
+    else:
+        results = [_store_batch_part(video, checksum) for video, checksum in zip(videos, checksums_sha256)]
+
+    # create the records for all stored videos in one transaction
+    stored = [result for result in results if result["success"]]
+    if len(stored):
+        try:
+            video_records = video_service.create_batch(infant, [result["video_in"] for result in stored])
+
+        except Exception as exc:
+            logger.error("Caught exception while creating video records, removing files")
+            logger.error(f"Exception was: {exc!r}")
+            for result in stored:
+                if os.path.exists(result["stored_file"]):
+                    os.unlink(result["stored_file"])
+                if result["mirror"] is not None:
+                    result["mirror"].abort()
+                result["success"] = False
+                if isinstance(exc, UniqueConstraintError):
+                    result["detail"] = "Failed to create video record due to unique constraint"
+                else:
+                    result["detail"] = "Failed to create video record"
+
+        else:
+            for result, video_record in zip(stored, video_records):
+                result["video"] = video_record
+                storage.finish_mirror(result["mirror"])
+
+    upload_time = time.perf_counter() - upload_time
+    logger.debug(f"Received {len(stored)} of {len(videos)} video files in {upload_time:.3f} seconds")
+
+    return models.VideoBatchOut(
+        nhi_number=nhi_number,
+        parts=[
+            models.VideoBatchPartOut(
+                filename=result["filename"],
+                success=result["success"],
+                detail=result["detail"],
+                video=models.VideoOut.model_validate(result["video"]) if result.get("video") else None,
+            )
+            for result in results
+        ],
+    )
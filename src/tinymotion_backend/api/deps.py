@@ -5,15 +5,17 @@ import uuid
 from fastapi import status, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy.orm import undefer
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from tinymotion_backend import models
 from tinymotion_backend.core.config import settings
 from tinymotion_backend.core.exc import NotFoundError
 from tinymotion_backend import database
-from tinymotion_backend.services.user_service import UserService
-from tinymotion_backend.services.infant_service import InfantService
-from tinymotion_backend.services.consent_service import ConsentService
+from tinymotion_backend.services.user_service import AsyncUserService
+from tinymotion_backend.services.infant_service import AsyncInfantService
+from tinymotion_backend.services.consent_service import AsyncConsentService
 from tinymotion_backend.services.video_service import VideoService
 
 
@@ -28,6 +30,25 @@ def get_session():
         yield session
 
 
+async def get_async_session():
+    # objects are refreshed by the services after writing, so don't expire them on commit (which would
+    # make the next attribute access try to load from the database outside of an await)
+    async with AsyncSession(database.async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_read_session():
+    # the services end the read transaction after each write and expire what has been read then (see
+    # BaseService._write), not on every commit
+    with Session(database.read_engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def get_async_read_session():
+    async with AsyncSession(database.async_read_engine, expire_on_commit=False) as session:
+        yield session
+
+
 def get_token_data(token: str, secret_key: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,17 +67,21 @@ def get_token_data(token: str, secret_key: str):
     return token_data
 
 
-def get_user_service(session: Session = Depends(get_session)) -> UserService:
-    return UserService(session)
+def get_user_service(
+    session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_async_read_session),
+) -> AsyncUserService:
+    return AsyncUserService(session, read_session=read_session)
 
 
-def get_current_user(
+async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    user_service: UserService = Depends(get_user_service),
+    user_service: AsyncUserService = Depends(get_user_service),
 ) -> models.UserRead:
     token_data = get_token_data(token, settings.ACCESS_TOKEN_SECRET_KEY)
     try:
-        user = user_service.get(token_data.user_id)
+        # only the email is needed (not the access key), so only decrypt that
+        user = await user_service.get(token_data.user_id, options=[undefer(models.User.email)])
     except NotFoundError:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -75,21 +100,24 @@ def get_current_active_user(
 
 
 def get_infant_service(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_async_read_session),
     current_user: models.User = Depends(get_current_active_user),
-) -> InfantService:
-    return InfantService(session, current_user.user_id)
+) -> AsyncInfantService:
+    return AsyncInfantService(session, current_user.user_id, read_session=read_session)
 
 
 def get_consent_service(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_async_read_session),
     current_user: models.User = Depends(get_current_active_user),
-) -> ConsentService:
-    return ConsentService(session, created_by=current_user.user_id)
+) -> AsyncConsentService:
+    return AsyncConsentService(session, created_by=current_user.user_id, read_session=read_session)
 
 
 def get_video_service(
     session: Session = Depends(get_session),
+    read_session: Session = Depends(get_read_session),
     current_user: models.User = Depends(get_current_active_user),
 ) -> VideoService:
-    return VideoService(session, created_by=current_user.user_id)
+    return VideoService(session, created_by=current_user.user_id, read_session=read_session)
@@ -1,21 +1,38 @@
 import click
 
 from tinymotion_backend._version import __version__
+from tinymotion_backend.cli.backup import backup
 from tinymotion_backend.cli.consents import consent
+from tinymotion_backend.cli.imports import import_records
 from tinymotion_backend.cli.infants import infant
+from tinymotion_backend.cli.replicate import replicate
 from tinymotion_backend.cli.secret import secret
 from tinymotion_backend.cli.users import user
 from tinymotion_backend.cli.videos import video
+from tinymotion_backend.core.instrumentation import track_queries, log_query_stats
 
 
 @click.group(name="tinymotion-backend")
-def cli():
+@click.option("--query-stats", is_flag=True, default=False,
+              help="When the command finishes, print how many database queries it ran and the time they took")
+@click.pass_context
+def cli(ctx: click.Context, query_stats: bool):
     """Command line interface to TinyMotion Backend"""
-    pass
+    stats = ctx.with_resource(track_queries())
 
+    def report_query_stats():
+        log_query_stats(stats, f"tinymotion-backend {ctx.invoked_subcommand}")
+        if query_stats:
+            click.echo(f"Database: {stats}", err=True)
 
+    ctx.call_on_close(report_query_stats)
+
+
+cli.add_command(backup)
 cli.add_command(consent)
+cli.add_command(import_records)
 cli.add_command(infant)
+cli.add_command(replicate)
 cli.add_command(secret)
 cli.add_command(user)
 cli.add_command(video)
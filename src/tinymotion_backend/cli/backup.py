@@ -0,0 +1,107 @@
+import os
+
+import click
+import sqlalchemy
+from sqlmodel import Session, update
+
+from tinymotion_backend import database
+from tinymotion_backend.models import Video
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.core import manifest, storage
+from tinymotion_backend.core.exc import ChecksumMismatchError
+
+
+# layout of a backup, which is also what the deployment restores from (see deploy/README.md)
+DATABASE_FILE_NAME = "tinymotion.db"
+VIDEOS_DIR_NAME = "videos"
+
+
+@click.command()
+@click.argument("destination", type=click.Path(file_okay=False))
+@click.option("--pages-per-step", type=click.IntRange(min=1), default=1024, show_default=True,
+              help="Number of database pages to copy at a time")
+@click.option("--step-pause-ms", type=click.FloatRange(min=0), default=10.0, show_default=True,
+              help="How long to pause between steps of the database copy, to leave time for other writers")
+def backup(destination: str, pages_per_step: int, step_pause_ms: float):
+    """Back up the database and the video library while the backend is running.
+
+    DESTINATION is the directory to write the backup to: a snapshot of the
+    database, the videos it references and a manifest of them. Backing up to
+    the same directory again only copies the videos that are new or have
+    changed since, and removes the ones that have since been deleted.
+
+    Videos in cold storage are copied to individual files, and marked as
+    such in the snapshot, so the backup can be restored as it is.
+    """
+    if database.engine.dialect.name != "sqlite":
+        click.echo("Error: backups are only supported for SQLite databases, use pg_dump for PostgreSQL")
+        raise click.Abort()
+
+    videos_dir = os.path.join(destination, VIDEOS_DIR_NAME)
+    database_path = os.path.join(destination, DATABASE_FILE_NAME)
+    manifest_path = os.path.join(destination, manifest.MANIFEST_FILE_NAME)
+    os.makedirs(videos_dir, exist_ok=True)
+
+    snapshot_path = database_path + ".tmp"
+    if os.path.exists(snapshot_path):
+        os.unlink(snapshot_path)
+    pages = database.backup_database(
+        database.engine, snapshot_path, pages_per_step=pages_per_step, step_pause_seconds=step_pause_ms / 1000,
+    )
+    click.echo(f"Copied a snapshot of the database ({pages} pages)")
+
+    # the videos referenced by the snapshot, rather than by the live database, which may have changed since
+    previous = manifest.read_manifest(manifest_path)
+    current = {}
+    copied = copied_bytes = failed = 0
+    snapshot_engine = sqlalchemy.create_engine(f"sqlite:///{snapshot_path}")
+    try:
+        with Session(snapshot_engine) as session:
+            for video in VideoService(session, None).iter():
+                entry = manifest.ManifestEntry.from_video(video)
+                if entry is None:
+                    # still being uploaded when the snapshot was taken
+                    continue
+
+                target_path = os.path.join(videos_dir, entry.video_name)
+                if previous.get(entry.video_name) == entry and manifest.file_matches(target_path, entry):
+                    current[entry.video_name] = entry
+                    continue
+
+                try:
+                    with storage.open_video(video) as fin:
+                        manifest.copy_video(fin, target_path, entry)
+                except (OSError, ChecksumMismatchError) as exc:
+                    click.echo(f"Error: failed to copy video {entry.video_name}: {exc}")
+                    failed += 1
+                    continue
+                current[entry.video_name] = entry
+                copied += 1
+                copied_bytes += entry.size
+
+            # the backup has its own copy of every video
+            session.exec(
+                update(Video)
+                .where(Video.storage_tier == storage.TIER_COLD)
+                .values(storage_tier=storage.TIER_HOT, pack_name=None, pack_offset=None)
+            )
+            session.commit()
+    finally:
+        snapshot_engine.dispose()
+
+    # the snapshot and its manifest replace the previous ones together, before removing the videos they no
+    # longer reference
+    manifest.write_manifest(manifest_path, current.values())
+    os.replace(snapshot_path, database_path)
+    removed = 0
+    for name in os.listdir(videos_dir):
+        if name not in current:
+            os.unlink(os.path.join(videos_dir, name))
+            removed += 1
+
+    click.echo(
+        f"Copied {copied} video(s) ({copied_bytes} bytes), {len(current) - copied} unchanged, {removed} removed"
+    )
+    if failed:
+        click.echo(f"Error: {failed} video(s) could not be copied, the backup is incomplete")
+        raise click.Abort()
@@ -7,8 +7,8 @@ from sqlmodel import Session
 from tinymotion_backend import database
 from tinymotion_backend.services.infant_service import InfantService
 from tinymotion_backend.services.consent_service import ConsentService
-from tinymotion_backend.models import ConsentCreate, ConsentUpdate, Consent, Infant
-from tinymotion_backend.cli.utils import check_user_id, check_infant_id
+from tinymotion_backend.models import ConsentCreate, ConsentUpdate, Consent, Infant, LOAD_PII
+from tinymotion_backend.cli.utils import check_user_id, check_infant_id, echo_json_list
 
 
 @click.group()
@@ -66,25 +66,16 @@ def create(
 @click.option("-j", "--json-output", is_flag=True, default=False, help="Output JSON only, no extra messages")
 def list(pager: bool, json_output: bool):
     """List existing consents."""
-    with Session(database.engine) as session:
-        # get the list of consents
+    with Session(database.read_engine) as session:
         consent_service = ConsentService(session, None)
-        consents = consent_service.list()
         if not json_output:
-            click.echo(f"Found {len(consents)} Consents")
+            click.echo(f"Found {consent_service.count()} Consents")
 
-        # build a list of consents in json format
-        consents_json = []
-        for consent in consents:
-            consents_json.append(json.loads(consent.json()))
+        # convert the Consents to json as they are read, rather than loading them all at once
+        consents_json = (json.loads(consent.json()) for consent in consent_service.iter(options=[LOAD_PII]))
 
         # display to screen with pager or not
-        if pager and not json_output:
-            echo_command = click.echo_via_pager
-        else:
-            echo_command = click.echo
-
-        echo_command(json.dumps(consents_json, indent=2))
+        echo_json_list(consents_json, pager=pager and not json_output)
 
 
 @consent.command()
@@ -123,7 +114,7 @@ def update(
         consent_service = ConsentService(session, created_by=None)
 
         # get the existing consent to validate proposed update
-        current_consent = consent_service.get(consent_id)
+        current_consent = consent_service.get(consent_id, options=[LOAD_PII])
 
         # proposed value for consent giver name
         if "consent_giver_name" in update_obj_dict:
@@ -169,14 +160,14 @@ def delete(
     with Session(database.engine) as session:
         # first get the consent and determine whether it can be deleted
         consent_service = ConsentService(session, created_by=None)
-        consent_record: Consent = consent_service.get(consent_id)
+        consent_record: Consent = consent_service.get(consent_id, options=[LOAD_PII])
         click.echo("Deleting Consent:")
         click.echo(consent_record.model_dump_json(indent=2))
 
         # get the infant the consent is for
         infant_service = InfantService(session, created_by=None)
         infant: Infant = infant_service.get(consent_record.infant_id)
-        if len(infant.consents) < 2 and len(infant.videos) > 0:
+        if infant.consent_count < 2 and infant.video_count > 0:
             click.echo("Error: cannot delete only Consent for Infant that has stored Videos")
             raise click.Abort()
 
@@ -0,0 +1,220 @@
+import os
+import csv
+import json
+import uuid
+import itertools
+from typing import IO, Any, Iterable, Iterator
+
+import click
+from pydantic import ValidationError
+from sqlmodel import Session
+
+from tinymotion_backend import database
+from tinymotion_backend.services.base import BULK_BATCH_SIZE
+from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.consent_service import ConsentService
+from tinymotion_backend.models import InfantCreate, ConsentCreateViaNHI
+from tinymotion_backend.cli.utils import check_user_id
+
+
+RECORD_MODELS = {
+    "infant": InfantCreate,
+    "consent": ConsentCreateViaNHI,
+}
+
+
+def _text_lines(f: IO[bytes], progress) -> Iterator[str]:
+    """Decode the lines of a file opened in binary mode, advancing the progress bar by the bytes read"""
+    for line_number, line in enumerate(f):
+        progress.update(len(line))
+        text = line.decode("utf-8")
+        if line_number == 0:
+            text = text.lstrip("\ufeff")
+        yield text
+
+
+def _read_records(f: IO[bytes], file_format: str, progress) -> Iterator[tuple[int, dict[str, Any] | Exception]]:
+    """
+    Read the records of a CSV (with a header row) or JSONL file, returning the
+    number of each record (starting from 1) with its fields, or with the error
+    if it could not be parsed
+
+    """
+    lines = _text_lines(f, progress)
+    if file_format == "csv":
+        for record_number, row in enumerate(csv.DictReader(lines), start=1):
+            # empty cells are missing values
+            yield record_number, {key: value for key, value in row.items() if value not in ("", None)}
+
+    else:
+        record_number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            record_number += 1
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("record is not a JSON object")
+            except ValueError as exc:
+                yield record_number, exc
+            else:
+                yield record_number, record
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _read_checkpoint(checkpoint_path: str, record_type: str) -> int:
+    """Number of records already imported according to the checkpoint file (0 if there isn't one)"""
+    if not os.path.exists(checkpoint_path):
+        return 0
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["record_type"] != record_type:
+        raise click.ClickException(
+            f"The checkpoint {checkpoint_path} is for importing {checkpoint['record_type']} records, not {record_type}"
+        )
+
+    return checkpoint["records_done"]
+
+
+def _write_checkpoint(checkpoint_path: str, record_type: str, records_done: int) -> None:
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"record_type": record_type, "records_done": records_done}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _write_errors(error_report: IO[str], errors: dict[int, str]) -> None:
+    # only the record number and the error are reported, so the report doesn't copy the personal information
+    for record_number, error in sorted(errors.items()):
+        error_report.write(json.dumps({"record": record_number, "error": error}) + "\n")
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in exc.errors(include_input=False)
+        )
+
+    return f"{type(exc).__name__}: {exc}".split("\n")[0]
+
+
+def _import_chunk(session: Session, record_type: str, user_id: uuid.UUID, chunk: list[tuple[int, Any]],
+                  errors: dict[int, str]) -> int:
+    """Validate and create one chunk of records, adding the errors to `errors` and returning how many were created"""
+    model = RECORD_MODELS[record_type]
+    record_numbers = []
+    objs = []
+    for record_number, record in chunk:
+        if isinstance(record, Exception):
+            errors[record_number] = _error_message(record)
+            continue
+        try:
+            objs.append(model.model_validate(record))
+        except ValidationError as exc:
+            errors[record_number] = _error_message(exc)
+            continue
+        record_numbers.append(record_number)
+
+    if not len(objs):
+        return 0
+
+    if record_type == "infant":
+        result = InfantService(session, user_id).create_many(objs, batch_size=len(objs))
+    else:
+        result = ConsentService(session, user_id).create_many_using_nhi_number(objs, batch_size=len(objs))
+
+    for index, exc in result.errors.items():
+        errors[record_numbers[index]] = _error_message(exc)
+
+    return len(objs) - len(result.errors)
+
+
+@click.command(name="import")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("-t", "--record-type", required=True, type=click.Choice(list(RECORD_MODELS)),
+              help="The type of records in the file")
+@click.option("-u", "--user-id", required=True, type=click.UUID, help="ID of the User to create the records")
+@click.option("-f", "--file-format", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Format of the file (default: from the file extension)")
+@click.option("-b", "--batch-size", type=click.IntRange(min=1), default=BULK_BATCH_SIZE, show_default=True,
+              help="Number of records to validate and insert per transaction")
+@click.option("-e", "--error-report", type=click.Path(dir_okay=False), default=None,
+              help="File to write the errors to, one JSON object per line (default: FILE.errors.jsonl)")
+@click.option("-c", "--checkpoint", type=click.Path(dir_okay=False), default=None,
+              help="File recording how far the import got, to resume from (default: FILE.checkpoint)")
+@click.option("--restart", is_flag=True, default=False, help="Ignore any checkpoint and import from the start")
+def import_records(
+    file: str,
+    record_type: str,
+    user_id: uuid.UUID,
+    file_format: str | None,
+    batch_size: int,
+    error_report: str | None,
+    checkpoint: str | None,
+    restart: bool,
+):
+    """Import infants or consents from a CSV or JSONL file.
+
+    FILE is the file to import. CSV files must have a header row naming the
+    fields. Infant records have the fields full_name, nhi_number, birth_date
+    and due_date (dates as YYYY-MM-DD). Consent records have nhi_number (of
+    the infant) and either consent_giver_name and consent_giver_email or
+    collected_physically.
+
+    Records are validated and inserted in batches, each in its own
+    transaction. Records that fail are written to the error report and the
+    rest are still imported. If the import is interrupted, running it again
+    resumes after the last batch that was committed.
+    """
+    if file_format is None:
+        file_format = "csv" if file.lower().endswith(".csv") else "jsonl"
+    if error_report is None:
+        error_report = f"{file}.errors.jsonl"
+    if checkpoint is None:
+        checkpoint = f"{file}.checkpoint"
+
+    check_user_id(user_id)
+
+    records_done = 0 if restart else _read_checkpoint(checkpoint, record_type)
+    if records_done:
+        click.echo(f"Resuming after record {records_done} (from {checkpoint})")
+
+    imported = 0
+    failed = 0
+    with (
+        Session(database.engine) as session,
+        open(file, "rb") as f,
+        open(error_report, "a" if records_done else "w") as error_report_file,
+        click.progressbar(length=os.path.getsize(file), label=f"Importing {record_type} records") as progress,
+    ):
+        records = (
+            (record_number, record)
+            for record_number, record in _read_records(f, file_format, progress)
+            if record_number > records_done
+        )
+        for chunk in _batches(records, batch_size):
+            errors = {}
+            imported += _import_chunk(session, record_type, user_id, chunk, errors)
+            failed += len(errors)
+            _write_errors(error_report_file, errors)
+            error_report_file.flush()
+
+            # the chunk is committed, so don't import it again if the import is resumed
+            _write_checkpoint(checkpoint, record_type, chunk[-1][0])
+
+    click.echo(f"Imported {imported} {record_type} records, {failed} failed")
+    if os.path.getsize(error_report):
+        click.echo(f"Errors written to {error_report}")
+    else:
+        os.unlink(error_report)
+
+    # the import is complete, there is nothing to resume
+    if os.path.exists(checkpoint):
+        os.unlink(checkpoint)
@@ -7,8 +7,8 @@ from sqlmodel import Session
 
 from tinymotion_backend import database
 from tinymotion_backend.services.infant_service import InfantService
-from tinymotion_backend.models import InfantCreate, InfantUpdate
-from tinymotion_backend.cli.utils import check_user_id, convert_json
+from tinymotion_backend.models import InfantCreate, InfantUpdate, LOAD_PII
+from tinymotion_backend.cli.utils import check_user_id, convert_json, echo_json_list
 
 
 @click.group()
@@ -58,25 +58,16 @@ def create(
 @click.option("-j", "--json-output", is_flag=True, default=False, help="Output JSON only, no extra messages")
 def list(pager: bool, json_output: bool):
     """List existing infants."""
-    with Session(database.engine) as session:
-        # get the list of Infants
+    with Session(database.read_engine) as session:
         infant_service = InfantService(session, None)
-        infants = infant_service.list()
         if not json_output:
-            click.echo(f"Found {len(infants)} Infants")
+            click.echo(f"Found {infant_service.count()} Infants")
 
-        # build a list of Infants in json format
-        infants_json = []
-        for infant in infants:
-            infants_json.append(json.loads(infant.json()))
+        # convert the Infants to json as they are read, rather than loading them all at once
+        infants_json = (json.loads(infant.json()) for infant in infant_service.iter(options=[LOAD_PII]))
 
         # display to screen with pager or not
-        if pager and not json_output:
-            echo_command = click.echo_via_pager
-        else:
-            echo_command = click.echo
-
-        echo_command(json.dumps(infants_json, indent=2, default=convert_json))
+        echo_json_list(infants_json, pager=pager and not json_output, default=convert_json)
 
 
 @infant.command()
@@ -136,11 +127,11 @@ def delete(
         click.echo(f"Infant id: {infant_id} ({type(infant_id)})")
 
         # first get the infant and confirm deletion
-        infant_record = infant_service.get(infant_id)
+        infant_record = infant_service.get(infant_id, options=[LOAD_PII])
         click.echo("Deleting infant:")
         click.echo(infant_record.model_dump_json(indent=2))
-        click.echo(f"Also deleting {len(infant_record.consents)} consent(s) and "
-                   f"{len(infant_record.videos)} video(s) associated with this infant.")
+        click.echo(f"Also deleting {infant_record.consent_count} consent(s) and "
+                   f"{infant_record.video_count} video(s) associated with this infant.")
         delete = click.confirm("Do you wish to proceed?")
         if not delete:
             click.echo("Not deleting")
@@ -149,3 +140,18 @@ def delete(
             # delete the infant
             infant_service.delete(infant_id)
             print("Deleted infant.")
+
+
+@infant.command()
+def recount():
+    """Recompute the consent and video counters of all infants.
+
+    The counters are kept up to date as consents and videos are added and
+    removed, so this is only needed if they were changed outside the
+    backend (e.g. by editing the database directly).
+    """
+    with Session(database.engine) as session:
+        infant_service = InfantService(session, None)
+        repaired = infant_service.recount()
+
+    click.echo(f"Repaired the counters of {repaired} infant(s)")
@@ -0,0 +1,78 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+from sqlmodel import Session
+
+from tinymotion_backend import database
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.core import manifest, storage
+from tinymotion_backend.core.exc import ChecksumMismatchError
+
+
+@click.command()
+@click.argument("target", type=click.Path(file_okay=False))
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=4, show_default=True,
+              help="Number of videos to copy at the same time")
+@click.option("--bwlimit-kib", type=click.IntRange(min=1), default=None,
+              help="Limit the combined transfer rate to this many KiB/s [default: unlimited]")
+def replicate(target: str, jobs: int, bwlimit_kib: int | None):
+    """Replicate the video library to another directory, such as a volume of a standby node.
+
+    TARGET receives each video's encrypted file and a manifest of them.
+    Only the videos that are missing from TARGET's manifest or have changed
+    (by size or checksum) are copied, and each copy is verified against its
+    checksum; videos that have since been deleted are removed. TARGET's
+    manifest is trusted to describe its files, which aren't read or listed.
+
+    The manifest is updated as each video is copied, so an interrupted run
+    continues where it left off.
+    """
+    manifest_path = os.path.join(target, manifest.MANIFEST_FILE_NAME)
+    os.makedirs(target, exist_ok=True)
+
+    with Session(database.read_engine) as session:
+        videos = {video.video_name: video for video in VideoService(session, None).iter()}
+    target_manifest = manifest.read_manifest(manifest_path)
+    diff = manifest.diff_manifests(manifest.build_manifest(videos.values()), target_manifest)
+    click.echo(f"{len(diff.to_copy)} video(s) to copy, {diff.unchanged} unchanged, {len(diff.to_delete)} to remove")
+
+    # the manifest only lists what is known to be in place, before anything is removed or replaced
+    to_copy_names = {entry.video_name for entry in diff.to_copy}
+    manifest.write_manifest(manifest_path, (
+        entry for name, entry in target_manifest.items() if name not in to_copy_names and name not in diff.to_delete
+    ))
+    for name in diff.to_delete:
+        path = os.path.join(target, name)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    limiter = manifest.BandwidthLimiter(bwlimit_kib * 1024) if bwlimit_kib is not None else None
+    manifest_lock = threading.Lock()
+
+    def copy(entry: manifest.ManifestEntry) -> None:
+        with storage.open_video(videos[entry.video_name]) as fin:
+            manifest.copy_video(fin, os.path.join(target, entry.video_name), entry, limiter)
+        with manifest_lock:
+            manifest.append_manifest(manifest_path, entry)
+
+    copied = copied_bytes = failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(copy, entry): entry for entry in diff.to_copy}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                future.result()
+            except (OSError, ChecksumMismatchError) as exc:
+                # e.g. deleted or moved to cold storage since the manifest was built; tried again next time
+                click.echo(f"Error: failed to copy video {entry.video_name}: {exc}")
+                failed += 1
+                continue
+            copied += 1
+            copied_bytes += entry.size
+
+    click.echo(f"Copied {copied} video(s) ({copied_bytes} bytes), removed {len(diff.to_delete)}")
+    if failed:
+        click.echo(f"Error: {failed} video(s) could not be copied, run the command again to retry them")
+        raise click.Abort()
@@ -15,11 +15,12 @@ def secret():
 @click.option("-r", "--refresh", is_flag=True, default=False, help="Generate refresh token")
 @click.option("-d", "--database", is_flag=True, default=False, help="Generate database secret")
 @click.option("-v", "--video", is_flag=True, default=False, help="Generate video secret")
+@click.option("-i", "--index", is_flag=True, default=False, help="Generate database blind index secret")
 @click.option("-e", "--for-env-file", is_flag=True, default=False, help="Print the secret(s) in .env file format")
-def generate(access: bool, refresh: bool, database: bool, video: bool, for_env_file: bool):
+def generate(access: bool, refresh: bool, database: bool, video: bool, index: bool, for_env_file: bool):
     """Generate new secrets"""
     # at least one secret should be specified
-    if not (access or refresh or database or video):
+    if not (access or refresh or database or video or index):
         click.echo("Must select which secrets to generate")
         click.echo("")
         ctx = click.get_current_context()
@@ -66,5 +67,15 @@ def generate(access: bool, refresh: bool, database: bool, video: bool, for_env_f
         else:
             click.echo(f"video_secret = {video_secret}")
 
+    if index:
+        if not for_env_file:
+            click.echo("")
+            click.echo("Generating database blind index secrets:")
+        index_secret = secrets.token_urlsafe()
+        if for_env_file:
+            click.echo(f"TINYMOTION_DATABASE_BLIND_INDEX_KEY={index_secret}")
+        else:
+            click.echo(f"index_secret = {index_secret}")
+
     if not for_env_file:
         click.echo("")
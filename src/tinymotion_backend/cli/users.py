@@ -6,8 +6,8 @@ from sqlmodel import Session
 
 from tinymotion_backend import database
 from tinymotion_backend.services.user_service import UserService
-from tinymotion_backend.models import UserCreate, UserUpdate
-from tinymotion_backend.cli.utils import convert_json
+from tinymotion_backend.models import UserCreate, UserUpdate, LOAD_PII
+from tinymotion_backend.cli.utils import convert_json, echo_json_list
 
 
 @click.group()
@@ -45,26 +45,16 @@ def create(
 @click.option("-j", "--json-output", is_flag=True, default=False, help="Output JSON only, no extra messages")
 def list(pager: bool, json_output: bool):
     """List existing users."""
-    with Session(database.engine) as session:
-        # get the list of Users
+    with Session(database.read_engine) as session:
         user_service = UserService(session)
-        users = user_service.list()
         if not json_output:
-            click.echo(f"Found {len(users)} Users")
+            click.echo(f"Found {user_service.count()} Users")
 
-        # build a list of Users in json format
-        users_json = []
-        for user in users:
-            users_json.append(json.loads(user.json()))
+        # convert the Users to json as they are read, rather than loading them all at once
+        users_json = (json.loads(user.json()) for user in user_service.iter(options=[LOAD_PII]))
 
         # display to screen with pager or not
-        if pager and not json_output:
-            echo_command = click.echo_via_pager
-        else:
-            echo_command = click.echo
-
-        # print to screen
-        echo_command(json.dumps(users_json, indent=2, default=convert_json))
+        echo_json_list(users_json, pager=pager and not json_output, default=convert_json)
 
 
 @user.command()
@@ -118,7 +108,7 @@ def delete(
         user_service = UserService(session)
 
         # first get the user and confirm deletion
-        user_record = user_service.get(user_id)
+        user_record = user_service.get(user_id, options=[LOAD_PII])
         click.echo("Deleting user:")
         click.echo(user_record.model_dump_json(indent=2))
         delete = click.confirm("Are you sure you want to delete it?")
@@ -1,5 +1,7 @@
 import uuid
+import json
 import datetime
+from typing import Any, Callable, Iterable, Iterator
 
 import click
 from sqlmodel import Session
@@ -42,3 +44,28 @@ def convert_json(arg):
         return arg.isoformat()
     else:
         raise NotImplementedError(f"conversion not implemented for {type(arg)}")
+
+
+def json_list_chunks(items: Iterable[Any], default: Callable[[Any], Any] | None = None) -> Iterator[str]:
+    """
+    Serialise the items as an indented JSON list (the same as `json.dumps(list(items), indent=2)`) one item at a
+    time, so that a large list never has to be held in memory
+
+    """
+    first = True
+    for item in items:
+        item_json = json.dumps(item, indent=2, default=default).replace("\n", "\n  ")
+        yield ("[\n  " if first else ",\n  ") + item_json
+        first = False
+
+    yield "[]\n" if first else "\n]\n"
+
+
+def echo_json_list(items: Iterable[Any], pager: bool = False, default: Callable[[Any], Any] | None = None):
+    """Print the items as a JSON list as they are produced, optionally using a pager"""
+    chunks = json_list_chunks(items, default=default)
+    if pager:
+        click.echo_via_pager(chunks)
+    else:
+        for chunk in chunks:
+            click.echo(chunk, nl=False)
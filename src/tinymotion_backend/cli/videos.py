@@ -1,6 +1,9 @@
 import os
 import uuid
 import json
+import hashlib
+import shutil
+import datetime
 
 import click
 from sqlmodel import Session
@@ -8,6 +11,10 @@ from sqlmodel import Session
 from tinymotion_backend import database
 from tinymotion_backend.services.video_service import VideoService
 from tinymotion_backend.core.config import settings
+from tinymotion_backend.core import storage
+from tinymotion_backend.core.exc import NotFoundError
+from tinymotion_backend.core.encryption import decrypt_stream
+from tinymotion_backend.cli.utils import echo_json_list
 
 
 @click.group()
@@ -21,26 +28,16 @@ def video():
 @click.option("-j", "--json-output", is_flag=True, default=False, help="Output JSON only, no extra messages")
 def list(pager: bool, json_output: bool):
     """List stored videos."""
-    with Session(database.engine) as session:
-        # get the list of Videos
+    with Session(database.read_engine) as session:
         video_service = VideoService(session, 0)
-        videos = video_service.list()
         if not json_output:
-            click.echo(f"Found {len(videos)} Videos")
+            click.echo(f"Found {video_service.count()} Videos")
 
-        # build a list of Videos in json format
-        videos_json = []
-        for video in videos:
-            videos_json.append(json.loads(video.json()))
+        # convert the Videos to json as they are read, rather than loading them all at once
+        videos_json = (json.loads(video.json()) for video in video_service.iter())
 
         # display to screen with pager or not
-        if pager and not json_output:
-            echo_command = click.echo_via_pager
-        else:
-            echo_command = click.echo
-
-        # print to screen
-        echo_command(json.dumps(videos_json, indent=2))
+        echo_json_list(videos_json, pager=pager and not json_output)
 
 
 @video.command()
@@ -60,7 +57,8 @@ def delete(
         click.echo("Deleting video:")
         click.echo(json.dumps(json.loads(video_record.json()), indent=2))
         video_path = os.path.join(settings.VIDEO_LIBRARY_PATH, video_record.video_name)
-        if not os.path.exists(video_path):
+        in_cold_storage = video_record.storage_tier == storage.TIER_COLD
+        if not in_cold_storage and not os.path.exists(video_path):
             raise RuntimeError(f"Cannot find video file to delete ({video_path})")
 
         delete = click.confirm("Are you sure you want to delete it?")
@@ -69,6 +67,127 @@ def delete(
             raise click.Abort()
 
         else:
-            # delete the video
+            # delete the video; the space of videos in cold storage is reclaimed by `video compact`
             video_service.delete(video_id)
-            os.unlink(video_path)
+            if not in_cold_storage:
+                os.unlink(video_path)
+            storage.delete_mirror_copy(video_record.video_name)
+
+
+@video.command()
+@click.option("-d", "--older-than-days", required=True, type=click.IntRange(min=0),
+              help="Move videos created more than this many days ago")
+def tier(older_than_days: int):
+    """Move old videos into pack files in cold storage.
+
+    Videos are appended to large append-only pack files in the cold storage
+    path and removed from the video library. They can still be read as
+    before. Suitable for running as a scheduled job. Pack files are not
+    mirrored, so this can't be used when a mirror is configured.
+    """
+    if settings.VIDEO_MIRROR_PATH is not None:
+        click.echo("Error: videos in cold storage are not mirrored, unset VIDEO_MIRROR_PATH to use cold storage")
+        raise click.Abort()
+
+    older_than = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=older_than_days)
+    with Session(database.engine) as session:
+        video_service = VideoService(session, None)
+        moved = video_service.move_to_cold_storage(older_than)
+
+    click.echo(f"Moved {moved} video(s) to cold storage")
+
+
+@video.command()
+def compact():
+    """Remove deleted videos from the pack files in cold storage.
+
+    The videos left in each pack with deleted videos are copied to a new pack
+    and the old pack is deleted, so the content of deleted videos doesn't stay
+    on disk. Suitable for running as a scheduled job, but not at the same time
+    as `video tier`.
+    """
+    with Session(database.engine) as session:
+        video_service = VideoService(session, None)
+        compacted, reclaimed = video_service.compact_cold_storage()
+
+    click.echo(f"Compacted {compacted} pack(s), reclaiming {reclaimed} bytes")
+
+
+@video.command()
+@click.argument('video_id', type=click.UUID)
+@click.argument('output_file', type=click.Path(dir_okay=False, writable=True))
+def decrypt(
+    video_id: uuid.UUID,
+    output_file: str,
+):
+    """Decrypt the specified video and write it to a file.
+
+    VIDEO_ID is the id of the video to decrypt.
+
+    OUTPUT_FILE is the path to write the decrypted video to.
+    """
+    with Session(database.engine) as session:
+        video_service = VideoService(session, None)
+        video_record = video_service.get(video_id)
+
+    with storage.open_video(video_record) as fin:
+        checksum = decrypt_stream(fin, output_file)
+
+    if checksum != video_record.sha256sum:
+        click.echo("Error: checksum of the decrypted video does not match the uploaded video")
+        raise click.Abort()
+
+    click.echo(f"Decrypted video to {output_file}")
+
+
+@video.command(name="mirror-repair")
+def mirror_repair():
+    """Repair mirrored copies of videos that failed to be written during upload.
+
+    Each outstanding repair task is fixed by copying the primary copy of the
+    video to the mirror volume and verifying its checksum.
+    """
+    if settings.VIDEO_MIRROR_PATH is None:
+        click.echo("Error: no mirror is configured (VIDEO_MIRROR_PATH)")
+        raise click.Abort()
+
+    tasks = storage.read_mirror_repair_log()
+    click.echo(f"Found {len(tasks)} mirror repair task(s)")
+
+    remaining = []
+    with Session(database.engine) as session:
+        video_service = VideoService(session, None)
+        for task in tasks:
+            video_name = task["video_name"]
+            video_path = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
+            mirror_path = storage.mirror_file_path(video_name)
+
+            # nothing to do if the video was deleted in the meantime
+            try:
+                video_record = video_service.get_by_video_name(video_name)
+            except NotFoundError:
+                click.echo(f"Video {video_name} no longer exists, skipping")
+                continue
+            if not os.path.exists(video_path):
+                click.echo(f"Error: primary copy of video {video_name} is missing ({video_path})")
+                remaining.append(task)
+                continue
+
+            try:
+                shutil.copyfile(video_path, mirror_path)
+                with open(mirror_path, "rb") as fh:
+                    mirror_hash = hashlib.file_digest(fh, "sha256").hexdigest()
+            except OSError as exc:
+                click.echo(f"Error: failed to copy video {video_name} to mirror: {exc}")
+                remaining.append(task)
+                continue
+
+            if mirror_hash != video_record.sha256sum_enc:
+                click.echo(f"Error: checksum of mirrored video {video_name} does not match")
+                remaining.append(task)
+                continue
+
+            click.echo(f"Repaired mirror of video {video_name}")
+
+    storage.write_mirror_repair_log(remaining)
+    click.echo(f"{len(tasks) - len(remaining)} resolved, {len(remaining)} remaining")
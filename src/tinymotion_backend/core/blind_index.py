@@ -0,0 +1,36 @@
+"""
+Blind indexes for encrypted columns.
+
+A blind index is a keyed hash (HMAC-SHA256) of a value that is stored
+encrypted. It lets the database compare values for equality (lookups and
+unique constraints) without being able to read them, and without the
+encryption itself having to be deterministic.
+
+"""
+import hmac
+import hashlib
+import functools
+
+from tinymotion_backend.core.config import settings
+
+
+# length of the hex digests stored in the blind index columns
+BLIND_INDEX_LENGTH = 64
+
+
+@functools.lru_cache(maxsize=4)
+def _hmac_for_key(key: str) -> hmac.HMAC:
+    return hmac.new(key.encode("utf-8"), digestmod=hashlib.sha256)
+
+
+def blind_index(value: str | None) -> str | None:
+    """Compute the blind index of the given value using `settings.DATABASE_BLIND_INDEX_KEY`"""
+    if value is None:
+        return None
+    if settings.DATABASE_BLIND_INDEX_KEY is None:
+        raise RuntimeError("DATABASE_BLIND_INDEX_KEY has not been set")
+
+    mac = _hmac_for_key(settings.DATABASE_BLIND_INDEX_KEY).copy()
+    mac.update(value.encode("utf-8"))
+
+    return mac.hexdigest()
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -16,10 +18,65 @@ class Settings(BaseSettings):
     FILE_CHUNK_SIZE_BYTES: int = 1024 * 1024 * 10  # default to 10 MB
 
     DATABASE_URI: str = "sqlite:///tinymotion.db"
+    # URI used by the API's asyncio engine, by default DATABASE_URI with the matching asyncio driver
+    DATABASE_ASYNC_URI: str | None = None
+    # URI used for read-only work (e.g. a PostgreSQL replica), by default DATABASE_URI opened read-only
+    DATABASE_READ_URI: str | None = None
     DATABASE_SECRET_KEY: str | None = None
+    DATABASE_BLIND_INDEX_KEY: str | None = None  # key for the blind indexes used to look up encrypted columns
+    # cache of decrypted column values in each process, keyed by ciphertext (0 to disable). Note this keeps
+    # decrypted personal information in memory for as long as it is cached.
+    DATABASE_DECRYPT_CACHE_SIZE: int = 0
+    DATABASE_DECRYPT_CACHE_TTL_SECONDS: float | None = None  # how long values are cached for (None for no limit)
+    # ids of new records: time-ordered UUIDs (version 7) keep inserts at the end of the primary key indexes,
+    # "uuid4" gives random ones. Both can be mixed in the same table.
+    DATABASE_ID_GENERATOR: Literal["uuid7", "uuid4"] = "uuid7"
+
+    # run writes (the API's asynchronous ones included) on a dedicated writer thread per process, which commits
+    # concurrent writes together
+    DATABASE_WRITE_COORDINATOR: bool = False
+    DATABASE_WRITE_BATCH_SIZE: int = 64  # maximum number of writes per group commit
+    DATABASE_WRITE_BATCH_DELAY_MS: float = 2.0  # how long to wait for more writes to join a group commit
+
+    # the SQL statements run for each API request are counted and logged (at debug level). Optionally return the
+    # count and time in the X-DB-Query-Count and X-DB-Query-Time-Ms response headers.
+    DATABASE_QUERY_STATS_HEADERS: bool = False
+    # warn when the same statement runs this many times in one request or command, a likely N+1 (0 to disable)
+    DATABASE_QUERY_REPEAT_WARNING: int = 10
+
+    # connection pool, for client/server databases such as PostgreSQL (SQLite uses SQLAlchemy's defaults).
+    # Each worker process has its own pool so the server must allow workers * (pool size + overflow) connections.
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_POOL_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT_SECONDS: float = 30.0  # how long to wait for a connection from a full pool
+    DATABASE_POOL_PRE_PING: bool = True  # check connections are alive before using them
+    DATABASE_POOL_RECYCLE_SECONDS: int = 1800  # replace connections older than this, -1 to disable
+
+    # SQLite tuning, applied to each new connection. WAL lets readers run alongside the (single) writer and
+    # the busy timeout makes writers wait for the lock instead of failing with "database is locked".
+    DATABASE_SQLITE_JOURNAL_MODE: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    DATABASE_SQLITE_BUSY_TIMEOUT_MS: int = 10000
+    # with WAL, NORMAL only syncs at checkpoints: the last commits survive the application crashing but can be lost
+    # on power loss or an OS crash (the database stays consistent). FULL syncs the WAL on every commit.
+    DATABASE_SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    DATABASE_SQLITE_CACHE_SIZE: int = -64000  # negative values are in KiB, i.e. default to 64 MB
+    DATABASE_SQLITE_MMAP_SIZE: int = 1024 * 1024 * 256  # default to 256 MB
+    DATABASE_SQLITE_TEMP_STORE: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
 
     VIDEO_LIBRARY_PATH: str = "./videos"
     VIDEO_SECRET_KEY: str | None = None
+    # "none": rely on the OS to write videos to disk, "fsync": fsync each video file when it is closed,
+    # "fsync_dir": also fsync the directory so the new file's directory entry is durable. With "none", videos stored
+    # shortly before a power loss or OS crash can be lost or truncated even though their record was committed.
+    VIDEO_DURABILITY: Literal["none", "fsync", "fsync_dir"] = "none"
+    VIDEO_PREALLOCATE: bool = True  # preallocate space for uploads of known size
+    VIDEO_MIRROR_PATH: str | None = None  # optional second volume to write a copy of each video to
+    VIDEO_MIRROR_WAIT: bool = True  # wait for the mirror copy to be written before completing an upload
+    VIDEO_MIRROR_REPAIR_LOG: str = "./video-mirror-repair.jsonl"
+    VIDEO_COLD_STORAGE_PATH: str = "./videos-cold"  # where old videos are packed by `video tier`
+    VIDEO_PACK_MAX_SIZE_BYTES: int = 1024 * 1024 * 1024 * 4  # default to 4 GB
+    VIDEO_BATCH_MAX_PARTS: int = 20
+    VIDEO_BATCH_MAX_WORKERS: int = 1  # number of parts to encrypt in parallel
 
 
     model_config = SettingsConfigDict(case_sensitive=True, env_prefix="TINYMOTION_", env_file=".tinymotion.env")
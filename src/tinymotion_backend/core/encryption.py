@@ -1,19 +1,190 @@
+import os
+import base64
 import logging
 import hashlib
 import struct
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
 
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from tinymotion_backend.core.config import settings
+from tinymotion_backend.core import storage
 
 
 logger = logging.getLogger(__name__)
 
 
-def encrypt_file(input_file_handle, output_file_path):
+# format of encrypted database values: version byte, 12 byte random nonce, AES-GCM ciphertext and tag
+COLUMN_FORMAT_AESGCM = b"\x01"
+COLUMN_NONCE_SIZE = 12
+
+
+class _ColumnCiphers:
+    """The ciphers for database values, derived from a database secret key"""
+
+    def __init__(self, secret_key: str):
+        key_material = hashlib.sha256(secret_key.encode("utf-8")).digest()
+
+        # values written before the AES-GCM format used sqlalchemy_utils' AesEngine: AES-CBC keyed with the
+        # SHA256 of the secret, using the first 16 bytes of that as a fixed IV, stored base64 encoded
+        self.legacy = Cipher(algorithms.AES(key_material), modes.CBC(key_material[:16]))
+
+        aesgcm_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"tinymotion database column encryption",
+        ).derive(key_material)
+        self.aesgcm = AESGCM(aesgcm_key)
+
+
+@functools.lru_cache(maxsize=4)
+def _column_ciphers(secret_key: str) -> _ColumnCiphers:
+    return _ColumnCiphers(secret_key)
+
+
+def _current_column_ciphers() -> _ColumnCiphers:
+    if settings.DATABASE_SECRET_KEY is None:
+        raise RuntimeError("DATABASE_SECRET_KEY has not been set")
+
+    return _column_ciphers(settings.DATABASE_SECRET_KEY)
+
+
+def encrypt_column_value(value: str) -> bytes:
+    """Encrypt a value for storing in the database using `settings.DATABASE_SECRET_KEY`"""
+    nonce = os.urandom(COLUMN_NONCE_SIZE)
+    ciphertext = _current_column_ciphers().aesgcm.encrypt(nonce, value.encode("utf-8"), None)
+
+    return COLUMN_FORMAT_AESGCM + nonce + ciphertext
+
+
+def decrypt_column_value(value: bytes | str) -> str:
+    """Decrypt a value stored in the database, in either the current or the legacy (AesEngine) format"""
+    ciphers = _current_column_ciphers()
+    if isinstance(value, str):
+        value = value.encode("ascii")
+
+    if value[:1] == COLUMN_FORMAT_AESGCM:
+        nonce = value[1:1 + COLUMN_NONCE_SIZE]
+        return ciphers.aesgcm.decrypt(nonce, value[1 + COLUMN_NONCE_SIZE:], None).decode("utf-8")
+
+    # legacy base64 text, which can never start with the version byte
+    decryptor = ciphers.legacy.decryptor()
+    padded = decryptor.update(base64.b64decode(value)) + decryptor.finalize()
+    padding_length = padded[-1]
+    if not 0 < padding_length <= 16 or padded[-padding_length:] != bytes([padding_length]) * padding_length:
+        raise ValueError("Invalid padding in encrypted value")
+
+    return padded[:-padding_length].decode("utf-8")
+
+
+class DecryptCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+
+class DecryptCache:
+    """
+    LRU cache of decrypted column values, keyed by their ciphertext.
+
+    The size and TTL are read from settings on each use, so the cache is
+    only active when `settings.DATABASE_DECRYPT_CACHE_SIZE` is set. It is
+    cleared whenever the database secret key changes.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: OrderedDict[bytes, tuple[str, float | None]] = OrderedDict()
+        self._secret_key: str | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def decrypt(self, value: bytes | str) -> str:
+        maxsize = settings.DATABASE_DECRYPT_CACHE_SIZE
+        if maxsize <= 0:
+            return decrypt_column_value(value)
+
+        cache_key = value.encode("ascii") if isinstance(value, str) else value
+        now = time.monotonic()
+        with self._lock:
+            if self._secret_key != settings.DATABASE_SECRET_KEY:
+                self._clear()
+                self._secret_key = settings.DATABASE_SECRET_KEY
+
+            cached = self._values.get(cache_key)
+            if cached is not None and (cached[1] is None or cached[1] > now):
+                self._values.move_to_end(cache_key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        # decrypt outside the lock so other threads aren't held up
+        decrypted = decrypt_column_value(value)
+
+        ttl = settings.DATABASE_DECRYPT_CACHE_TTL_SECONDS
+        with self._lock:
+            if self._secret_key == settings.DATABASE_SECRET_KEY:
+                self._values[cache_key] = (decrypted, None if ttl is None else now + ttl)
+                self._values.move_to_end(cache_key)
+                while len(self._values) > maxsize:
+                    self._values.popitem(last=False)
+
+        return decrypted
+
+    def info(self) -> DecryptCacheInfo:
+        with self._lock:
+            return DecryptCacheInfo(self.hits, self.misses, len(self._values), settings.DATABASE_DECRYPT_CACHE_SIZE)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# the cache used by the encrypted column types
+decrypt_cache = DecryptCache()
+
+
+def encrypt_column_value_legacy(value: str) -> str:
+    """Encrypt a value in the legacy (AesEngine) format, only needed for downgrading the database"""
+    padding_length = 16 - len(value.encode("utf-8")) % 16
+    encryptor = _current_column_ciphers().legacy.encryptor()
+    encrypted = encryptor.update(value.encode("utf-8") + bytes([padding_length]) * padding_length)
+    encrypted += encryptor.finalize()
+
+    return base64.b64encode(encrypted).decode("ascii")
+
+
+def encrypt_file(input_file_handle, output_file_path, metadata_parser=None, expected_size=None, mirror=None):
     """
     Encrypts the given file using Fernet.
 
+    If a metadata parser is passed (see `tinymotion_backend.core.mp4`), each
+    chunk of the unencrypted content is fed to it as it is read.
+
+    If the size of the unencrypted content is known (`expected_size`) the
+    space for the encrypted file is preallocated. The file is flushed to disk
+    according to `settings.VIDEO_DURABILITY`.
+
+    If a mirror is passed (see `tinymotion_backend.core.storage.MirrorWriter`)
+    the same encrypted chunks are written to it too. The caller is
+    responsible for closing or aborting the mirror.
+
     Returns the SHA256 checksum of the unencrypted content and the encrypted
     content.
 
@@ -27,6 +198,13 @@ def encrypt_file(input_file_handle, output_file_path):
 
     # next we store the video file to disk
     with open(output_file_path, "wb") as out_file:
+        preallocated = False
+        if expected_size is not None and settings.VIDEO_PREALLOCATE:
+            preallocated = storage.preallocate(
+                out_file.fileno(),
+                storage.encrypted_file_size(expected_size, settings.FILE_CHUNK_SIZE_BYTES),
+            )
+
         while content := input_file_handle.read(settings.FILE_CHUNK_SIZE_BYTES):
             # apply encryption
             enc_content = fernet.encrypt(content)
@@ -39,13 +217,30 @@ def encrypt_file(input_file_handle, output_file_path):
             # write the encrypted content to file
             out_file.write(enc_content)
 
+            # and to the mirror
+            if mirror is not None:
+                mirror.write(enc_content_len + enc_content)
+
             # computing the hash of the unencrypted content
             hash_orig.update(content)
 
+            # extracting container metadata from the unencrypted content
+            if metadata_parser is not None:
+                metadata_parser.feed(content)
+
             # computing the hash of the encrypted content
             hash_enc.update(enc_content_len)
             hash_enc.update(enc_content)
 
+        # discard any unused preallocated space (e.g. if the expected size was wrong)
+        if preallocated:
+            out_file.truncate()
+
+        storage.sync_file(out_file, settings.VIDEO_DURABILITY)
+
+    if settings.VIDEO_DURABILITY == storage.DURABILITY_FSYNC_DIR:
+        storage.fsync_directory(output_file_path)
+
     return hash_orig.hexdigest(), hash_enc.hexdigest()
 
 
@@ -55,6 +250,18 @@ def decrypt_file(input_file_path, output_file_path):
 
     Returns the sha256 checksum of the decrypted file.
 
+    """
+    with open(input_file_path, 'rb') as fin:
+        return decrypt_stream(fin, output_file_path)
+
+
+def decrypt_stream(input_file_handle, output_file_path):
+    """
+    Decrypts the encrypted content read from the given file handle and
+    stores it at the given output file path.
+
+    Returns the sha256 checksum of the decrypted content.
+
     """
     # Fernet object for decrypting the video
     fernet = Fernet(settings.VIDEO_SECRET_KEY)
@@ -62,13 +269,13 @@ def decrypt_file(input_file_path, output_file_path):
     # sha256 object for calculating the hash
     hash_decrypted = hashlib.sha256()
 
-    # open the files and do the decryption
-    with open(input_file_path, 'rb') as fin, open(output_file_path, 'wb') as fout:
+    # open the output file and do the decryption
+    with open(output_file_path, 'wb') as fout:
         while True:
-            size_data = fin.read(4)
+            size_data = input_file_handle.read(4)
             if len(size_data) == 0:
                 break
-            chunk_enc = fin.read(struct.unpack("<I", size_data)[0])
+            chunk_enc = input_file_handle.read(struct.unpack("<I", size_data)[0])
             chunk_dec = fernet.decrypt(chunk_enc)
             hash_decrypted.update(chunk_dec)
             fout.write(chunk_dec)
@@ -1,3 +1,24 @@
+import sqlalchemy
+
+
+# SQLSTATE for a unique constraint violation on PostgreSQL (and other databases following the standard)
+UNIQUE_VIOLATION_SQLSTATE = "23505"
+
+
+def is_unique_violation(exc: sqlalchemy.exc.IntegrityError) -> bool:
+    """
+    Whether the database error was caused by violating a unique constraint
+
+    Uses the SQLSTATE reported by the driver where available (psycopg), falling
+    back to the error message for SQLite, which does not report one.
+
+    """
+    orig = exc.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if sqlstate is not None:
+        return sqlstate == UNIQUE_VIOLATION_SQLSTATE
+
+    return "UNIQUE constraint failed" in str(orig) or "duplicate key" in str(orig)
 
 
 class TinyMotionException(Exception):
@@ -33,3 +54,7 @@ class NoConsentError(TinyMotionException):
 
 class InvalidAccessKeyError(TinyMotionException):
     """No user exists with the given access key"""
+
+
+class ChecksumMismatchError(TinyMotionException):
+    """The checksum of a copied file does not match the one recorded for it"""
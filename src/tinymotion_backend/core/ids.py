@@ -0,0 +1,77 @@
+"""
+Ids of new records.
+
+By default these are time-ordered UUIDs (version 7, RFC 9562): the first 48
+bits are the creation time in milliseconds, so new rows are appended at the
+end of the primary key indexes rather than inserted at random places in
+them, and ids sort (roughly) in creation order. The remaining bits are
+random, except for a counter that keeps the ids generated by a process
+strictly increasing within the same millisecond.
+
+`settings.DATABASE_ID_GENERATOR` switches back to random (version 4) UUIDs.
+Both kinds are stored the same way, so existing rows keep their ids.
+
+"""
+import os
+import time
+import uuid
+import threading
+
+from tinymotion_backend.core.config import settings
+
+
+_UUID7_COUNTER_BITS = 12  # rand_a, used as a counter within the same millisecond
+_UUID7_RANDOM_BITS = 62  # rand_b
+
+_lock = threading.Lock()
+_last_timestamp_ms = 0
+_last_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    A version 7 UUID, using the 12 bits after the timestamp as a counter
+    (RFC 9562 method 1). Ids from the same process are strictly increasing,
+    even if the clock goes backwards or the counter runs out within a
+    millisecond (the timestamp is then advanced by a millisecond).
+
+    """
+    global _last_timestamp_ms, _last_counter
+
+    timestamp_ms = time.time_ns() // 1_000_000
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    with _lock:
+        if timestamp_ms > _last_timestamp_ms:
+            # start the counter from a random value in its lower half, leaving room to increment it
+            counter = random_bits >> (80 - _UUID7_COUNTER_BITS + 1)
+        else:
+            timestamp_ms = _last_timestamp_ms
+            counter = _last_counter + 1
+            if counter >> _UUID7_COUNTER_BITS:
+                timestamp_ms += 1
+                counter = 0
+        _last_timestamp_ms, _last_counter = timestamp_ms, counter
+
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76  # version
+    value |= counter << 64
+    value |= 0b10 << 62  # variant
+    value |= random_bits & ((1 << _UUID7_RANDOM_BITS) - 1)
+
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp(id: uuid.UUID) -> float:
+    """The creation time (in seconds since the epoch) of a version 7 UUID"""
+    if id.version != 7:
+        raise ValueError(f"Not a version 7 UUID: {id}")
+
+    return (id.int >> 80) / 1000
+
+
+def new_id() -> uuid.UUID:
+    """The id of a new record, from the generator chosen by `settings.DATABASE_ID_GENERATOR`"""
+    if settings.DATABASE_ID_GENERATOR == "uuid4":
+        return uuid.uuid4()
+
+    return uuid7()
@@ -0,0 +1,240 @@
+"""
+Counting the SQL statements issued, and the time spent running them, for
+each API request or CLI command, to spot code that makes more round trips to
+the database than it needs to (e.g. N+1 queries from loading relationships
+in a loop).
+
+Statements are counted on the engines created by `tinymotion_backend.database`
+for whatever is being tracked in the current context (see `track_queries`),
+and their query plans can be checked for full table scans (see
+`assert_no_full_scans`). Statements run on another thread, such as the write
+coordinator's, are not counted for the request that submitted them.
+
+"""
+import re
+import time
+import logging
+import collections
+import contextlib
+import contextvars
+from typing import Collection, Iterator, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tinymotion_backend.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Query-Time-Ms"
+
+
+class QueryStats:
+    """The statements run while tracking queries (see `track_queries`)"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # seconds
+        # statements whose compiled form was taken from (or had to be added to) SQLAlchemy's statement cache;
+        # the others (e.g. raw SQL) aren't cached at all
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # number of times each statement was run, by its SQL
+        self.statements: collections.Counter[str] = collections.Counter()
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration * 1000
+
+    def repeated(self, times: int) -> dict[str, int]:
+        """The statements that were run at least `times` times, a sign of N+1 queries"""
+        return {statement: count for statement, count in self.statements.items() if count >= times}
+
+    def __str__(self) -> str:
+        return (
+            f"{self.count} queries in {self.duration_ms:.1f} ms "
+            f"({self.cache_hits} cached, {self.cache_misses} compiled)"
+        )
+
+
+class FullScan(NamedTuple):
+    """A statement whose query plan reads a whole table (see `assert_no_full_scans`)"""
+    table: str
+    statement: str
+    plan: list[str]
+
+
+class _PlanCheck(NamedTuple):
+    tables: Collection[str] | None
+    full_scans: list[FullScan]
+
+
+_current_stats: contextvars.ContextVar[QueryStats | None] = contextvars.ContextVar("query_stats", default=None)
+_current_plan_check: contextvars.ContextVar[_PlanCheck | None] = contextvars.ContextVar("plan_check", default=None)
+
+# the statement prefix that shows the query plan, and the pattern of a full table scan in the plan, for each dialect
+_EXPLAIN = {
+    "sqlite": ("EXPLAIN QUERY PLAN ", re.compile(r"^SCAN (\w+)$")),
+    "postgresql": ("EXPLAIN ", re.compile(r"Seq Scan on (\w+)")),
+}
+
+
+def _query_plan(conn, statement: str, parameters) -> list[str]:
+    """The lines of the query plan of the statement, run on the same DBAPI connection"""
+    prefix, _ = _EXPLAIN[conn.dialect.name]
+    # a raw cursor, so the EXPLAIN isn't itself counted or checked
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail), EXPLAIN rows are one line of text
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _check_plan(conn, statement: str, parameters, executemany: bool) -> None:
+    plan_check = _current_plan_check.get()
+    if plan_check is None or conn.dialect.name not in _EXPLAIN:
+        return
+    if statement.lstrip().split(None, 1)[0].upper() not in ("SELECT", "UPDATE", "DELETE", "WITH"):
+        return
+
+    plan = _query_plan(conn, statement, parameters[0] if executemany else parameters)
+    _, full_scan = _EXPLAIN[conn.dialect.name]
+    for line in plan:
+        match = full_scan.search(line.strip())
+        if match and (plan_check.tables is None or match.group(1) in plan_check.tables):
+            plan_check.full_scans.append(FullScan(match.group(1), statement, plan))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _check_plan(conn, statement, parameters, executemany)
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None or not conn.info.get("query_start_time"):
+        return
+
+    stats.duration += time.perf_counter() - conn.info["query_start_time"].pop()
+    stats.count += 1
+    stats.statements[statement] += 1
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit == CACHE_HIT:
+        stats.cache_hits += 1
+    elif cache_hit == CACHE_MISS:
+        stats.cache_misses += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count (and check) the statements run on the engine (the `sync_engine` of an asyncio engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextlib.contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Count the statements run in the current context (including the threads
+    and tasks started from it) until the block exits.
+
+    Blocks can be nested; the statements are only counted by the innermost.
+
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def log_query_stats(stats: QueryStats, description: str) -> None:
+    """Log the statements run for a request or command, warning about repeated statements"""
+    logger.debug(f"{description}: {stats}")
+
+    if settings.DATABASE_QUERY_REPEAT_WARNING > 0:
+        for statement, count in stats.repeated(settings.DATABASE_QUERY_REPEAT_WARNING).items():
+            logger.warning(f"{description}: statement run {count} times (N+1 query?): {statement}")
+
+
+@contextlib.contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[QueryStats]:
+    """
+    Fail (with AssertionError) if the block runs more than `max_queries`
+    statements, e.g. in tests to catch extra round trips being added
+
+    """
+    with track_queries() as stats:
+        yield stats
+
+    if stats.count > max_queries:
+        statements = "\n".join(f"{count} x {statement}" for statement, count in stats.statements.items())
+        raise AssertionError(f"Expected at most {max_queries} queries, ran {stats.count}:\n{statements}")
+
+
+@contextlib.contextmanager
+def assert_no_full_scans(tables: Collection[str] | None = None) -> Iterator[list[FullScan]]:
+    """
+    Fail (with AssertionError) if any statement run in the block reads the
+    whole of one of the given tables (or any table) without using an index,
+    e.g. in tests to catch lookups that are missing an index.
+
+    The plan of each SELECT, UPDATE and DELETE is checked with `EXPLAIN QUERY
+    PLAN` on SQLite or `EXPLAIN` on PostgreSQL just before it runs. Scans of
+    an index (e.g. reading the first page of a table in index order) are not
+    counted as full scans. Note that PostgreSQL prefers sequential scans for
+    tables small enough to fit in a few pages, so this is most useful on
+    SQLite, which plans the same way whatever the size of the table.
+
+    """
+    plan_check = _PlanCheck(tables, [])
+    token = _current_plan_check.set(plan_check)
+    try:
+        yield plan_check.full_scans
+    finally:
+        _current_plan_check.reset(token)
+
+    if len(plan_check.full_scans):
+        scans = "\n".join(
+            f"{scan.table}: {scan.statement}\n    " + "\n    ".join(scan.plan) for scan in plan_check.full_scans
+        )
+        raise AssertionError(f"{len(plan_check.full_scans)} queries scanned a whole table:\n{scans}")
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware that counts the statements run for each HTTP request,
+    logging them and, if `settings.DATABASE_QUERY_STATS_HEADERS` is set,
+    returning them in the response headers.
+
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_stats(message: Message) -> None:
+                if message["type"] == "http.response.start" and settings.DATABASE_QUERY_STATS_HEADERS:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(QUERY_COUNT_HEADER, str(stats.count))
+                    headers.append(QUERY_TIME_HEADER, f"{stats.duration_ms:.1f}")
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                log_query_stats(stats, f"{scope['method']} {scope['path']}")
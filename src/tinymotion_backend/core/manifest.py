@@ -0,0 +1,176 @@
+"""
+Manifests of the video library, for copying it elsewhere incrementally.
+
+A manifest lists the stored (encrypted) file of each video whose upload has
+completed, with its size and checksum (`Video.video_size` and
+`Video.sha256sum_enc`). Comparing the manifest of the library with the one
+of a previous copy gives the files that need copying, without reading the
+files themselves. Manifests are stored as JSON lines, one video per line;
+entries can be appended as videos are copied, so an interrupted copy picks
+up where it left off.
+
+"""
+import os
+import json
+import time
+import threading
+import hashlib
+import datetime
+from typing import IO, Iterable, NamedTuple
+
+from tinymotion_backend.core import storage
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.exc import ChecksumMismatchError
+
+
+# file name of the manifest alongside a copy of the library
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+# size of the reads and writes when copying a video
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ManifestEntry(NamedTuple):
+    """A video's stored file"""
+    video_name: str
+    size: int
+    sha256sum_enc: str
+    created_at: datetime.datetime
+
+    @classmethod
+    def from_video(cls, video) -> "ManifestEntry | None":
+        """The entry of the given Video, or None if its upload hasn't completed (and so has no checksum yet)"""
+        if video.sha256sum_enc is None or video.video_size is None:
+            return None
+
+        return cls(video.video_name, video.video_size, video.sha256sum_enc, video.created_at)
+
+    def to_json(self) -> str:
+        return json.dumps({**self._asdict(), "created_at": self.created_at.isoformat()})
+
+    @classmethod
+    def from_json(cls, line: str) -> "ManifestEntry":
+        data = json.loads(line)
+        return cls(**{**data, "created_at": datetime.datetime.fromisoformat(data["created_at"])})
+
+
+class ManifestDiff(NamedTuple):
+    """What needs to change to bring a copy of the library up to date"""
+    to_copy: list[ManifestEntry]  # missing from the copy, or changed
+    to_delete: list[str]  # names of the videos in the copy that are no longer in the library
+    unchanged: int
+
+
+def build_manifest(videos: Iterable) -> dict[str, ManifestEntry]:
+    """The manifest of the given Videos, by name, leaving out the ones still being uploaded"""
+    entries = (ManifestEntry.from_video(video) for video in videos)
+
+    return {entry.video_name: entry for entry in entries if entry is not None}
+
+
+def read_manifest(path: str) -> dict[str, ManifestEntry]:
+    """Read the manifest written by `write_manifest`, empty if there isn't one"""
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as fh:
+        # a line without its newline is an append that was interrupted, later lines replace earlier ones
+        entries = (ManifestEntry.from_json(line) for line in fh if line.endswith("\n") and line.strip())
+        return {entry.video_name: entry for entry in entries}
+
+
+def write_manifest(path: str, entries: Iterable[ManifestEntry]) -> None:
+    """Write the manifest, replacing any previous one only once it is complete"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fh:
+        for entry in entries:
+            fh.write(entry.to_json() + "\n")
+        storage.sync_file(fh, settings.VIDEO_DURABILITY)
+    os.replace(tmp_path, path)
+
+
+def append_manifest(path: str, entry: ManifestEntry) -> None:
+    """Add (or replace) one entry of the manifest, without rewriting it"""
+    with open(path, "a") as fh:
+        fh.write(entry.to_json() + "\n")
+        storage.sync_file(fh, settings.VIDEO_DURABILITY)
+
+
+def diff_manifests(source: dict[str, ManifestEntry], target: dict[str, ManifestEntry]) -> ManifestDiff:
+    """Compare the manifest of the library (source) with the manifest of a copy of it (target)"""
+    to_copy = [
+        entry for name, entry in source.items()
+        if name not in target or target[name][:3] != entry[:3]
+    ]
+    to_delete = [name for name in target if name not in source]
+
+    return ManifestDiff(to_copy, to_delete, len(source) - len(to_copy))
+
+
+class BandwidthLimiter:
+    """
+    Limits the combined rate of the copies sharing it to `bytes_per_second`.
+
+    Each chunk reserves the time it takes at that rate, after the chunks
+    before it; the copy is paused until then. Thread-safe.
+
+    """
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._available_at = 0.0
+
+    def consume(self, size: int) -> None:
+        """Account for `size` bytes having been copied, pausing if they were copied too fast"""
+        with self._lock:
+            now = time.monotonic()
+            self._available_at = max(self._available_at, now) + size / self.bytes_per_second
+            delay = self._available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def copy_video(
+    source: IO[bytes], target_path: str, entry: ManifestEntry, limiter: BandwidthLimiter | None = None,
+) -> None:
+    """
+    Copy a video's stored file from the open `source` to `target_path`,
+    checking it against its manifest entry.
+
+    The file is written next to the target and only renamed into place once
+    its size and checksum have been verified, so the target is never left
+    with a partial or corrupt copy. Raises ChecksumMismatchError if they
+    don't match.
+
+    """
+    tmp_path = target_path + ".tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as fout:
+            while chunk := source.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                fout.write(chunk)
+                size += len(chunk)
+                if limiter is not None:
+                    limiter.consume(len(chunk))
+            storage.sync_file(fout, settings.VIDEO_DURABILITY)
+
+        if size != entry.size or digest.hexdigest() != entry.sha256sum_enc:
+            raise ChecksumMismatchError(
+                f"Copy of video {entry.video_name} does not match its checksum "
+                f"({size} bytes, {digest.hexdigest()})"
+            )
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def file_matches(path: str, entry: ManifestEntry) -> bool:
+    """Whether the file exists and has the size of the manifest entry (its content isn't read)"""
+    try:
+        return os.path.getsize(path) == entry.size
+    except OSError:
+        return False
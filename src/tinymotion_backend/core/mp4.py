@@ -0,0 +1,197 @@
+import logging
+import struct
+
+from tinymotion_backend.models import VideoMetadata
+
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_boxes(data: bytes | memoryview, start: int = 0, end: int | None = None):
+    """Iterate over the (type, payload) of the boxes contained in the given buffer"""
+    if end is None:
+        end = len(data)
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield box_type, data[offset + header_size:offset + size]
+        offset += size
+
+
+def _find_box(data, box_type: bytes):
+    """Return the payload of the first child box of the given type, or None"""
+    for child_type, payload in _iter_boxes(data):
+        if child_type == box_type:
+            return payload
+    return None
+
+
+class Mp4MetadataParser:
+    """
+    Incremental parser for ISO base media file format (MP4/MOV) containers.
+
+    Chunks of the file are passed to `feed` in order as they are read. Only
+    the `moov` box is buffered, the contents of all other top-level boxes
+    (including the media data) are skipped over as they arrive. Once the
+    `moov` box has been parsed the extracted metadata is available from
+    `metadata` and further chunks are ignored.
+
+    """
+    # don't buffer more than this for the moov box
+    MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+    def __init__(self):
+        self._header = bytearray()
+        self._skip = 0
+        self._skip_to_end = False
+        self._moov: bytearray | None = None
+        self._moov_remaining = 0
+        self._first_box = True
+        self.done = False
+        self.metadata: VideoMetadata | None = None
+
+    def feed(self, data: bytes) -> None:
+        """Process the next chunk of the file"""
+        view = memoryview(data)
+        while len(view) and not self.done:
+            if self._skip_to_end:
+                return
+
+            if self._skip:
+                n = min(self._skip, len(view))
+                self._skip -= n
+                view = view[n:]
+                continue
+
+            if self._moov is not None:
+                n = min(self._moov_remaining, len(view))
+                self._moov += view[:n]
+                self._moov_remaining -= n
+                view = view[n:]
+                if self._moov_remaining == 0:
+                    self._parse_moov(self._moov)
+                    self._moov = None
+                    self.done = True
+                continue
+
+            # accumulate the box header
+            needed = 8
+            if len(self._header) >= 4 and struct.unpack_from(">I", self._header)[0] == 1:
+                needed = 16
+            n = min(needed - len(self._header), len(view))
+            self._header += view[:n]
+            view = view[n:]
+            if len(self._header) < needed:
+                continue
+            if needed == 8 and struct.unpack_from(">I", self._header)[0] == 1:
+                # 64-bit box size follows
+                continue
+
+            self._start_box()
+
+    def _start_box(self) -> None:
+        """Handle a complete top-level box header"""
+        size, box_type = struct.unpack_from(">I4s", self._header)
+        header_size = len(self._header)
+        if size == 1:
+            size = struct.unpack_from(">Q", self._header, 8)[0]
+        self._header = bytearray()
+
+        # stop parsing if this doesn't look like an ISO-BMFF file
+        if not all(32 <= c < 127 for c in box_type) or (size != 0 and size < header_size):
+            logger.debug("Input does not look like an MP4/MOV container, not extracting metadata")
+            self.done = True
+            return
+        if self._first_box and box_type not in (b"ftyp", b"wide", b"free", b"skip", b"moov", b"mdat"):
+            logger.debug("Input does not start with a known MP4/MOV box, not extracting metadata")
+            self.done = True
+            return
+        self._first_box = False
+
+        if box_type == b"moov":
+            if size == 0 or size - header_size > self.MAX_MOOV_SIZE:
+                logger.warning("moov box is too large, not extracting metadata")
+                self.done = True
+                return
+            self._moov = bytearray()
+            self._moov_remaining = size - header_size
+            if self._moov_remaining == 0:
+                self.done = True
+        elif size == 0:
+            # box extends to the end of the file
+            self._skip_to_end = True
+        else:
+            self._skip = size - header_size
+
+    def _parse_moov(self, moov: bytearray) -> None:
+        """Extract the metadata from the contents of the moov box"""
+        metadata = VideoMetadata()
+        try:
+            mvhd = _find_box(moov, b"mvhd")
+            if mvhd is not None:
+                if mvhd[0] == 1:
+                    timescale, duration = struct.unpack_from(">IQ", mvhd, 20)
+                else:
+                    timescale, duration = struct.unpack_from(">II", mvhd, 12)
+                if timescale:
+                    metadata.duration_seconds = duration / timescale
+
+            for box_type, trak in _iter_boxes(moov):
+                if box_type != b"trak":
+                    continue
+                mdia = _find_box(trak, b"mdia")
+                if mdia is None:
+                    continue
+                hdlr = _find_box(mdia, b"hdlr")
+                if hdlr is None or bytes(hdlr[8:12]) != b"vide":
+                    continue
+
+                # first video track found
+                tkhd = _find_box(trak, b"tkhd")
+                if tkhd is not None:
+                    offset = 76 if tkhd[0] == 0 else 88
+                    width, height = struct.unpack_from(">II", tkhd, offset)
+                    metadata.width = width >> 16
+                    metadata.height = height >> 16
+
+                mdhd = _find_box(mdia, b"mdhd")
+                media_timescale = None
+                if mdhd is not None:
+                    if mdhd[0] == 1:
+                        media_timescale = struct.unpack_from(">I", mdhd, 20)[0]
+                    else:
+                        media_timescale = struct.unpack_from(">I", mdhd, 12)[0]
+
+                minf = _find_box(mdia, b"minf")
+                stbl = _find_box(minf, b"stbl") if minf is not None else None
+                if stbl is not None:
+                    stsd = _find_box(stbl, b"stsd")
+                    if stsd is not None and struct.unpack_from(">I", stsd, 4)[0] > 0:
+                        metadata.codec = bytes(stsd[12:16]).decode("ascii", errors="replace")
+
+                    stts = _find_box(stbl, b"stts")
+                    if stts is not None and media_timescale:
+                        entry_count = struct.unpack_from(">I", stts, 4)[0]
+                        sample_count = 0
+                        sample_duration = 0
+                        for count, delta in struct.iter_unpack(">II", stts[8:8 + 8 * entry_count]):
+                            sample_count += count
+                            sample_duration += count * delta
+                        if sample_duration:
+                            metadata.frame_rate = sample_count * media_timescale / sample_duration
+                break
+
+        except (struct.error, IndexError) as exc:
+            logger.warning(f"Failed to parse moov box: {exc!r}")
+
+        self.metadata = metadata
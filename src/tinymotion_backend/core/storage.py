@@ -0,0 +1,420 @@
+import os
+import json
+import errno
+import logging
+import math
+import queue
+import datetime
+import hashlib
+import threading
+import contextlib
+import uuid
+
+from tinymotion_backend.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# valid values for settings.VIDEO_DURABILITY
+DURABILITY_NONE = "none"
+DURABILITY_FSYNC = "fsync"
+DURABILITY_FSYNC_DIR = "fsync_dir"
+
+# valid values for Video.storage_tier
+TIER_HOT = "hot"
+TIER_COLD = "cold"
+
+# serialises access to the mirror repair log
+_repair_log_lock = threading.Lock()
+
+
+def encrypted_chunk_size(plain_size: int) -> int:
+    """
+    Size on disk of one encrypted chunk with the given unencrypted size.
+
+    This is the 4 byte length prefix plus the base64 encoded Fernet token
+    (version, timestamp, IV, AES-CBC padded ciphertext and HMAC).
+
+    """
+    token_size = 1 + 8 + 16 + 16 * (plain_size // 16 + 1) + 32
+
+    return 4 + 4 * math.ceil(token_size / 3)
+
+
+def encrypted_file_size(plain_size: int, chunk_size: int) -> int:
+    """Size on disk of a file with the given unencrypted size after encryption"""
+    full_chunks, remainder = divmod(plain_size, chunk_size)
+    size = full_chunks * encrypted_chunk_size(chunk_size)
+    if remainder:
+        size += encrypted_chunk_size(remainder)
+
+    return size
+
+
+def preallocate(fd: int, size: int) -> bool:
+    """
+    Reserve disk space for the file so that writes land contiguously and
+    running out of space fails up front.
+
+    Returns whether the space was preallocated; `posix_fallocate` is not
+    available on all platforms, nor supported by all filesystems, in which
+    case this does nothing.
+
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as exc:
+        if exc.errno == errno.ENOSPC:
+            raise
+        logger.debug(f"Could not preallocate space for file: {exc!r}")
+        return False
+
+    return True
+
+
+def fsync_directory(path: str) -> None:
+    """Flush the directory entry of the given file to disk"""
+    dir_path = os.path.dirname(os.path.abspath(path))
+    try:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+    except OSError as exc:
+        # not possible on all platforms (e.g. Windows)
+        logger.debug(f"Could not open directory for fsync ({dir_path}): {exc!r}")
+        return
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def sync_file(file_handle, durability: str) -> None:
+    """Flush the given open file to disk according to the durability policy"""
+    if durability in (DURABILITY_FSYNC, DURABILITY_FSYNC_DIR):
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+
+
+def mirror_file_path(video_name: str) -> str | None:
+    """Path of the mirrored copy of the given video, or None if mirroring is not configured"""
+    if settings.VIDEO_MIRROR_PATH is None:
+        return None
+
+    return os.path.join(settings.VIDEO_MIRROR_PATH, video_name)
+
+
+def delete_mirror_copy(video_name: str) -> None:
+    """Delete the mirrored copy of the given video if it exists"""
+    mirror_path = mirror_file_path(video_name)
+    if mirror_path is not None and os.path.exists(mirror_path):
+        logger.debug(f"Deleting mirrored video: {mirror_path}")
+        os.unlink(mirror_path)
+
+
+def log_mirror_repair(video_name: str, error: str) -> None:
+    """Record that the mirrored copy of the given video needs to be repaired"""
+    logger.error(f"Failed to write mirrored copy of video {video_name}, logging repair task: {error}")
+    entry = {
+        "video_name": video_name,
+        "logged_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "error": error,
+    }
+    with _repair_log_lock, open(settings.VIDEO_MIRROR_REPAIR_LOG, "a") as fh:
+        fh.write(json.dumps(entry) + "\n")
+
+
+def read_mirror_repair_log() -> list[dict]:
+    """Return the outstanding mirror repair tasks"""
+    if not os.path.exists(settings.VIDEO_MIRROR_REPAIR_LOG):
+        return []
+
+    with _repair_log_lock, open(settings.VIDEO_MIRROR_REPAIR_LOG) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def write_mirror_repair_log(entries: list[dict]) -> None:
+    """Replace the outstanding mirror repair tasks"""
+    with _repair_log_lock:
+        tmp_path = settings.VIDEO_MIRROR_REPAIR_LOG + ".tmp"
+        with open(tmp_path, "w") as fh:
+            for entry in entries:
+                fh.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, settings.VIDEO_MIRROR_REPAIR_LOG)
+
+
+class MirrorWriter:
+    """
+    Writes a copy of a video's encrypted chunks to the mirror volume.
+
+    Chunks are handed over with `write` as the primary copy is written and
+    are written to the mirror on a background thread. If writing the mirror
+    fails a repair task is logged, the primary copy is not affected. The
+    number of chunks waiting to be written is bounded so memory use stays
+    limited if the mirror is slower than the primary.
+
+    """
+    _CLOSE = object()
+    _ABORT = object()
+
+    def __init__(self, video_name: str, mirror_path: str, max_queued_chunks: int = 4):
+        self.video_name = video_name
+        self.mirror_path = mirror_path
+        self.error: str | None = None
+        self._queue = queue.Queue(maxsize=max_queued_chunks)
+        self._thread = threading.Thread(target=self._run, name=f"mirror-{video_name}", daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes) -> None:
+        """Queue a chunk to be written to the mirror"""
+        self._queue.put(data)
+
+    def close(self) -> None:
+        """Finish writing the mirror; call once the primary copy has been stored successfully"""
+        self._queue.put(self._CLOSE)
+
+    def abort(self) -> None:
+        """Stop writing and remove the mirror; call if storing the primary copy failed"""
+        self._queue.put(self._ABORT)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for the mirror to be finished, returning whether it was written successfully"""
+        self._thread.join(timeout)
+
+        return not self._thread.is_alive() and self.error is None
+
+    def _run(self) -> None:
+        out_file = None
+        try:
+            out_file = open(self.mirror_path, "wb")
+        except Exception as exc:
+            self.error = repr(exc)
+
+        while True:
+            item = self._queue.get()
+
+            if item is self._ABORT:
+                if out_file is not None:
+                    out_file.close()
+                if os.path.exists(self.mirror_path):
+                    os.unlink(self.mirror_path)
+                return
+
+            if item is self._CLOSE:
+                if out_file is not None:
+                    try:
+                        sync_file(out_file, settings.VIDEO_DURABILITY)
+                        out_file.close()
+                        if settings.VIDEO_DURABILITY == DURABILITY_FSYNC_DIR:
+                            fsync_directory(self.mirror_path)
+                    except Exception as exc:
+                        self.error = repr(exc)
+                if self.error is not None:
+                    log_mirror_repair(self.video_name, self.error)
+                return
+
+            # after an error keep consuming chunks so the primary isn't blocked
+            if self.error is None:
+                try:
+                    out_file.write(item)
+                except Exception as exc:
+                    self.error = repr(exc)
+                    out_file.close()
+                    out_file = None
+
+
+def start_mirror(video_name: str) -> MirrorWriter | None:
+    """Start mirroring the given video, if a mirror is configured"""
+    mirror_path = mirror_file_path(video_name)
+    if mirror_path is None:
+        return None
+
+    logger.debug(f"Mirroring video to: {mirror_path}")
+
+    return MirrorWriter(video_name, mirror_path)
+
+
+def finish_mirror(mirror: MirrorWriter | None) -> None:
+    """Complete the mirror of a successfully stored video, waiting for it if configured"""
+    if mirror is None:
+        return
+
+    mirror.close()
+    if settings.VIDEO_MIRROR_WAIT:
+        mirror.wait()
+
+
+class PackRangeReader:
+    """Read-only file object for the byte range of one video within a pack file"""
+
+    def __init__(self, pack_path: str, offset: int, size: int):
+        self._fh = open(pack_path, "rb")
+        self._fh.seek(offset)
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fh.read(size)
+        self._remaining -= len(data)
+
+        return data
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def video_file_path(video) -> str:
+    """Path of the individual file of a video in the (hot) video library"""
+    return os.path.join(settings.VIDEO_LIBRARY_PATH, video.video_name)
+
+
+def pack_file_path(pack_name: str) -> str:
+    """Path of the given pack file in cold storage"""
+    return os.path.join(settings.VIDEO_COLD_STORAGE_PATH, pack_name)
+
+
+def list_packs() -> list[str]:
+    """Names of the pack files in cold storage, oldest first"""
+    if not os.path.isdir(settings.VIDEO_COLD_STORAGE_PATH):
+        return []
+
+    return sorted(name for name in os.listdir(settings.VIDEO_COLD_STORAGE_PATH) if name.endswith(".pack"))
+
+
+def delete_pack(pack_name: str) -> None:
+    """Delete the given pack file and its index from cold storage"""
+    pack_path = pack_file_path(pack_name)
+    for path in (pack_path, pack_path + ".idx"):
+        if os.path.exists(path):
+            logger.debug(f"Deleting pack file: {path}")
+            os.unlink(path)
+    if settings.VIDEO_DURABILITY == DURABILITY_FSYNC_DIR:
+        fsync_directory(pack_path)
+
+
+@contextlib.contextmanager
+def open_video(video):
+    """
+    Open the encrypted content of the given video for reading, wherever it
+    is stored.
+
+    Videos in the hot tier are read from their individual file in the video
+    library, videos in the cold tier are read from their range of the pack
+    file they were moved to.
+
+    """
+    if video.storage_tier == TIER_COLD:
+        fh = PackRangeReader(pack_file_path(video.pack_name), video.pack_offset, video.video_size)
+    else:
+        fh = open(video_file_path(video), "rb")
+    try:
+        yield fh
+    finally:
+        fh.close()
+
+
+class PackWriter:
+    """
+    Appends videos to the pack files in cold storage.
+
+    Pack files are append-only; each video's encrypted file is copied into
+    the pack verbatim, so the checksum of the range matches `sha256sum_enc`.
+    Alongside each pack an index file records the name, offset and size of
+    every video appended to it (the database remains the authoritative
+    record of where a video lives). A new pack is started once the current
+    one would grow past `settings.VIDEO_PACK_MAX_SIZE_BYTES`, or straight
+    away with `new_pack` (e.g. to compact a pack into).
+
+    """
+
+    def __init__(self, new_pack: bool = False):
+        os.makedirs(settings.VIDEO_COLD_STORAGE_PATH, exist_ok=True)
+        self.pack_name: str | None = None
+        self._pack_file = None
+        self._index_file = None
+        if new_pack:
+            self._new_pack()
+        else:
+            self._open_latest_pack()
+
+    def _open_latest_pack(self) -> None:
+        """Continue appending to the most recent pack if it still has room"""
+        packs = list_packs()
+        if len(packs) and os.path.getsize(pack_file_path(packs[-1])) < settings.VIDEO_PACK_MAX_SIZE_BYTES:
+            self._open_pack(packs[-1])
+        else:
+            self._new_pack()
+
+    def _new_pack(self) -> None:
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self._open_pack(f"{timestamp}-{uuid.uuid4().hex[:8]}.pack")
+
+    def _open_pack(self, pack_name: str) -> None:
+        self.close()
+        logger.debug(f"Appending to pack file: {pack_name}")
+        self.pack_name = pack_name
+        self._pack_file = open(pack_file_path(pack_name), "ab")
+        self._index_file = open(pack_file_path(pack_name) + ".idx", "a")
+
+    def append(self, source_path: str, video_name: str, sha256sum_enc: str) -> tuple[str, int]:
+        """
+        Append the encrypted video file to the current pack.
+
+        The copy is verified against `sha256sum_enc` and is made durable
+        according to `settings.VIDEO_DURABILITY` before returning the name of
+        the pack and the offset of the video within it.
+
+        """
+        with open(source_path, "rb") as fin:
+            return self.append_file(fin, os.path.getsize(source_path), video_name, sha256sum_enc)
+
+    def append_file(self, fin, size: int, video_name: str, sha256sum_enc: str) -> tuple[str, int]:
+        """Append the `size` bytes of encrypted video read from `fin` to the current pack (see `append`)"""
+        offset = self._pack_file.seek(0, os.SEEK_END)
+        if offset > 0 and offset + size > settings.VIDEO_PACK_MAX_SIZE_BYTES:
+            self._new_pack()
+            offset = 0
+
+        digest = hashlib.sha256()
+        while data := fin.read(settings.FILE_CHUNK_SIZE_BYTES):
+            self._pack_file.write(data)
+            digest.update(data)
+
+        if digest.hexdigest() != sha256sum_enc:
+            # drop the partial copy again
+            self._pack_file.flush()
+            self._pack_file.truncate(offset)
+            raise ValueError(f"Checksum of video {video_name} does not match the stored checksum")
+
+        self._pack_file.flush()
+        sync_file(self._pack_file, settings.VIDEO_DURABILITY)
+        self._index_file.write(json.dumps({"video_name": video_name, "offset": offset, "size": size}) + "\n")
+        self._index_file.flush()
+        sync_file(self._index_file, settings.VIDEO_DURABILITY)
+        if settings.VIDEO_DURABILITY == DURABILITY_FSYNC_DIR:
+            fsync_directory(pack_file_path(self.pack_name))
+
+        return self.pack_name, offset
+
+    def close(self) -> None:
+        if self._pack_file is not None:
+            self._pack_file.close()
+            self._pack_file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,19 +1,205 @@
+import time
+import sqlite3
+import contextlib
+from typing import Callable
+
 from sqlalchemy import event
-from sqlmodel import SQLModel, create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
 
 from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.instrumentation import instrument_engine
+
+
+# from https://stackoverflow.com/a/7831210, extended with the tuning pragmas from settings
+def _sqlite_pragmas_on_connect(dbapi_con, con_record):
+    cursor = dbapi_con.cursor()
+    cursor.execute('pragma foreign_keys=ON')
+    cursor.execute(f'pragma busy_timeout={int(settings.DATABASE_SQLITE_BUSY_TIMEOUT_MS)}')
+    cursor.execute(f'pragma journal_mode={settings.DATABASE_SQLITE_JOURNAL_MODE}')
+    cursor.execute(f'pragma synchronous={settings.DATABASE_SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'pragma cache_size={int(settings.DATABASE_SQLITE_CACHE_SIZE)}')
+    cursor.execute(f'pragma mmap_size={int(settings.DATABASE_SQLITE_MMAP_SIZE)}')
+    cursor.execute(f'pragma temp_store={settings.DATABASE_SQLITE_TEMP_STORE}')
+    cursor.close()
+
+
+def _sqlite_query_only_on_connect(dbapi_con, con_record):
+    # after the pragmas above, since setting the journal mode may need to write
+    cursor = dbapi_con.cursor()
+    cursor.execute('pragma query_only=ON')
+    cursor.close()
+
+
+def _read_only_execution_options(database_uri: str, read_only: bool) -> dict:
+    """Execution options that make the transactions of the engine read-only, where the dialect supports it"""
+    if read_only and make_url(database_uri).get_backend_name() == "postgresql":
+        return {"postgresql_readonly": True}
+
+    return {}
+
+
+def create_db_engine(database_uri: str, read_only: bool = False) -> Engine:
+    """
+    Create the engine for the given database, applying the connection
+    settings for its dialect.
+
+    The connections of a `read_only` engine refuse to write: SQLite
+    connections are opened with `pragma query_only`, and PostgreSQL
+    transactions are started as READ ONLY.
+
+    """
+    if make_url(database_uri).get_backend_name() == "sqlite":
+        # sessions are shared with the threadpool that FastAPI runs endpoints in
+        db_engine = create_engine(database_uri, connect_args={"check_same_thread": False})
+        event.listen(db_engine, 'connect', _sqlite_pragmas_on_connect)
+        if read_only:
+            event.listen(db_engine, 'connect', _sqlite_query_only_on_connect)
+
+    else:
+        db_engine = create_engine(
+            database_uri,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+            pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE_SECONDS,
+            execution_options=_read_only_execution_options(database_uri, read_only),
+        )
+    instrument_engine(db_engine)
+
+    return db_engine
+
+
+def async_database_uri(database_uri: str) -> str:
+    """The URI for connecting to the given database with an asyncio driver"""
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql":
+        url = url.set(drivername="postgresql+psycopg_async")
+
+    return url.render_as_string(hide_password=False)
+
+
+def create_async_db_engine(database_uri: str, read_only: bool = False, **kwargs) -> AsyncEngine:
+    """
+    Create the asyncio engine for the given database, applying the
+    connection settings for its dialect (see `create_db_engine`)
+    """
+    if make_url(database_uri).get_backend_name() == "sqlite":
+        db_engine = create_async_engine(database_uri, **kwargs)
+        event.listen(db_engine.sync_engine, 'connect', _sqlite_pragmas_on_connect)
+        if read_only:
+            event.listen(db_engine.sync_engine, 'connect', _sqlite_query_only_on_connect)
+
+    else:
+        db_engine = create_async_engine(
+            database_uri,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+            pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE_SECONDS,
+            execution_options=_read_only_execution_options(database_uri, read_only),
+            **kwargs,
+        )
+    instrument_engine(db_engine.sync_engine)
+
+    return db_engine
+
+
+def begin_write_transaction(session: Session) -> None:
+    """
+    Start the session's transaction in the database straight away, so that
+    the savepoints made with `session.begin_nested()` are nested in it.
+
+    pysqlite only sends BEGIN before the first INSERT, UPDATE or DELETE, so
+    a SAVEPOINT sent before then opens a transaction of its own and its
+    RELEASE commits, and rolling back the session doesn't undo it. This
+    sends the BEGIN of SQLAlchemy's pysqlite recipe, but only for the
+    transactions that need it: the recipe sends it from a `begin` event for
+    every transaction, so reads would start transactions too, and a session
+    that reads and then writes would fail to upgrade its snapshot whenever
+    another connection had written in between. The BEGIN is IMMEDIATE since
+    these transactions are going to write, so waiting for the write lock is
+    covered by the busy timeout.
+
+    Does nothing on other databases, or if the transaction has already
+    been started.
+
+    """
+    connection = session.connection()
+    if connection.dialect.name == "sqlite" and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def backup_database(
+    db_engine: Engine,
+    path: str,
+    pages_per_step: int = 1024,
+    step_pause_seconds: float = 0.0,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Copy a consistent snapshot of the SQLite database to `path` while it is
+    in use, returning its size in pages.
+
+    Uses SQLite's online backup API, copying `pages_per_step` pages at a
+    time and pausing for `step_pause_seconds` between steps, and calling
+    `progress(remaining, total)` (in pages) after each step. In WAL mode the
+    snapshot is pinned with a read transaction for the whole backup, so
+    writers carry on as usual (their changes are left out of the copy) and
+    the backup never has to start over. In the other journal modes writers
+    only wait for the step in progress, but the backup restarts whenever the
+    database is written to.
+
+    """
+    if db_engine.dialect.name != "sqlite":
+        raise ValueError(f"Online backups are only supported for SQLite databases, not {db_engine.dialect.name}")
+
+    pages = 0
 
+    def on_step(status: int, remaining: int, total: int) -> None:
+        nonlocal pages
+        pages = total
+        if progress is not None:
+            progress(remaining, total)
+        if remaining and step_pause_seconds > 0:
+            time.sleep(step_pause_seconds)
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(settings.DATABASE_URI, connect_args=connect_args)
+    connection = db_engine.raw_connection()
+    try:
+        source = connection.driver_connection
+        wal = source.execute("pragma journal_mode").fetchone()[0] == "wal"
+        if wal:
+            source.execute("begin")
+            source.execute("select count(*) from sqlite_master").fetchall()
+        try:
+            with contextlib.closing(sqlite3.connect(path)) as target:
+                source.backup(target, pages=pages_per_step, progress=on_step)
+        finally:
+            if wal:
+                source.rollback()
+    finally:
+        connection.close()
 
+    return pages
 
-# from https://stackoverflow.com/a/7831210
-def _fk_pragma_on_connect(dbapi_con, con_record):
-    dbapi_con.execute('pragma foreign_keys=ON')
 
+engine = create_db_engine(settings.DATABASE_URI)
+async_engine = create_async_db_engine(settings.DATABASE_ASYNC_URI or async_database_uri(settings.DATABASE_URI))
 
-event.listen(engine, 'connect', _fk_pragma_on_connect)
+# separate engines for read-only work (listings, exports, authentication), so that it doesn't share connections
+# and transactions with the writers
+read_engine = create_db_engine(settings.DATABASE_READ_URI or settings.DATABASE_URI, read_only=True)
+async_read_engine = create_async_db_engine(
+    async_database_uri(settings.DATABASE_READ_URI) if settings.DATABASE_READ_URI
+    else settings.DATABASE_ASYNC_URI or async_database_uri(settings.DATABASE_URI),
+    read_only=True,
+)
 
 
 def create_db_and_tables():
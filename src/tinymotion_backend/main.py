@@ -5,8 +5,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from tinymotion_backend.core.config import settings
+from tinymotion_backend import database
 from tinymotion_backend._version import __version__ as tinymotion_backend_version
 from tinymotion_backend.api.api_v1.api import api_v1_router
+from tinymotion_backend.core.instrumentation import QueryStatsMiddleware
+from tinymotion_backend.services.write_coordinator import stop_write_coordinators
 
 
 logging.basicConfig(
@@ -29,11 +32,21 @@ async def lifespan(app: FastAPI):
         raise RuntimeError("REFRESH_TOKEN_SECRET_KEY has not been set")
     if settings.DATABASE_SECRET_KEY is None:
         raise RuntimeError("DATABASE_SECRET_KEY has not been set")
+    if settings.DATABASE_BLIND_INDEX_KEY is None:
+        raise RuntimeError("DATABASE_BLIND_INDEX_KEY has not been set")
     if settings.VIDEO_SECRET_KEY is None:
         raise RuntimeError("VIDEO_SECRET_KEY has not been set")
 
     yield
 
+    # finish any writes that are still queued
+    stop_write_coordinators()
+    # close the connections of every engine, the read-only ones included
+    await database.async_engine.dispose()
+    await database.async_read_engine.dispose()
+    database.engine.dispose()
+    database.read_engine.dispose()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -41,4 +54,6 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(QueryStatsMiddleware)
+
 app.include_router(api_v1_router, prefix=settings.API_V1_STR)
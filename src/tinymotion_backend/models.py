@@ -1,46 +1,72 @@
 import datetime
 import uuid
 import functools
+from typing import Any
 
 import sqlalchemy
-from sqlalchemy_utils import StringEncryptedType
-from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+from sqlalchemy.orm import Session, declared_attr, deferred, object_session, undefer_group
 from sqlalchemy_utils import UUIDType
 from pydantic import EmailStr
 from sqlmodel import Field, SQLModel, Relationship, AutoString, Column, ForeignKey
 
-from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.blind_index import BLIND_INDEX_LENGTH, blind_index
+from tinymotion_backend.core.encryption import encrypt_column_value, decrypt_cache
+from tinymotion_backend.core.ids import new_id
 
 
 ##############################################################################
 # Custom types to use in models
 ##############################################################################
 
-class StringDate(sqlalchemy.types.TypeDecorator):
+class EncryptedString(sqlalchemy.types.TypeDecorator):
     """
-    Helper that converts dates to string for storing in StringEncryptedType and
-    back to date again when retrieving.
+    String encrypted at rest with AES-GCM using `settings.DATABASE_SECRET_KEY`
+    (see `tinymotion_backend.core.encryption.encrypt_column_value`).
+
+    The ciphertext is stored as binary and is different each time a value is
+    written, so encrypted columns cannot be compared in queries; columns that
+    need lookups have a blind index instead. Values written in the previous
+    format (base64 text from sqlalchemy_utils' `StringEncryptedType`) can
+    still be read. Decrypted values can be cached (see
+    `tinymotion_backend.core.encryption.DecryptCache`).
 
     """
-    impl = sqlalchemy.types.Date
+    impl = sqlalchemy.types.LargeBinary
+    cache_ok = True
 
-    def process_bind_param(self, value: datetime.date | str | None, dialect):
-        """Convert to string if not string already"""
+    def process_bind_param(self, value, dialect):
         if value is not None:
-            if isinstance(value, datetime.date):
-                value = value.isoformat()
+            value = encrypt_column_value(self.to_string(value))
 
         return value
 
-    def process_result_value(self, value: datetime.date | str | None, dialect):
-        """Convert back to date if not date already"""
+    def process_result_value(self, value, dialect):
         if value is not None:
-            if isinstance(value, str):
-                value = datetime.date.fromisoformat(value)
+            value = self.from_string(decrypt_cache.decrypt(bytes(value) if isinstance(value, memoryview) else value))
+
+        return value
 
+    def to_string(self, value) -> str:
+        return str(value)
+
+    def from_string(self, value: str):
         return value
 
 
+class EncryptedDate(EncryptedString):
+    """Date encrypted at rest, stored as an encrypted ISO format string"""
+    cache_ok = True
+
+    def to_string(self, value: datetime.date | str) -> str:
+        if isinstance(value, datetime.date):
+            value = value.isoformat()
+
+        return value
+
+    def from_string(self, value: str) -> datetime.date:
+        return datetime.date.fromisoformat(value)
+
+
 class DateTimeAware(sqlalchemy.types.TypeDecorator):
     """
     Helper that converts incoming DateTime to UTC and removes timezone for
@@ -49,6 +75,9 @@ class DateTimeAware(sqlalchemy.types.TypeDecorator):
 
     """
     impl = sqlalchemy.types.DateTime
+    # no state of its own, so statements using it can be cached (without this, no statement comparing against a
+    # created_at, such as each keyset page after the first, was ever taken from SQLAlchemy's compiled statement cache)
+    cache_ok = True
 
     def process_bind_param(self, value: datetime.datetime | None, dialect):
         """Convert to UTC and remove timeezone info"""
@@ -65,6 +94,225 @@ class DateTimeAware(sqlalchemy.types.TypeDecorator):
         return value
 
 
+# the blind index columns of each model, see `update_blind_indexes`
+_blind_index_columns: dict[type[SQLModel], dict[str, str]] = {}
+
+
+def update_blind_indexes(model: type[SQLModel], columns: dict[str, str]) -> None:
+    """
+    Keep blind index columns up to date whenever a row is inserted or updated.
+
+    `columns` maps the name of each encrypted column to the name of its blind
+    index column. On update only the indexes of the columns that were changed
+    are recomputed, so the (deferred) encrypted values aren't loaded and
+    decrypted for every update.
+
+    """
+    def _insert(mapper, connection, target):
+        for column, index_column in columns.items():
+            setattr(target, index_column, blind_index(getattr(target, column)))
+
+    def _update(mapper, connection, target):
+        attrs = sqlalchemy.inspect(target).attrs
+        for column, index_column in columns.items():
+            if attrs[column].history.has_changes():
+                setattr(target, index_column, blind_index(getattr(target, column)))
+
+    _blind_index_columns[model] = columns
+    sqlalchemy.event.listen(model, "before_insert", _insert)
+    sqlalchemy.event.listen(model, "before_update", _update)
+
+
+def add_blind_indexes(model: type[SQLModel], values: dict) -> dict:
+    """
+    Add the blind indexes of the encrypted values to a dict of column values,
+    for bulk inserts that don't go through the ORM's events.
+
+    """
+    for column, index_column in _blind_index_columns.get(model, {}).items():
+        if column in values:
+            values[index_column] = blind_index(values[column])
+
+    return values
+
+
+# the counters each model keeps on its parent rows, see `update_counters`
+_counters: dict[type[SQLModel], tuple[type[SQLModel], str, dict[str, str | None]]] = {}
+
+
+def update_counters(
+    model: type[SQLModel],
+    parent: type[SQLModel],
+    foreign_key: str,
+    counters: dict[str, str | None],
+) -> None:
+    """
+    Keep counter columns of the parent rows up to date whenever a row is
+    inserted, updated or deleted.
+
+    `foreign_key` is the name of the column referencing the parent and
+    `counters` maps the name of each counter column of the parent to the
+    column whose value each row adds to it, or to None to count the rows.
+    The counters are updated with the same connection as the row, so they
+    are committed or rolled back with it.
+
+    """
+    columns = [foreign_key, *(column for column in counters.values() if column is not None)]
+
+    def _after_insert(mapper, connection, target):
+        add_to_counters(connection, model, [_row_values(target, columns)], session=object_session(target))
+
+    def _after_delete(mapper, connection, target):
+        add_to_counters(connection, model, [_row_values(target, columns)], -1, session=object_session(target))
+
+    def _after_update(mapper, connection, target):
+        state = sqlalchemy.inspect(target)
+        history = {column: state.attrs[column].history for column in columns}
+        if not any(column_history.has_changes() for column_history in history.values()):
+            return
+
+        new_values = _row_values(target, columns)
+        old_values = {}
+        for column, column_history in history.items():
+            if column_history.has_changes() and not column_history.deleted:
+                # the previous value was never loaded, so count the parents' rows again instead
+                parent_ids = {state.committed_state.get(foreign_key), new_values[foreign_key]} - {None}
+                recount_counters(connection, parent, list(parent_ids))
+                return
+            old_values[column] = column_history.deleted[0] if column_history.deleted else new_values[column]
+
+        session = object_session(target)
+        add_to_counters(connection, model, [old_values], -1, session=session)
+        add_to_counters(connection, model, [new_values], session=session)
+
+    _counters[model] = (parent, foreign_key, counters)
+    sqlalchemy.event.listen(model, "after_insert", _after_insert)
+    sqlalchemy.event.listen(model, "after_delete", _after_delete)
+    sqlalchemy.event.listen(model, "after_update", _after_update)
+
+
+def _row_values(target: SQLModel, columns: list[str]) -> dict:
+    return {column: getattr(target, column) for column in columns}
+
+
+def add_to_counters(
+    connection: sqlalchemy.Connection,
+    model: type[SQLModel],
+    rows: list[dict],
+    sign: int = 1,
+    session: Session | None = None,
+) -> None:
+    """
+    Add (or with `sign=-1` remove) the rows' contributions to the counters
+    of their parents, with one UPDATE per parent.
+
+    This is done by the ORM events set up by `update_counters`; bulk inserts
+    that don't go through those events call it themselves. The counters of
+    parents loaded in `session` are expired, so they are loaded again with
+    what was committed (or what is left after a rollback to a savepoint).
+
+    """
+    if model not in _counters:
+        return
+    parent, foreign_key, counters = _counters[model]
+
+    deltas: dict[Any, dict[str, int]] = {}
+    for row in rows:
+        if row.get(foreign_key) is None:
+            continue
+        parent_deltas = deltas.setdefault(row[foreign_key], dict.fromkeys(counters, 0))
+        for counter, column in counters.items():
+            parent_deltas[counter] += sign * (1 if column is None else row.get(column) or 0)
+
+    table = parent.__table__
+    primary_key = table.primary_key.columns[0]
+    for parent_id, parent_deltas in deltas.items():
+        parent_deltas = {counter: delta for counter, delta in parent_deltas.items() if delta}
+        if not len(parent_deltas):
+            continue
+        connection.execute(
+            table.update()
+            .where(primary_key == parent_id)
+            .values({counter: table.c[counter] + delta for counter, delta in parent_deltas.items()})
+        )
+
+        parent_obj = None
+        if session is not None:
+            parent_obj = session.identity_map.get(sqlalchemy.inspect(parent).identity_key_from_primary_key([parent_id]))
+        if parent_obj is not None:
+            loaded = [counter for counter in parent_deltas if counter in sqlalchemy.inspect(parent_obj).dict]
+            if len(loaded):
+                session.expire(parent_obj, loaded)
+
+
+def recount_counters(
+    connection: sqlalchemy.Connection,
+    parent: type[SQLModel],
+    parent_ids: list[Any] | None = None,
+) -> int:
+    """
+    Recompute the counter columns of the parent rows (all of them, or those
+    with the given ids) from their child rows, returning how many rows had
+    wrong counts.
+
+    """
+    table = parent.__table__
+    primary_key = table.primary_key.columns[0]
+    values = {}
+    for model, (model_parent, foreign_key, counters) in _counters.items():
+        if model_parent is not parent:
+            continue
+        child_table = model.__table__
+        for counter, column in counters.items():
+            total = sqlalchemy.func.count() if column is None else sqlalchemy.func.sum(child_table.c[column])
+            values[counter] = (
+                sqlalchemy.select(sqlalchemy.func.coalesce(total, 0))
+                .where(child_table.c[foreign_key] == primary_key)
+                .scalar_subquery()
+            )
+    if not len(values):
+        return 0
+
+    statement = (
+        table.update()
+        .where(sqlalchemy.or_(*(table.c[counter] != value for counter, value in values.items())))
+        .values(values)
+    )
+    if parent_ids is not None:
+        statement = statement.where(primary_key.in_(parent_ids))
+
+    return connection.execute(statement).rowcount
+
+
+# name of the deferred group holding the encrypted (personally identifying) columns of a model
+PII_GROUP = "pii"
+
+# loader option to load (and decrypt) the PII columns up front, e.g. `service.get(id, options=[LOAD_PII])`
+LOAD_PII = undefer_group(PII_GROUP)
+
+
+def defer_columns(*columns: str, group: str = PII_GROUP) -> declared_attr:
+    """
+    Mapper arguments (for `__mapper_args__`) that map the given columns as a
+    deferred group.
+
+    Deferred columns are left out of the SELECT when the object is loaded
+    and are only loaded, together with the rest of their group, the first
+    time one of them is accessed or when the query asks for them with
+    `undefer_group`. Unloaded columns are also left out of `model_dump()`.
+
+    """
+    def __mapper_args__(cls) -> dict:
+        return {"properties": {column: deferred(cls.__table__.c[column], group=group) for column in columns}}
+
+    return declared_attr(__mapper_args__)
+
+
+def column_names(model: type[SQLModel]) -> list[str]:
+    """Names of all the column attributes of a model, including deferred ones"""
+    return [attr.key for attr in sqlalchemy.inspect(model).column_attrs]
+
+
 ##############################################################################
 # Token models
 ##############################################################################
@@ -89,33 +337,33 @@ class UserBase(SQLModel):
 
 
 class User(UserBase, table=True):
+    __mapper_args__ = defer_columns("email", "access_key")
+
     user_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=new_id,
     ))
     email: EmailStr = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
         nullable=False,
     ))
     access_key: str = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
+        nullable=False,
+    ))
+    # blind index of the access key, for looking up users and keeping access keys unique
+    access_key_bidx: str | None = Field(default=None, sa_column=Column(
+        sqlalchemy.String(BLIND_INDEX_LENGTH),
         index=True,
         unique=True,
         nullable=False,
     ))
 
 
+update_blind_indexes(User, {"access_key": "access_key_bidx"})
+
+
 class UserCreate(UserBase):
     email: EmailStr
     access_key: str
@@ -144,58 +392,52 @@ class InfantBase(SQLModel):
 
 
 class Infant(SQLModel, table=True):
+    # keyset pagination (see `BaseService.page`) orders by creation time then id
+    __table_args__ = (sqlalchemy.Index("ix_infant_created_at", "created_at", "infant_id"),)
+    __mapper_args__ = defer_columns("full_name", "nhi_number", "birth_date", "due_date")
+
     infant_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=new_id,
     ))
     created_at: datetime.datetime = Field(
         sa_type=DateTimeAware,
         default_factory=functools.partial(datetime.datetime.now, tz=datetime.timezone.utc),
     )
     created_by: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         ForeignKey('user.user_id'),
         nullable=False,
+        index=True,
     ))
     full_name: str = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
         nullable=False,
     ))
     nhi_number: str = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
+        nullable=False,
+    ))
+    # blind index of the NHI number, for looking up infants and keeping NHI numbers unique
+    nhi_number_bidx: str | None = Field(default=None, sa_column=Column(
+        sqlalchemy.String(BLIND_INDEX_LENGTH),
         index=True,
         unique=True,
         nullable=False,
     ))
     birth_date: datetime.date = Field(sa_column=Column(
-        StringEncryptedType(
-            StringDate,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedDate(),
         nullable=False,
     ))
     due_date: datetime.date = Field(sa_column=Column(
-        StringEncryptedType(
-            StringDate,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedDate(),
         nullable=False,
     ))
+    # number of consents and videos stored for the infant and the size of the videos, see `update_counters`
+    consent_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    video_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    video_bytes: int = Field(default=0, sa_type=sqlalchemy.BigInteger, sa_column_kwargs={"server_default": "0"})
 
     consents: list["Consent"] = Relationship(
         back_populates="infant",
@@ -207,6 +449,9 @@ class Infant(SQLModel, table=True):
     )
 
 
+update_blind_indexes(Infant, {"nhi_number": "nhi_number_bidx"})
+
+
 class InfantCreate(InfantBase):
     pass
 
@@ -238,41 +483,37 @@ class ConsentBase(SQLModel):
 
 
 class Consent(SQLModel, table=True):
+    # keyset pagination (see `BaseService.page`) orders by creation time then id
+    __table_args__ = (sqlalchemy.Index("ix_consent_created_at", "created_at", "consent_id"),)
+    __mapper_args__ = defer_columns("consent_giver_name", "consent_giver_email")
+
     consent_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=new_id,
     ))
     infant_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         ForeignKey('infant.infant_id'),
         nullable=False,
+        index=True,
     ))
     created_at: datetime.datetime = Field(
         sa_type=DateTimeAware,
         default_factory=functools.partial(datetime.datetime.now, tz=datetime.timezone.utc),
     )
     created_by: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         ForeignKey('user.user_id'),
         nullable=False,
+        index=True,
     ))
     consent_giver_name: str = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
         nullable=True,
     ))
     consent_giver_email: EmailStr = Field(sa_column=Column(
-        StringEncryptedType(
-            sqlalchemy.VARCHAR,
-            settings.DATABASE_SECRET_KEY,
-            AesEngine,
-            'pkcs5',
-        ),
+        EncryptedString(),
         nullable=True,
     ))
     collected_physically: bool = Field(
@@ -283,6 +524,9 @@ class Consent(SQLModel, table=True):
     infant: Infant = Relationship(back_populates="consents")
 
 
+update_counters(Consent, Infant, "infant_id", {"consent_count": None})
+
+
 class ConsentCreateViaNHI(ConsentBase):
     nhi_number: str
 
@@ -314,31 +558,47 @@ class VideoBase(SQLModel):
 
 
 class Video(VideoBase, table=True):
+    # keyset pagination (see `BaseService.page`) orders by creation time then id
+    __table_args__ = (sqlalchemy.Index("ix_video_created_at", "created_at", "video_id"),)
+
     video_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         primary_key=True,
-        default=uuid.uuid4,
+        default=new_id,
     ))
     infant_id: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         ForeignKey('infant.infant_id'),
         nullable=False,
+        index=True,
     ))
     created_at: datetime.datetime = Field(
         sa_type=DateTimeAware,
         default_factory=functools.partial(datetime.datetime.now, tz=datetime.timezone.utc),
     )
     created_by: uuid.UUID = Field(sa_column=Column(
-        UUIDType(binary=False),
+        UUIDType(binary=True),
         ForeignKey('user.user_id'),
         nullable=False,
+        index=True,
     ))
-    video_size: int | None = Field(default=None)
+    video_size: int | None = Field(default=None, sa_type=sqlalchemy.BigInteger)
     sha256sum_enc: str | None = Field(min_length=64, max_length=64)
+    duration_seconds: float | None = Field(default=None, index=True)
+    width: int | None = Field(default=None)
+    height: int | None = Field(default=None)
+    frame_rate: float | None = Field(default=None)
+    codec: str | None = Field(default=None)
+    storage_tier: str = Field(default="hot", sa_column_kwargs={"server_default": "hot"})
+    pack_name: str | None = Field(default=None)
+    pack_offset: int | None = Field(default=None, sa_type=sqlalchemy.BigInteger)
 
     infant: Infant = Relationship(back_populates="videos")
 
 
+update_counters(Video, Infant, "infant_id", {"video_count": None, "video_bytes": "video_size"})
+
+
 class VideoCreate(VideoBase):
     infant_id: uuid.UUID
 
@@ -347,14 +607,39 @@ class VideoCreateViaNHI(VideoBase):
     nhi_number: str
 
 
-class VideoUpdate(SQLModel):
+class VideoMetadata(SQLModel):
+    duration_seconds: float | None = None
+    width: int | None = None
+    height: int | None = None
+    frame_rate: float | None = None
+    codec: str | None = None
+
+
+class VideoUpdate(VideoMetadata):
     video_size: int | None = None
     sha256sum_enc: str | None = Field(min_length=64, max_length=64, default=None)
 
 
-class VideoOut(VideoBase):
+class VideoCreateBatch(VideoBase, VideoMetadata):
+    video_size: int
+    sha256sum_enc: str = Field(min_length=64, max_length=64)
+
+
+class VideoOut(VideoBase, VideoMetadata):
     video_id: uuid.UUID
     infant_id: uuid.UUID
     created_at: datetime.datetime
     created_by: uuid.UUID
     video_size: int
+
+
+class VideoBatchPartOut(SQLModel):
+    filename: str | None
+    success: bool
+    detail: str | None = None
+    video: VideoOut | None = None
+
+
+class VideoBatchOut(SQLModel):
+    nhi_number: str
+    parts: list[VideoBatchPartOut]
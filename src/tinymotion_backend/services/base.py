@@ -1,10 +1,27 @@
 import uuid
-from typing import Any, Generic, Optional, Type, TypeVar
+import json
+import asyncio
+import base64
+import datetime
+import binascii
+import functools
+from typing import Any, AsyncIterator, Callable, Generic, Iterator, NamedTuple, Optional, Sequence, Type, TypeVar
 
 import sqlalchemy
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.elements import ColumnElement
 from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tinymotion_backend.core.exc import UniqueConstraintError, NotFoundError
+from tinymotion_backend import database
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.exc import (
+    TinyMotionException, UniqueConstraintError, NotFoundError, InvalidInputError, is_unique_violation,
+)
+from tinymotion_backend.database import begin_write_transaction
+from tinymotion_backend.models import add_blind_indexes, add_to_counters, column_names
+from tinymotion_backend.services.write_coordinator import get_write_coordinator
 
 
 ModelType = TypeVar("ModelType", bound=SQLModel)
@@ -12,59 +29,719 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=SQLModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=SQLModel)
 
 
+def _new_db_obj(model: Type[SQLModel], obj: SQLModel, created_by: uuid.UUID | None) -> SQLModel:
+    # construct the db model object
+    db_obj = model(**obj.model_dump(mode='python'))
+
+    # add created by if exists
+    if created_by is not None:
+        db_obj.created_by = created_by
+
+    return db_obj
+
+
+def _create_write(db_obj: SQLModel) -> Callable[[Session], SQLModel]:
+    def _create(session: Session) -> SQLModel:
+        session.add(db_obj)
+        return db_obj
+
+    return _create
+
+
+def _update_write(model: Type[SQLModel], id: Any, obj_data: dict) -> Callable[[Session], SQLModel]:
+    def _update(session: Session) -> SQLModel:
+        db_obj = session.get(model, id)
+        if not db_obj:
+            raise NotFoundError("Record with specified id not found")
+        db_obj.sqlmodel_update(obj_data)
+        session.add(db_obj)
+        return db_obj
+
+    return _update
+
+
+def _delete_write(model: Type[SQLModel], id: Any) -> Callable[[Session], SQLModel]:
+    def _delete(session: Session) -> SQLModel:
+        db_obj = session.get(model, id)
+        if not db_obj:
+            raise NotFoundError("Record with specified id not found")
+        session.delete(db_obj)
+        return db_obj
+
+    return _delete
+
+
+class LookupStatement:
+    """
+    SELECT of the records whose `column` equals a value, for the hot lookups
+    (e.g. by access key or NHI number). Run it with the value as a parameter
+    named after the column:
+
+        session.exec(by_name(), params={"name": name}).one()
+
+    The statement is built once for each set of options and reused, so
+    SQLAlchemy neither rebuilds it nor recomputes its cache key on each call
+    and its compiled form always comes from the compiled statement cache.
+    Options are compared by identity, so only the statements for the most
+    recently used sets are kept: pass module-level constants such as
+    `LOAD_PII` for the options to be reused.
+
+    """
+
+    def __init__(self, column: InstrumentedAttribute, maxsize: int = 8):
+        self.column = column
+        self._statement = functools.lru_cache(maxsize=maxsize)(self._build)
+
+    def __call__(self, options: Sequence[ExecutableOption] = ()) -> Any:
+        return self._statement(tuple(options))
+
+    def _build(self, options: tuple[ExecutableOption, ...]) -> Any:
+        statement = select(self.column.class_).where(self.column == sqlalchemy.bindparam(self.column.key))
+
+        return statement.options(*options)
+
+
+def _map_objects(result: Any, fn: Callable[[SQLModel], SQLModel]) -> Any:
+    """Apply fn to the ORM object(s) in the result of a write"""
+    if isinstance(result, list):
+        return [fn(obj) if isinstance(obj, SQLModel) else obj for obj in result]
+    if isinstance(result, SQLModel):
+        return fn(result)
+
+    return result
+
+
+def _merge_written(session: Session, obj: SQLModel) -> SQLModel:
+    """Bring an object written by the write coordinator into the given session"""
+    state = sqlalchemy.inspect(obj)
+    if state.was_deleted:
+        # forget any copy of the deleted object loaded in this session
+        local_obj = session.identity_map.get(state.key)
+        if local_obj is not None:
+            session.expunge(local_obj)
+        return obj
+
+    return session.merge(obj, load=False)
+
+
+def _written_objects(result: Any) -> list[SQLModel]:
+    """The ORM object(s) in the result of a write that still exist in the database"""
+    objs = result if isinstance(result, list) else [result]
+
+    return [obj for obj in objs if isinstance(obj, SQLModel) and not sqlalchemy.inspect(obj).was_deleted]
+
+
+DEFAULT_PAGE_SIZE = 100
+ITER_BATCH_SIZE = 1000
+
+
+class Page(NamedTuple):
+    """One page of records (see `BaseService.page`)"""
+    items: list[SQLModel]
+    # cursor to pass as `after` to get the next page, None if this is the last page
+    next_cursor: str | None
+
+
+def _keyset_columns(
+    model: Type[SQLModel],
+    order_by: Sequence[InstrumentedAttribute] | None,
+) -> list[InstrumentedAttribute]:
+    """
+    The columns to order pages of records by: the given ones (by default the
+    creation time, where the model has one) then the primary key, so that
+    every record has a distinct position.
+
+    """
+    if order_by is None:
+        order_by = [model.created_at] if "created_at" in model.__table__.c else []
+
+    return [*order_by, _primary_key(model)]
+
+
+def _primary_key(model: Type[SQLModel]) -> InstrumentedAttribute:
+    mapper = sqlalchemy.inspect(model)
+
+    return getattr(model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+
+
+def _cursor_python_type(column: InstrumentedAttribute) -> type:
+    python_type = column.type.python_type
+    if python_type is object and isinstance(column.type, sqlalchemy.types.TypeDecorator):
+        python_type = column.type.impl_instance.python_type
+
+    return python_type
+
+
+def _encode_cursor(obj: SQLModel, columns: list[InstrumentedAttribute]) -> str:
+    """Opaque cursor holding the position of `obj` in the ordering by `columns`"""
+    values = []
+    for column in columns:
+        value = getattr(obj, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime.date) else str(value))
+
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, columns: list[InstrumentedAttribute]) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("wrong number of values")
+
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = _cursor_python_type(column)
+            if issubclass(python_type, datetime.date):
+                decoded.append(python_type.fromisoformat(value))
+            else:
+                decoded.append(python_type(value))
+
+    except (ValueError, TypeError, binascii.Error, UnicodeError) as exc:
+        raise InvalidInputError(f"Invalid page cursor: {exc}")
+
+    return decoded
+
+
+def _filtered_statement(
+    model: Type[SQLModel],
+    filters: Sequence[ColumnElement[bool]],
+    options: Sequence[ExecutableOption],
+):
+    return select(model).where(*filters).options(*options)
+
+
+def _page_statement(
+    model: Type[SQLModel],
+    columns: list[InstrumentedAttribute],
+    after: str | None,
+    limit: int,
+    filters: Sequence[ColumnElement[bool]],
+    descending: bool,
+    options: Sequence[ExecutableOption],
+):
+    statement = _filtered_statement(model, filters, options)
+    if after is not None:
+        key = sqlalchemy.tuple_(*columns)
+        values = _decode_cursor(after, columns)
+        statement = statement.where(key < tuple(values) if descending else key > tuple(values))
+
+    # get one more than requested, to know whether there is a next page
+    return statement.order_by(*(column.desc() if descending else column for column in columns)).limit(limit + 1)
+
+
+def _make_page(objs: Sequence[SQLModel], columns: list[InstrumentedAttribute], limit: int) -> Page:
+    items = list(objs[:limit])
+    next_cursor = _encode_cursor(items[-1], columns) if len(objs) > limit else None
+
+    return Page(items=items, next_cursor=next_cursor)
+
+
+def _count_statement(model: Type[SQLModel], filters: Sequence[ColumnElement[bool]]):
+    return select(sqlalchemy.func.count()).select_from(model).where(*filters)
+
+
+BULK_BATCH_SIZE = 500
+
+
+class BulkResult(NamedTuple):
+    """Outcome of a bulk write (see `BaseService.create_many`), row by row"""
+    # the written object for each row, in the same order as the input (None for the rows that failed)
+    items: list[SQLModel | None]
+    # the error for each row that failed, by its index in the input
+    errors: dict[int, TinyMotionException]
+
+
+def chunked(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    """Split the items into chunks of at most `size`, e.g. to keep the number of values in an IN clause bounded"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_values(db_obj: SQLModel) -> dict:
+    """The column values to insert for a new object, leaving out unset columns that have a default"""
+    model = type(db_obj)
+    values = {}
+    for attr in sqlalchemy.inspect(model).column_attrs:
+        value = getattr(db_obj, attr.key)
+        column = attr.columns[0]
+        if value is None and (column.default is not None or column.server_default is not None):
+            continue
+        values[attr.key] = value
+
+    return add_blind_indexes(model, values)
+
+
+def _bulk_insert(session: Session, db_objs: list[SQLModel]) -> list[SQLModel]:
+    """Insert the new objects (all of the same model) with as few statements as possible"""
+    model = type(db_objs[0])
+    if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        # INSERT ... RETURNING many rows per statement, which gives back the stored rows without another SELECT
+        statement = sqlalchemy.insert(model).returning(model, sort_by_parameter_order=True)
+        values = [_insert_values(db_obj) for db_obj in db_objs]
+        written = session.scalars(statement, values).all()
+        # the ORM events don't run for bulk inserts, so update the parents' counters here
+        add_to_counters(session.connection(), model, values, session=session)
+
+        return written
+
+    session.add_all(db_objs)
+    session.flush()
+
+    return db_objs
+
+
+def _bulk_update(session: Session, rows: list[tuple[SQLModel, dict]]) -> list[SQLModel]:
+    """Apply the changes to the loaded objects and flush them"""
+    for db_obj, obj_data in rows:
+        db_obj.sqlmodel_update(obj_data)
+        session.add(db_obj)
+    session.flush()
+
+    return [db_obj for db_obj, _ in rows]
+
+
+def _write_in_batches(
+    session: Session,
+    rows: list[tuple[int, Any]],
+    write: Callable[[Session, list[Any]], list[SQLModel]],
+    batch_size: int,
+    result: BulkResult,
+) -> None:
+    """
+    Write the (index, row) pairs with `write`, committing after each batch
+    of rows, and store the written objects and errors in `result`.
+
+    Each batch is written in its own transaction. If a batch violates a
+    unique constraint its rows are written again one at a time, each in a
+    savepoint of that transaction, so that only the offending rows fail.
+    Other integrity errors are raised after rolling back the whole current
+    batch, including the rows of it already written again; the earlier
+    batches stay committed and their rows are in `result`.
+
+    """
+    # the written objects hold what was just stored, so don't expire them on each commit
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        for batch in chunked(rows, batch_size):
+            # otherwise each savepoint is committed by its release on SQLite
+            begin_write_transaction(session)
+            try:
+                with session.begin_nested():
+                    written = write(session, [row for _, row in batch])
+
+            except sqlalchemy.exc.IntegrityError:
+                # find the rows that failed by writing them one at a time
+                written = []
+                for index, row in batch:
+                    try:
+                        with session.begin_nested():
+                            written.extend(write(session, [row]))
+                    except sqlalchemy.exc.IntegrityError as e:
+                        if not is_unique_violation(e):
+                            session.rollback()
+                            raise e
+                        result.errors[index] = UniqueConstraintError(str(e))
+                        written.append(None)
+
+            session.commit()
+            for (index, _), obj in zip(batch, written):
+                result.items[index] = obj
+
+    finally:
+        session.expire_on_commit = expire_on_commit
+
+
 class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
-    def __init__(self, model: Type[ModelType], db_session: Session, created_by: uuid.UUID | None = None):
+    """
+    Reads and writes the records of one model.
+
+    The read-only methods (`get`, `list`, `page`, `iter`, `count` and the
+    lookups of the subclasses) use `read_session` if one is given, e.g. a
+    session of `database.read_engine`, so they don't hold locks or
+    connections that the writes need; the reads made as part of a write use
+    `db_session`.
+
+    """
+    def __init__(
+        self,
+        model: Type[ModelType],
+        db_session: Session,
+        created_by: uuid.UUID | None = None,
+        read_session: Session | None = None,
+    ):
         self.model = model
         self.db_session = db_session
         self.created_by = created_by
+        self.read_session = read_session if read_session is not None else db_session
+
+    def get(self, id: Any, options: Sequence[ExecutableOption] = ()) -> Optional[ModelType]:
+        """
+        Get the record with the given id.
+
+        Deferred (encrypted) columns are loaded when they are first accessed,
+        pass `options=[LOAD_PII]` to load them straight away instead.
 
-    def get(self, id: Any) -> Optional[ModelType]:
-        obj: Optional[ModelType] = self.db_session.get(self.model, id)
+        """
+        obj: Optional[ModelType] = self.read_session.get(self.model, id, options=options)
 
         if not obj:
             raise NotFoundError("Record with specified id not found")
 
         return obj
 
-    def list(self) -> list[ModelType]:
-        objs: list[ModelType] = self.db_session.exec(select(self.model)).all()
+    def list(self, options: Sequence[ExecutableOption] = ()) -> list[ModelType]:
+        """Get all records at once (use `page` or `iter` for tables that may be large)"""
+        objs: list[ModelType] = self.read_session.exec(select(self.model).options(*options)).all()
 
         return objs
 
+    def page(
+        self,
+        after: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        filters: Sequence[ColumnElement[bool]] = (),
+        order_by: Sequence[InstrumentedAttribute] | None = None,
+        descending: bool = False,
+        options: Sequence[ExecutableOption] = (),
+    ) -> Page:
+        """
+        Get one page of records, using keyset pagination.
+
+        Records are ordered by the `order_by` columns (by default the creation
+        time) followed by the primary key. Pass the `next_cursor` of a page as
+        `after` to get the page following it; each page is found with the
+        index rather than by skipping over the earlier records, so the cost
+        doesn't grow with the position in the table. The ordering columns must
+        not be nullable.
+
+        Raises InvalidInputError if the cursor is not valid.
+
+        """
+        columns = _keyset_columns(self.model, order_by)
+        objs = self.read_session.exec(
+            _page_statement(self.model, columns, after, limit, filters, descending, options)
+        ).all()
+
+        return _make_page(objs, columns, limit)
+
+    def iter(
+        self,
+        filters: Sequence[ColumnElement[bool]] = (),
+        options: Sequence[ExecutableOption] = (),
+        batch_size: int = ITER_BATCH_SIZE,
+    ) -> Iterator[ModelType]:
+        """
+        Iterate over all (matching) records in the default page order.
+
+        Rows are fetched `batch_size` at a time (with a server-side cursor
+        where the database supports one), so the whole table is never held in
+        memory. The query stays open until the iteration finishes, so don't
+        write with this service's session in the meantime.
+
+        """
+        columns = _keyset_columns(self.model, None)
+        statement = _filtered_statement(self.model, filters, options).order_by(*columns)
+
+        yield from self.read_session.exec(statement.execution_options(yield_per=batch_size))
+
+    def iter_batches(
+        self,
+        filters: Sequence[ColumnElement[bool]] = (),
+        options: Sequence[ExecutableOption] = (),
+        batch_size: int = ITER_BATCH_SIZE,
+    ) -> Iterator[Sequence[ModelType]]:
+        """
+        Iterate over all (matching) records in the default page order, in
+        lists of `batch_size` records loaded with `db_session`.
+
+        Each batch is a page found by keyset pagination (see `page`) and no
+        query is left open in between, so unlike `iter` the records of each
+        batch can be changed and committed (and expunged, to keep the memory
+        used bounded) before the next batch is loaded.
+
+        """
+        columns = _keyset_columns(self.model, None)
+        after = None
+        while True:
+            page = _make_page(self.db_session.exec(
+                _page_statement(self.model, columns, after, batch_size, filters, False, options)
+            ).all(), columns, batch_size)
+            if page.items:
+                yield page.items
+            if page.next_cursor is None:
+                return
+            after = page.next_cursor
+
+    def count(self, filters: Sequence[ColumnElement[bool]] = ()) -> int:
+        """Count the (matching) records, without loading them"""
+        return self.read_session.exec(_count_statement(self.model, filters)).one()
+
     def create(self, obj: CreateSchemaType) -> ModelType:
-        # construct the db model object
-        db_obj: ModelType = self.model(**obj.model_dump(mode='python'))
+        return self._write(_create_write(_new_db_obj(self.model, obj, self.created_by)))
+
+    def update(self, id: Any, obj: UpdateSchemaType) -> Optional[ModelType]:
+        return self._write(_update_write(self.model, id, obj.model_dump(exclude_unset=True)))
+
+    def delete(self, id: Any) -> None:
+        return self._write(_delete_write(self.model, id))
+
+    def create_many(self, objs: Sequence[CreateSchemaType], batch_size: int = BULK_BATCH_SIZE) -> BulkResult:
+        """
+        Create many records, `batch_size` rows per transaction.
+
+        Each batch is inserted with multi-row INSERT ... RETURNING statements
+        where the database supports them, so it costs a few round trips
+        rather than an INSERT, a commit and a SELECT per row. The rows are
+        validated in bulk first (see `_validate_many`); rows that fail
+        validation or violate a unique constraint are reported in the
+        result's `errors` and the other rows are still created.
+
+        The write coordinator is not used, the batches are committed directly.
+
+        """
+        return self._create_many(objs, self._validate_many(objs), batch_size)
+
+    def update_many(
+        self,
+        updates: Sequence[tuple[Any, UpdateSchemaType]],
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> BulkResult:
+        """
+        Update many records, given as (id, changes) pairs, `batch_size` rows
+        per transaction.
+
+        The records of each batch are loaded with a single query. Ids that
+        don't exist (NotFoundError) and changes that violate a unique
+        constraint are reported in the result's `errors` and the other rows
+        are still updated.
+
+        """
+        result = BulkResult(items=[None] * len(updates), errors={})
+        primary_key = _primary_key(self.model)
+
+        for start in range(0, len(updates), batch_size):
+            batch = updates[start:start + batch_size]
+            db_objs = {
+                getattr(db_obj, primary_key.key): db_obj
+                for db_obj in self.db_session.exec(
+                    select(self.model).where(primary_key.in_([id for id, _ in batch]))
+                )
+            }
+
+            rows = []
+            for index, (id, obj) in enumerate(batch, start=start):
+                if id not in db_objs:
+                    result.errors[index] = NotFoundError("Record with specified id not found")
+                    continue
+                rows.append((index, (db_objs[id], obj.model_dump(exclude_unset=True))))
 
-        # add created by if exists
-        if self.created_by is not None:
-            db_obj.created_by = self.created_by
+            _write_in_batches(self.db_session, rows, _bulk_update, batch_size, result)
 
-        # add to database
-        self.db_session.add(db_obj)
+        return result
+
+    def existing_ids(self, ids: Sequence[Any]) -> set[Any]:
+        """Which of the given ids have a record, checked with one query per `BULK_BATCH_SIZE` ids"""
+        primary_key = _primary_key(self.model)
+        existing = set()
+        for batch in chunked(list(set(ids)), BULK_BATCH_SIZE):
+            existing.update(self.db_session.exec(select(primary_key).where(primary_key.in_(batch))))
+
+        return existing
+
+    def _validate_many(self, objs: Sequence[CreateSchemaType | None]) -> dict[int, TinyMotionException]:
+        """
+        Check the rows for `create_many` before they are written, returning
+        the errors of any that can't be created by their index. Rows that are
+        None have already failed and are skipped.
+
+        """
+        return {}
+
+    def _create_many(
+        self,
+        objs: Sequence[CreateSchemaType | None],
+        errors: dict[int, TinyMotionException],
+        batch_size: int,
+    ) -> BulkResult:
+        """Create the rows that don't have an error yet (see `create_many`)"""
+        result = BulkResult(items=[None] * len(objs), errors=errors)
+        rows = [
+            (index, _new_db_obj(self.model, obj, self.created_by))
+            for index, obj in enumerate(objs)
+            if obj is not None and index not in errors
+        ]
+        _write_in_batches(self.db_session, rows, _bulk_insert, batch_size, result)
+
+        return result
+
+    def _write(self, fn: Callable[[Session], Any]) -> Any:
+        """
+        Apply the changes made by `fn` to the database and commit them.
+
+        `fn` is passed the session to make its changes with and returns the
+        affected object(s). Normally this is the service's own session; when
+        `settings.DATABASE_WRITE_COORDINATOR` is enabled the write is handed
+        to the process's write coordinator instead, which commits it together
+        with any concurrent writes, and the result is merged back into the
+        service's session.
+
+        """
         try:
-            self.db_session.commit()
-            self.db_session.refresh(db_obj)
+            if settings.DATABASE_WRITE_COORDINATOR:
+                coordinator = get_write_coordinator(self.db_session.get_bind())
+                result = coordinator.submit(fn)
+
+                # end any open read transaction so subsequent reads see the change
+                self.db_session.commit()
+                result = _map_objects(result, lambda obj: _merge_written(self.db_session, obj))
+
+            else:
+                result = fn(self.db_session)
+                self.db_session.commit()
+                for obj in _written_objects(result):
+                    # include the deferred columns, so the written object can be returned in full
+                    self.db_session.refresh(obj, attribute_names=column_names(type(obj)))
+
         except sqlalchemy.exc.IntegrityError as e:
             self.db_session.rollback()
-            if "duplicate key" in str(e) or "UNIQUE constraint failed" in str(e):
+            if is_unique_violation(e):
                 raise UniqueConstraintError(str(e))
             else:
                 raise e
 
-        return db_obj
+        if self.read_session is not self.db_session:
+            # start the read session afresh, so subsequent reads see the change rather than what was read before;
+            # the objects read are expired rather than expunged, so their deferred columns can still be loaded
+            self.read_session.commit()
+            self.read_session.expire_all()
 
-    def update(self, id: Any, obj: UpdateSchemaType) -> Optional[ModelType]:
-        db_obj = self.get(id)
-        obj_data = obj.model_dump(exclude_unset=True)
-        db_obj.sqlmodel_update(obj_data)
-        self.db_session.commit()
-        self.db_session.refresh(db_obj)
+        return result
 
-        return db_obj
 
-    def delete(self, id: Any) -> None:
-        db_obj = self.get(id)
-        self.db_session.delete(db_obj)
-        self.db_session.commit()
+class AsyncBaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """
+    Version of BaseService for use with an AsyncSession, for the API.
 
-        return db_obj
+    Writes are made by the same functions as the synchronous services, run
+    with `AsyncSession.run_sync`, or handed to the write coordinator when it
+    is enabled (see `_write`). Objects read with a separate `read_session`
+    are expired by a write, so get them again before using them after one.
+
+    """
+    def __init__(
+        self,
+        model: Type[ModelType],
+        db_session: AsyncSession,
+        created_by: uuid.UUID | None = None,
+        read_session: AsyncSession | None = None,
+    ):
+        self.model = model
+        self.db_session = db_session
+        self.created_by = created_by
+        self.read_session = read_session if read_session is not None else db_session
+
+    async def get(self, id: Any, options: Sequence[ExecutableOption] = ()) -> Optional[ModelType]:
+        """
+        Get the record with the given id.
+
+        Deferred (encrypted) columns cannot be loaded on access with an
+        AsyncSession, so pass `options=[LOAD_PII]` if they will be needed.
+
+        """
+        obj: Optional[ModelType] = await self.read_session.get(self.model, id, options=options)
+
+        if not obj:
+            raise NotFoundError("Record with specified id not found")
+
+        return obj
+
+    async def list(self, options: Sequence[ExecutableOption] = ()) -> list[ModelType]:
+        """Get all records at once (use `page` or `iter` for tables that may be large)"""
+        objs: list[ModelType] = (await self.read_session.exec(select(self.model).options(*options))).all()
+
+        return objs
+
+    async def page(
+        self,
+        after: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        filters: Sequence[ColumnElement[bool]] = (),
+        order_by: Sequence[InstrumentedAttribute] | None = None,
+        descending: bool = False,
+        options: Sequence[ExecutableOption] = (),
+    ) -> Page:
+        """Get one page of records, using keyset pagination (see `BaseService.page`)"""
+        columns = _keyset_columns(self.model, order_by)
+        objs = (await self.read_session.exec(
+            _page_statement(self.model, columns, after, limit, filters, descending, options)
+        )).all()
+
+        return _make_page(objs, columns, limit)
+
+    async def iter(
+        self,
+        filters: Sequence[ColumnElement[bool]] = (),
+        options: Sequence[ExecutableOption] = (),
+        batch_size: int = ITER_BATCH_SIZE,
+    ) -> AsyncIterator[ModelType]:
+        """Iterate over all (matching) records in the default page order (see `BaseService.iter`)"""
+        columns = _keyset_columns(self.model, None)
+        statement = _filtered_statement(self.model, filters, options).order_by(*columns)
+
+        async for obj in await self.read_session.stream_scalars(statement.execution_options(yield_per=batch_size)):
+            yield obj
+
+    async def count(self, filters: Sequence[ColumnElement[bool]] = ()) -> int:
+        """Count the (matching) records, without loading them"""
+        return (await self.read_session.exec(_count_statement(self.model, filters))).one()
+
+    async def create(self, obj: CreateSchemaType) -> ModelType:
+        return await self._write(_create_write(_new_db_obj(self.model, obj, self.created_by)))
+
+    async def update(self, id: Any, obj: UpdateSchemaType) -> Optional[ModelType]:
+        return await self._write(_update_write(self.model, id, obj.model_dump(exclude_unset=True)))
+
+    async def delete(self, id: Any) -> None:
+        return await self._write(_delete_write(self.model, id))
+
+    async def _write(self, fn: Callable[[Session], Any]) -> Any:
+        """
+        Apply the changes made by `fn` to the database and commit them (see
+        `BaseService._write`).
+
+        When `settings.DATABASE_WRITE_COORDINATOR` is enabled the write is
+        submitted from a worker thread to the write coordinator of
+        `database.engine`, the synchronous engine of the same database, so the
+        API's writes are group committed together with all the others.
+
+        """
+        try:
+            if settings.DATABASE_WRITE_COORDINATOR:
+                coordinator = get_write_coordinator(database.engine)
+                result = await asyncio.to_thread(coordinator.submit, fn)
+
+                # end any open read transaction so subsequent reads see the change
+                await self.db_session.commit()
+                result = await self.db_session.run_sync(
+                    lambda session: _map_objects(result, lambda obj: _merge_written(session, obj))
+                )
+
+            else:
+                result = await self.db_session.run_sync(fn)
+                await self.db_session.commit()
+                for obj in _written_objects(result):
+                    await self.db_session.refresh(obj, attribute_names=column_names(type(obj)))
+
+        except sqlalchemy.exc.IntegrityError as e:
+            await self.db_session.rollback()
+            if is_unique_violation(e):
+                raise UniqueConstraintError(str(e))
+            else:
+                raise e
+
+        if self.read_session is not self.db_session:
+            await self.read_session.commit()
+            self.read_session.expire_all()
+
+        return result
@@ -1,45 +1,55 @@
 import logging
 import uuid
+from typing import Sequence
 
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tinymotion_backend.services.base import BaseService
-from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.base import BaseService, AsyncBaseService, BulkResult, BULK_BATCH_SIZE
+from tinymotion_backend.services.infant_service import InfantService, AsyncInfantService
 from tinymotion_backend.models import Consent, ConsentCreate, ConsentUpdate, ConsentCreateViaNHI
-from tinymotion_backend.core.exc import InvalidInputError
+from tinymotion_backend.core.exc import InvalidInputError, NotFoundError, TinyMotionException
 
 
 logger = logging.getLogger(__name__)
 
 
-class ConsentService(BaseService[Consent, ConsentCreate, ConsentUpdate]):
-    def __init__(self, db_session: Session, created_by: uuid.UUID):
-        super(ConsentService, self).__init__(Consent, db_session, created_by=created_by)
+def _validate_consent(obj: ConsentCreate) -> None:
+    """
+    Validate the incoming consent data.
 
-    def create(self, obj: ConsentCreate) -> Consent:
-        """
-        Override create to first validate the incoming data.
+    - If `collected_physically` is set, the other fields are not set
+    - If `collected_physically` is not set, the other fields must be set
 
-        - If `collected_physically` is set, the other fields are not set
-        - If `collected_physically` is not set, the other fields must be set
+    """
+    if obj.collected_physically:
+        # TODO: maybe it doesn't matter what else is set...
+        pass
 
-        """
-        if obj.collected_physically:
-            # TODO: maybe it doesn't matter what else is set...
-            pass
+    else:
+        if obj.consent_giver_email is None:
+            msg = "Must set `consent_giver_email` when not specifying `collected_physically`"
+            logger.error(msg)
+            raise InvalidInputError(msg)
+
+        if obj.consent_giver_name is None:
+            msg = "Must set `consent_giver_name` when not specifying `collected_physically`"
+            logger.error(msg)
+            raise InvalidInputError(msg)
 
-        else:
-            if obj.consent_giver_email is None:
-                msg = "Must set `consent_giver_email` when not specifying `collected_physically`"
-                logger.error(msg)
-                raise InvalidInputError(msg)
+    # TODO: send email?
 
-            if obj.consent_giver_name is None:
-                msg = "Must set `consent_giver_name` when not specifying `collected_physically`"
-                logger.error(msg)
-                raise InvalidInputError(msg)
 
-        # TODO: send email?
+class ConsentService(BaseService[Consent, ConsentCreate, ConsentUpdate]):
+    def __init__(self, db_session: Session, created_by: uuid.UUID, read_session: Session | None = None):
+        super(ConsentService, self).__init__(Consent, db_session, created_by=created_by, read_session=read_session)
+
+    def create(self, obj: ConsentCreate) -> Consent:
+        """
+        Override create to first validate the incoming data (see `_validate_consent`)
+
+        """
+        _validate_consent(obj)
 
         return super(ConsentService, self).create(obj)
 
@@ -59,3 +69,87 @@ class ConsentService(BaseService[Consent, ConsentCreate, ConsentUpdate]):
         created_consent = self.create(consent_obj)
 
         return created_consent
+
+    def create_many_using_nhi_number(
+        self,
+        objs: Sequence[ConsentCreateViaNHI],
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> BulkResult:
+        """
+        Create many consents using the NHI numbers to identify the Infants,
+        which are looked up together (see `BaseService.create_many`)
+
+        """
+        infant_ids = InfantService(self.db_session, self.created_by).get_ids_by_nhi_numbers(
+            [obj.nhi_number for obj in objs]
+        )
+
+        consent_objs = []
+        errors = {}
+        for index, obj in enumerate(objs):
+            if obj.nhi_number not in infant_ids:
+                errors[index] = NotFoundError("Could not find any infant with the given NHI number")
+                consent_objs.append(None)
+                continue
+            consent_objs.append(ConsentCreate(
+                infant_id=infant_ids[obj.nhi_number],
+                consent_giver_name=obj.consent_giver_name,
+                consent_giver_email=obj.consent_giver_email,
+                collected_physically=obj.collected_physically,
+            ))
+        errors.update(self._validate_many(consent_objs))
+
+        return self._create_many(consent_objs, errors, batch_size)
+
+    def _validate_many(self, objs: Sequence[ConsentCreate | None]) -> dict[int, TinyMotionException]:
+        """Validate each consent (see `_validate_consent`) and check that their infants exist"""
+        errors = {}
+        for index, obj in enumerate(objs):
+            if obj is None:
+                continue
+            try:
+                _validate_consent(obj)
+            except InvalidInputError as exc:
+                errors[index] = exc
+
+        existing_infant_ids = InfantService(self.db_session, self.created_by).existing_ids(
+            [obj.infant_id for obj in objs if obj is not None]
+        )
+        for index, obj in enumerate(objs):
+            if obj is not None and index not in errors and obj.infant_id not in existing_infant_ids:
+                errors[index] = NotFoundError("Could not find the infant")
+
+        return errors
+
+
+class AsyncConsentService(AsyncBaseService[Consent, ConsentCreate, ConsentUpdate]):
+    def __init__(self, db_session: AsyncSession, created_by: uuid.UUID, read_session: AsyncSession | None = None):
+        super(AsyncConsentService, self).__init__(
+            Consent, db_session, created_by=created_by, read_session=read_session,
+        )
+
+    async def create(self, obj: ConsentCreate) -> Consent:
+        """
+        Override create to first validate the incoming data (see `_validate_consent`)
+
+        """
+        _validate_consent(obj)
+
+        return await super(AsyncConsentService, self).create(obj)
+
+    async def create_using_nhi_number(self, obj: ConsentCreateViaNHI) -> Consent:
+        """Create consent using the NHI number to identify the Infant"""
+        # get the Infant
+        infant_service = AsyncInfantService(self.db_session, self.created_by)
+        infant = await infant_service.get_by_nhi_number(obj.nhi_number)
+
+        # now create the consent
+        consent_obj = ConsentCreate(
+            infant_id=infant.infant_id,
+            consent_giver_name=obj.consent_giver_name,
+            consent_giver_email=obj.consent_giver_email,
+            collected_physically=obj.collected_physically,
+        )
+        created_consent = await self.create(consent_obj)
+
+        return created_consent
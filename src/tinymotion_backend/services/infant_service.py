@@ -1,31 +1,39 @@
 import os
+import asyncio
 import logging
 import uuid
+from typing import Sequence
 
 from sqlmodel import select, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy.sql.base import ExecutableOption
 
-from tinymotion_backend.services.base import BaseService
-from tinymotion_backend.models import Infant, InfantCreate, InfantUpdate
-from tinymotion_backend.core.exc import NotFoundError, UniqueConstraintError
+from tinymotion_backend.services.base import BaseService, AsyncBaseService, BULK_BATCH_SIZE, chunked, LookupStatement
+from tinymotion_backend.models import Infant, InfantCreate, InfantUpdate, Video, recount_counters
+from tinymotion_backend.core.blind_index import blind_index
+from tinymotion_backend.core.exc import NotFoundError, UniqueConstraintError, TinyMotionException
 from tinymotion_backend.core.config import settings
+from tinymotion_backend.core import storage
 
 
 logger = logging.getLogger(__name__)
 
+_BY_NHI_NUMBER = LookupStatement(Infant.nhi_number_bidx)
+
 
 class InfantService(BaseService[Infant, InfantCreate, InfantUpdate]):
-    def __init__(self, db_session: Session, created_by: uuid.UUID):
-        super(InfantService, self).__init__(Infant, db_session, created_by=created_by)
+    def __init__(self, db_session: Session, created_by: uuid.UUID, read_session: Session | None = None):
+        super(InfantService, self).__init__(Infant, db_session, created_by=created_by, read_session=read_session)
 
-    def get_by_nhi_number(self, nhi_number: str) -> Infant:
+    def get_by_nhi_number(self, nhi_number: str, options: Sequence[ExecutableOption] = ()) -> Infant:
         """
         Get Infant by NHI number
 
         """
         try:
-            infant = self.db_session.exec(
-                select(Infant).where(Infant.nhi_number == nhi_number)
+            infant = self.read_session.exec(
+                _BY_NHI_NUMBER(options), params={"nhi_number_bidx": blind_index(nhi_number)}
             ).one()
         except NoResultFound:
             logger.error("Could not find any infant with the given NHI number")
@@ -36,24 +44,129 @@ class InfantService(BaseService[Infant, InfantCreate, InfantUpdate]):
 
         return infant
 
+    def get_ids_by_nhi_numbers(self, nhi_numbers: Sequence[str]) -> dict[str, uuid.UUID]:
+        """
+        Get the ids of the infants with the given NHI numbers, looked up with
+        one query per `BULK_BATCH_SIZE` numbers. NHI numbers that don't
+        belong to an infant are left out.
+
+        """
+        nhi_numbers_by_index = {blind_index(nhi_number): nhi_number for nhi_number in nhi_numbers}
+
+        infant_ids = {}
+        for index_values in chunked(list(nhi_numbers_by_index), BULK_BATCH_SIZE):
+            for nhi_number_bidx, infant_id in self.db_session.exec(
+                select(Infant.nhi_number_bidx, Infant.infant_id).where(Infant.nhi_number_bidx.in_(index_values))
+            ):
+                infant_ids[nhi_numbers_by_index[nhi_number_bidx]] = infant_id
+
+        return infant_ids
+
+    def _validate_many(self, objs: Sequence[InfantCreate | None]) -> dict[int, TinyMotionException]:
+        """Check that none of the NHI numbers are repeated or already stored"""
+        errors = {}
+        first_index = {}
+        for index, obj in enumerate(objs):
+            if obj is None:
+                continue
+            if obj.nhi_number in first_index:
+                errors[index] = UniqueConstraintError("The NHI number is repeated in the input")
+            else:
+                first_index[obj.nhi_number] = index
+
+        for nhi_number in self.get_ids_by_nhi_numbers(list(first_index)):
+            errors[first_index[nhi_number]] = UniqueConstraintError("An infant with the NHI number already exists")
+
+        return errors
+
+    def recount(self, infant_ids: Sequence[uuid.UUID] | None = None) -> int:
+        """
+        Recompute the consent and video counters of the infants (all of them,
+        or those with the given ids) from the stored consents and videos,
+        returning how many infants had wrong counts.
+
+        """
+        connection = self.db_session.connection()
+        if infant_ids is None:
+            repaired = recount_counters(connection, Infant)
+        else:
+            repaired = sum(
+                recount_counters(connection, Infant, list(batch)) for batch in chunked(infant_ids, BULK_BATCH_SIZE)
+            )
+        self.db_session.commit()
+        logger.debug(f"Repaired the counters of {repaired} infants")
+
+        return repaired
+
     def delete(self, infant_id: uuid.UUID) -> None:
         """Delete the infant including video files"""
         logger.debug(f"Deleting infant: {infant_id}")
 
         # first list all video files belonging to this infant
         db_obj = self.get(infant_id)
-        logger.debug(f"Infant has {len(db_obj.consents)} consents and {len(db_obj.videos)} videos")
-        infant_videos = [video.video_name for video in db_obj.videos]
+        logger.debug(f"Infant has {db_obj.consent_count} consents and {db_obj.video_count} videos")
+        # the content of videos in cold storage is removed from their pack files by `compact_cold_storage`
+        infant_videos = [video.video_name for video in db_obj.videos if video.storage_tier != storage.TIER_COLD]
 
         # delete the infant (and all consent and video records) from the database
-        self.db_session.delete(db_obj)
-        self.db_session.commit()
+        super(InfantService, self).delete(infant_id)
 
         # delete the video files too
-        for video_name in infant_videos:
-            video_path = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
-            if os.path.exists(video_path):
-                logger.debug(f"Deleting video: {video_path}")
-                os.unlink(video_path)
-            else:
-                logger.error(f"Could not delete video file: {video_path} (file does not exist)")
+        _delete_video_files(infant_videos)
+
+
+def _delete_video_files(video_names: list[str]) -> None:
+    """Delete the files (and mirror copies) of the given videos from the video library"""
+    for video_name in video_names:
+        video_path = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
+        if os.path.exists(video_path):
+            logger.debug(f"Deleting video: {video_path}")
+            os.unlink(video_path)
+        else:
+            logger.error(f"Could not delete video file: {video_path} (file does not exist)")
+        storage.delete_mirror_copy(video_name)
+
+
+class AsyncInfantService(AsyncBaseService[Infant, InfantCreate, InfantUpdate]):
+    def __init__(self, db_session: AsyncSession, created_by: uuid.UUID, read_session: AsyncSession | None = None):
+        super(AsyncInfantService, self).__init__(
+            Infant, db_session, created_by=created_by, read_session=read_session,
+        )
+
+    async def get_by_nhi_number(self, nhi_number: str, options: Sequence[ExecutableOption] = ()) -> Infant:
+        """
+        Get Infant by NHI number
+
+        """
+        try:
+            infant = (await self.read_session.exec(
+                _BY_NHI_NUMBER(options), params={"nhi_number_bidx": blind_index(nhi_number)}
+            )).one()
+        except NoResultFound:
+            logger.error("Could not find any infant with the given NHI number")
+            raise NotFoundError("Could not find any infant with the given NHI number")
+        except MultipleResultsFound:
+            logger.error("Found multiple infants with the given NHI number")
+            raise UniqueConstraintError("Found multiple infants with the given NHI number")
+
+        return infant
+
+    async def delete(self, infant_id: uuid.UUID) -> None:
+        """Delete the infant including video files"""
+        logger.debug(f"Deleting infant: {infant_id}")
+
+        # first list all video files belonging to this infant
+        await self.get(infant_id)
+        # the content of videos in cold storage is removed from their pack files by `compact_cold_storage`
+        infant_videos = (await self.db_session.exec(
+            select(Video.video_name)
+            .where(Video.infant_id == infant_id)
+            .where(Video.storage_tier != storage.TIER_COLD)
+        )).all()
+        logger.debug(f"Infant has {len(infant_videos)} videos")
+
+        # delete the infant (and all consent and video records) from the database
+        await super(AsyncInfantService, self).delete(infant_id)
+
+        # delete the video files too
+        await asyncio.to_thread(_delete_video_files, infant_videos)
@@ -1,29 +1,34 @@
 import logging
-from typing import Optional
+from typing import Optional, Sequence
 
-from sqlmodel import select, Session
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy.sql.base import ExecutableOption
 
-from tinymotion_backend.services.base import BaseService
+from tinymotion_backend.services.base import BaseService, AsyncBaseService, LookupStatement
 from tinymotion_backend.models import User, UserCreate, UserUpdate, UserRead
+from tinymotion_backend.core.blind_index import blind_index
 from tinymotion_backend.core.exc import InvalidAccessKeyError, UniqueConstraintError
 
 
 logger = logging.getLogger(__name__)
 
+_BY_ACCESS_KEY = LookupStatement(User.access_key_bidx)
+
 
 class UserService(BaseService[User, UserCreate, UserUpdate]):
-    def __init__(self, db_session: Session):
-        super(UserService, self).__init__(User, db_session)
+    def __init__(self, db_session: Session, read_session: Session | None = None):
+        super(UserService, self).__init__(User, db_session, read_session=read_session)
 
-    def get_by_access_key(self, access_key: str) -> Optional[UserRead]:
+    def get_by_access_key(self, access_key: str, options: Sequence[ExecutableOption] = ()) -> Optional[UserRead]:
         """
         Get User by access key
 
         """
         try:
-            user = self.db_session.exec(
-                select(User).where(User.access_key == access_key)
+            user = self.read_session.exec(
+                _BY_ACCESS_KEY(options), params={"access_key_bidx": blind_index(access_key)}
             ).one()
         except NoResultFound:
             logger.error("Could not find any user with the given access key")
@@ -39,3 +44,32 @@ class UserService(BaseService[User, UserCreate, UserUpdate]):
 
     def is_disabled(self, user: User) -> bool:
         return user.disabled
+
+
+class AsyncUserService(AsyncBaseService[User, UserCreate, UserUpdate]):
+    def __init__(self, db_session: AsyncSession, read_session: AsyncSession | None = None):
+        super(AsyncUserService, self).__init__(User, db_session, read_session=read_session)
+
+    async def get_by_access_key(self, access_key: str, options: Sequence[ExecutableOption] = ()) -> Optional[UserRead]:
+        """
+        Get User by access key
+
+        """
+        try:
+            user = (await self.read_session.exec(
+                _BY_ACCESS_KEY(options), params={"access_key_bidx": blind_index(access_key)}
+            )).one()
+        except NoResultFound:
+            logger.error("Could not find any user with the given access key")
+            raise InvalidAccessKeyError("Could not find any user with the given access key")
+        except MultipleResultsFound:
+            logger.error("Found multiple users with the given access key")
+            raise UniqueConstraintError("Found multiple users with the given access key")
+
+        return user
+
+    async def authenticate(self, access_key: str) -> Optional[UserRead]:
+        return await self.get_by_access_key(access_key)
+
+    def is_disabled(self, user: User) -> bool:
+        return user.disabled
@@ -1,20 +1,47 @@
+import os
 import logging
 import uuid
+import datetime
+from typing import Sequence
 
-from sqlmodel import Session
+from sqlmodel import select, Session
+from sqlalchemy.exc import NoResultFound
 
-from tinymotion_backend.services.base import BaseService
+from tinymotion_backend.services.base import (
+    BaseService, BulkResult, BULK_BATCH_SIZE, chunked, LookupStatement,
+)
 from tinymotion_backend.services.infant_service import InfantService
-from tinymotion_backend.models import Video, VideoCreate, VideoUpdate, VideoCreateViaNHI
-from tinymotion_backend.core.exc import NoConsentError
+from tinymotion_backend.models import (
+    Infant, Video, VideoCreate, VideoUpdate, VideoCreateViaNHI, VideoCreateBatch,
+)
+from tinymotion_backend.core.exc import NoConsentError, NotFoundError, TinyMotionException
+from tinymotion_backend.core import storage
 
 
 logger = logging.getLogger(__name__)
 
+_BY_VIDEO_NAME = LookupStatement(Video.video_name)
+
+
+def _create_batch_write(infant_id: uuid.UUID, objs: list[VideoCreateBatch], created_by: uuid.UUID | None):
+    db_objs = []
+    for obj in objs:
+        db_obj = Video(**obj.model_dump(mode='python'), infant_id=infant_id)
+        if created_by is not None:
+            db_obj.created_by = created_by
+        db_objs.append(db_obj)
+
+    def _create_batch(session: Session) -> list[Video]:
+        session.add_all(db_objs)
+        return db_objs
+
+    return _create_batch
+
 
 class VideoService(BaseService[Video, VideoCreate, VideoUpdate]):
-    def __init__(self, db_session: Session, created_by: uuid.UUID):
-        super(VideoService, self).__init__(Video, db_session, created_by=created_by)
+    def __init__(self, db_session: Session, created_by: uuid.UUID, read_session: Session | None = None):
+        super(VideoService, self).__init__(Video, db_session, created_by=created_by, read_session=read_session)
+        # checks the infant as part of writes, so reads with the write session
         self._infant_service = InfantService(db_session, created_by)
 
     def create(self, obj: VideoCreate) -> Video:
@@ -22,11 +49,50 @@ class VideoService(BaseService[Video, VideoCreate, VideoUpdate]):
 
         # check that at least one consent exists for the infant
         infant = self._infant_service.get(obj.infant_id)
-        if not len(infant.consents):
+        self._check_consent(infant)
+
+        return super(VideoService, self).create(obj)
+
+    def get_by_video_name(self, video_name: str) -> Video:
+        """
+        Get Video by the name of the stored file
+
+        """
+        try:
+            video = self.read_session.exec(_BY_VIDEO_NAME(), params={"video_name": video_name}).one()
+        except NoResultFound:
+            logger.error("Could not find any video with the given name")
+            raise NotFoundError("Could not find any video with the given name")
+
+        return video
+
+    def _check_consent(self, infant: Infant) -> None:
+        """Raise NoConsentError if no consent exists for the infant"""
+        if not infant.consent_count:
             logger.error("No consent exists for this infant - cannot create video")
             raise NoConsentError("No consents exist for the infant")
 
-        return super(VideoService, self).create(obj)
+    def get_infant_for_upload(self, nhi_number: str) -> Infant:
+        """
+        Get the Infant with the given NHI number, checking that videos can be
+        stored for it (i.e. that at least one consent exists).
+
+        """
+        infant = self._infant_service.get_by_nhi_number(nhi_number)
+        self._check_consent(infant)
+
+        return infant
+
+    def create_batch(self, infant: Infant, objs: list[VideoCreateBatch]) -> list[Video]:
+        """
+        Create several videos for one infant in a single transaction.
+
+        The infant is the one returned by `get_infant_for_upload`, which has
+        already checked that videos can be stored for it. Either all of the
+        videos are created or none of them are.
+
+        """
+        return self._write(_create_batch_write(infant.infant_id, objs, self.created_by))
 
     def create_using_nhi_number(self, obj: VideoCreateViaNHI) -> Video:
         """Create video using the NHI number to identify the Infant"""
@@ -42,3 +108,177 @@ class VideoService(BaseService[Video, VideoCreate, VideoUpdate]):
         created_video = self.create(video_obj)
 
         return created_video
+
+    def create_many_using_nhi_number(
+        self,
+        objs: Sequence[VideoCreateViaNHI],
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> BulkResult:
+        """
+        Create many videos using the NHI numbers to identify the Infants,
+        which are looked up together (see `BaseService.create_many`)
+
+        """
+        infant_ids = self._infant_service.get_ids_by_nhi_numbers([obj.nhi_number for obj in objs])
+
+        video_objs = []
+        errors = {}
+        for index, obj in enumerate(objs):
+            if obj.nhi_number not in infant_ids:
+                errors[index] = NotFoundError("Could not find any infant with the given NHI number")
+                video_objs.append(None)
+                continue
+            video_objs.append(VideoCreate(
+                infant_id=infant_ids[obj.nhi_number],
+                video_name=obj.video_name,
+                sha256sum=obj.sha256sum,
+            ))
+        errors.update(self._validate_many(video_objs))
+
+        return self._create_many(video_objs, errors, batch_size)
+
+    def _validate_many(self, objs: Sequence[VideoCreate | None]) -> dict[int, TinyMotionException]:
+        """Check that the infants of the videos exist and that each has at least one consent"""
+        infant_ids = list({obj.infant_id for obj in objs if obj is not None})
+        consent_counts = {}
+        for batch in chunked(infant_ids, BULK_BATCH_SIZE):
+            consent_counts.update(self.db_session.exec(
+                select(Infant.infant_id, Infant.consent_count).where(Infant.infant_id.in_(batch))
+            ).all())
+
+        errors = {}
+        for index, obj in enumerate(objs):
+            if obj is None:
+                continue
+            if obj.infant_id not in consent_counts:
+                errors[index] = NotFoundError("Could not find the infant")
+            elif not consent_counts[obj.infant_id]:
+                errors[index] = NoConsentError("No consents exist for the infant")
+
+        return errors
+
+    def move_to_cold_storage(self, older_than: datetime.datetime, batch_size: int = BULK_BATCH_SIZE) -> int:
+        """
+        Move videos created before the given time from the video library into
+        pack files in cold storage, returning the number of videos moved.
+
+        The videos are loaded and committed as moved `batch_size` at a time,
+        only once their copies in the pack have been verified; their
+        individual files are deleted after that. If the move is interrupted
+        before a batch is committed, the copies already in the pack are
+        unreferenced and reclaimed by `compact_cold_storage`.
+
+        """
+        moved = 0
+        with storage.PackWriter() as pack:
+            for videos in self.iter_batches(
+                filters=[
+                    Video.storage_tier == storage.TIER_HOT,
+                    Video.created_at < older_than,
+                    Video.sha256sum_enc != None,  # noqa: E711
+                ],
+                batch_size=batch_size,
+            ):
+                logger.debug(f"Moving {len(videos)} videos to cold storage")
+
+                video_paths = []
+                for video in videos:
+                    video_path = storage.video_file_path(video)
+                    if not os.path.exists(video_path):
+                        logger.error(f"Could not move video to cold storage: {video_path} (file does not exist)")
+                        continue
+
+                    try:
+                        pack_name, pack_offset = pack.append(video_path, video.video_name, video.sha256sum_enc)
+                    except ValueError as exc:
+                        logger.error(f"Could not move video to cold storage: {exc}")
+                        continue
+
+                    video.storage_tier = storage.TIER_COLD
+                    video.pack_name = pack_name
+                    video.pack_offset = pack_offset
+                    self.db_session.add(video)
+                    video_paths.append(video_path)
+
+                self.db_session.commit()
+
+                for video_path in video_paths:
+                    os.unlink(video_path)
+                moved += len(video_paths)
+
+                # don't keep the moved videos in the session
+                for video in videos:
+                    self.db_session.expunge(video)
+
+        return moved
+
+    def compact_cold_storage(self, pack_names: Sequence[str] | None = None) -> tuple[int, int]:
+        """
+        Remove the content of deleted videos from the pack files in cold
+        storage (all of them, or the given ones), returning the number of
+        packs compacted and the number of bytes reclaimed.
+
+        The videos left in a pack with deleted videos are copied to a new
+        pack, each copy verified against its checksum, and committed as moved
+        before the old pack is deleted; a pack with no videos left is just
+        deleted (which also clears up after an interrupted compaction). A pack
+        that can't be copied is logged and kept as it is.
+
+        Not to be run at the same time as `move_to_cold_storage`, which could
+        be appending to one of the packs.
+
+        """
+        if pack_names is None:
+            pack_names = storage.list_packs()
+
+        live: dict[str, list[Video]] = {pack_name: [] for pack_name in pack_names}
+        for batch in chunked(list(live), BULK_BATCH_SIZE):
+            for video in self.db_session.exec(
+                select(Video)
+                .where(Video.storage_tier == storage.TIER_COLD)
+                .where(Video.pack_name.in_(batch))
+                .order_by(Video.pack_offset)
+            ):
+                live[video.pack_name].append(video)
+
+        compacted = reclaimed = 0
+        for pack_name, videos in live.items():
+            pack_path = storage.pack_file_path(pack_name)
+            if not os.path.exists(pack_path):
+                continue
+            pack_size = os.path.getsize(pack_path)
+            live_size = sum(video.video_size for video in videos)
+            if live_size >= pack_size:
+                continue
+
+            logger.debug(f"Compacting pack {pack_name}: {len(videos)} videos, {pack_size - live_size} bytes to reclaim")
+            if videos:
+                try:
+                    self._copy_to_new_pack(videos)
+                except (OSError, ValueError) as exc:
+                    logger.error(f"Could not compact pack {pack_name}: {exc}")
+                    continue
+            storage.delete_pack(pack_name)
+            compacted += 1
+            reclaimed += pack_size - live_size
+
+        return compacted, reclaimed
+
+    def _copy_to_new_pack(self, videos: list[Video]) -> None:
+        """Copy the videos in cold storage to a new pack and commit them as moved there"""
+        with storage.PackWriter(new_pack=True) as pack:
+            try:
+                locations = []
+                for video in videos:
+                    with storage.open_video(video) as fin:
+                        locations.append(pack.append_file(fin, video.video_size, video.video_name, video.sha256sum_enc))
+                for video, (pack_name, pack_offset) in zip(videos, locations):
+                    video.pack_name = pack_name
+                    video.pack_offset = pack_offset
+                    self.db_session.add(video)
+                self.db_session.commit()
+            except Exception:
+                self.db_session.rollback()
+                pack.close()
+                storage.delete_pack(pack.pack_name)
+                raise
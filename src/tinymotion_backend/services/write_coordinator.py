@@ -0,0 +1,199 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+import sqlalchemy
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.database import begin_write_transaction
+from tinymotion_backend.models import column_names
+
+
+logger = logging.getLogger(__name__)
+
+
+WriteFunction = Callable[[Session], Any]
+
+
+class WriteCoordinator:
+    """
+    Runs the writes from all threads of a process on a single writer thread.
+
+    Each write is a function that makes its changes using the session it is
+    given (without committing). The writer thread collects the writes that
+    are waiting into a batch, runs each one inside its own savepoint and then
+    commits the whole batch at once (group commit), so concurrent requests
+    share one transaction and one fsync instead of each paying for their own.
+
+    A write that fails only rolls back its own savepoint and its exception is
+    raised to its caller; the other writes in the batch are unaffected. If the
+    transaction fails as a whole (e.g. the commit itself fails) none of the
+    batch has been written, and the writes that didn't fail on their own are
+    retried each in its own transaction so each caller still gets its own
+    result. If the writer thread stops, the writes still waiting fail with a
+    RuntimeError, as do any submitted afterwards.
+
+    """
+
+    def __init__(self, engine: Engine, max_batch_size: int = 64, max_batch_delay: float = 0.002):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self._queue: queue.Queue[tuple[WriteFunction, Future] | None] = queue.Queue()
+        self._batch: list[tuple[WriteFunction, Future]] = []
+        self._closed = False
+        self._closed_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-coordinator", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: WriteFunction) -> Any:
+        """
+        Run the given write and wait for it to be committed.
+
+        Returns the value returned by `fn`; ORM objects it returns are
+        refreshed after the commit and detached from the writer's session.
+
+        """
+        future = Future()
+        with self._closed_lock:
+            if self._closed:
+                raise RuntimeError("The write coordinator has stopped")
+            self._queue.put((fn, future))
+
+        return future.result()
+
+    def stop(self) -> None:
+        """Stop the writer thread once the writes already submitted are done"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self) -> list[tuple[WriteFunction, Future]] | None:
+        """Wait for the next write, then collect any others that arrive shortly after"""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get(timeout=self.max_batch_delay)
+            except queue.Empty:
+                break
+            if item is None:
+                # finish this batch first
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self) -> None:
+        try:
+            while (batch := self._next_batch()) is not None:
+                self._batch = batch
+                logger.debug(f"Committing batch of {len(batch)} write(s)")
+                try:
+                    self._commit_batch(batch)
+                except Exception as exc:
+                    # the batch was rolled back, run each write that is still waiting in its own transaction instead
+                    logger.error(f"Group commit failed, retrying writes individually: {exc!r}")
+                    for item in batch:
+                        if not item[1].done():
+                            self._commit_single(item)
+                self._batch = []
+        finally:
+            self._close()
+
+    def _close(self) -> None:
+        """Fail the writes that will not be run now that the writer thread is stopping"""
+        with self._closed_lock:
+            self._closed = True
+
+        pending = self._batch
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                pending.append(item)
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("The write coordinator has stopped"))
+
+    def _commit_single(self, item: tuple[WriteFunction, Future]) -> None:
+        try:
+            self._commit_batch([item])
+        except Exception as exc:
+            if not item[1].done():
+                item[1].set_exception(exc)
+
+    def _commit_batch(self, batch: list[tuple[WriteFunction, Future]]) -> None:
+        """
+        Run the writes in one transaction and commit it. If this raises, the
+        transaction has been rolled back, so none of the writes is committed
+        and the ones that didn't fail on their own are still waiting.
+        """
+        with Session(self.engine, expire_on_commit=False) as session:
+            # otherwise each write is committed by the release of its savepoint on SQLite
+            begin_write_transaction(session)
+            succeeded = []
+            for fn, future in batch:
+                try:
+                    with session.begin_nested():
+                        result = fn(session)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    succeeded.append((future, result))
+
+            if not len(succeeded):
+                return
+
+            try:
+                session.commit()
+            except Exception as exc:
+                if len(succeeded) > 1:
+                    raise
+                succeeded[0][0].set_exception(exc)
+                return
+
+            for future, result in succeeded:
+                try:
+                    for obj in result if isinstance(result, list) else [result]:
+                        if isinstance(obj, SQLModel) and sqlalchemy.inspect(obj).persistent:
+                            session.refresh(obj, attribute_names=column_names(type(obj)))
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            session.expunge_all()
+
+
+_coordinators: dict[Engine, WriteCoordinator] = {}
+_coordinators_lock = threading.Lock()
+
+
+def get_write_coordinator(engine: Engine) -> WriteCoordinator:
+    """Get the write coordinator of this process for the given engine, starting it if needed"""
+    with _coordinators_lock:
+        if engine not in _coordinators:
+            _coordinators[engine] = WriteCoordinator(
+                engine,
+                max_batch_size=settings.DATABASE_WRITE_BATCH_SIZE,
+                max_batch_delay=settings.DATABASE_WRITE_BATCH_DELAY_MS / 1000,
+            )
+
+        return _coordinators[engine]
+
+
+def stop_write_coordinators() -> None:
+    """Stop all write coordinators of this process"""
+    with _coordinators_lock:
+        for coordinator in _coordinators.values():
+            coordinator.stop()
+        _coordinators.clear()
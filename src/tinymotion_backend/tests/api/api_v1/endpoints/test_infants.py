@@ -5,6 +5,8 @@ from fastapi.testclient import TestClient
 from sqlmodel import Session
 
 from tinymotion_backend import models
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.instrumentation import QUERY_COUNT_HEADER, QUERY_TIME_HEADER
 
 
 def test_create_infant(client: TestClient, access_token_headers: dict[str, str], mocked_user_id: uuid.UUID):
@@ -61,3 +63,27 @@ def test_create_infant_not_authenticated(client: TestClient):
     response = client.post("/v1/infants", json=infant_data)
     assert response.status_code == 401
     assert response.json()["detail"] == "Not authenticated"
+
+
+def test_create_infant_query_stats(
+    monkeypatch,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+):
+    infant_data = {
+        "full_name": "An Infant",
+        "birth_date": "2024-02-01",
+        "due_date": "2024-01-01",
+        "nhi_number": "123xyz",
+    }
+    response = client.post("/v1/infants", json=infant_data, headers=access_token_headers)
+    assert response.status_code == 200
+    assert QUERY_COUNT_HEADER not in response.headers
+
+    monkeypatch.setattr(settings, "DATABASE_QUERY_STATS_HEADERS", True)
+    infant_data["nhi_number"] = "456xyz"
+    response = client.post("/v1/infants", json=infant_data, headers=access_token_headers)
+    assert response.status_code == 200
+    # look up the user, insert the infant and read it back
+    assert int(response.headers[QUERY_COUNT_HEADER]) == 3
+    assert float(response.headers[QUERY_TIME_HEADER]) > 0
@@ -1,10 +1,13 @@
 import os
 import datetime
 import hashlib
+import struct
+import threading
 import uuid
 
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select
 
 from tinymotion_backend import models
 from tinymotion_backend.core.config import settings
@@ -311,3 +314,324 @@ def test_create_video_checksum_mismatch(
     assert response.status_code == 409
     data = response.json()
     assert data["detail"].startswith("Verification of the SHA256 checksum of the uploaded video failed (")
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_create_video_batch(
+    session: Session,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+    mocked_user_id: uuid.UUID,
+    monkeypatch,
+    max_workers: int,
+):
+    monkeypatch.setattr(settings, "VIDEO_BATCH_MAX_WORKERS", max_workers)
+
+    # add an infant first
+    infant = models.Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    # and a consent
+    consent = models.Consent(
+        consent_giver_name="Consent Giver",
+        consent_giver_email="consent@test.com",
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(consent)
+    session.commit()
+    session.refresh(consent)
+
+    # override video library
+    settings.VIDEO_LIBRARY_PATH = str(tmp_path / "videos")
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    # create some files, the last one with the wrong checksum
+    upload_files = []
+    checksums = []
+    for i, multiplier in enumerate([0.3, 1.6, 0.5]):
+        upload_file = tmp_path / f"file{i}.mp4"
+        upload_file.write_bytes(os.urandom(int(settings.FILE_CHUNK_SIZE_BYTES * multiplier)))
+        upload_files.append(upload_file)
+        checksums.append(hashlib.sha256(upload_file.read_bytes()).hexdigest())
+    checksums[2] = "abcd" * 16
+
+    # add the videos
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksums_sha256": checksums,
+    }
+    files = [("videos", (f.name, f.open('rb'))) for f in upload_files]
+    try:
+        response = client.post("/v1/videos/batch", data=data_in, files=files, headers=access_token_headers)
+    finally:
+        for _, (_, f) in files:
+            f.close()
+    assert response.status_code == 200
+    data = response.json()
+    assert data["nhi_number"] == "123xyz"
+    assert len(data["parts"]) == 3
+
+    for part, upload_file, checksum in zip(data["parts"][:2], upload_files[:2], checksums[:2]):
+        assert part["success"]
+        assert part["filename"] == upload_file.name
+        assert part["video"]["sha256sum"] == checksum
+        assert part["video"]["infant_id"] == str(infant.infant_id)
+        assert part["video"]["created_by"] == str(mocked_user_id)
+        assert os.path.exists(os.path.join(settings.VIDEO_LIBRARY_PATH, part["video"]["video_name"]))
+
+    assert not data["parts"][2]["success"]
+    assert data["parts"][2]["video"] is None
+    assert data["parts"][2]["detail"].startswith("Verification of the SHA256 checksum of the uploaded video failed (")
+
+    # only the successful parts are stored
+    assert len(os.listdir(settings.VIDEO_LIBRARY_PATH)) == 2
+    assert len(session.exec(select(models.Video)).all()) == 2
+
+
+def test_create_video_batch_no_consent(
+    session: Session,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+    mocked_user_id: uuid.UUID,
+):
+    # add an infant without a consent
+    infant = models.Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+
+    # override video library
+    settings.VIDEO_LIBRARY_PATH = str(tmp_path / "videos")
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    upload_file = tmp_path / "file.mp4"
+    upload_file.write_bytes(os.urandom(1024))
+    sha256sum = hashlib.sha256(upload_file.read_bytes()).hexdigest()
+
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksums_sha256": [sha256sum],
+    }
+    with upload_file.open('rb') as f:
+        response = client.post("/v1/videos/batch", data=data_in, files=[("videos", f)], headers=access_token_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No consent exists"
+    assert len(os.listdir(settings.VIDEO_LIBRARY_PATH)) == 0
+
+
+def test_create_video_batch_checksum_count_mismatch(
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+):
+    upload_file = tmp_path / "file.mp4"
+    upload_file.write_bytes(os.urandom(1024))
+
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksums_sha256": ["abcd" * 16, "efgh" * 16],
+    }
+    with upload_file.open('rb') as f:
+        response = client.post("/v1/videos/batch", data=data_in, files=[("videos", f)], headers=access_token_headers)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "The number of checksums must match the number of videos"
+
+
+def test_create_video_extracts_metadata(
+    session: Session,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+    mocked_user_id: uuid.UUID,
+):
+    # add an infant with a consent
+    infant = models.Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    consent = models.Consent(
+        collected_physically=True,
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(consent)
+    session.commit()
+
+    # override video library
+    settings.VIDEO_LIBRARY_PATH = str(tmp_path / "videos")
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    # create a minimal mp4 file with a 75 second duration and the moov box at the end
+    def box(box_type: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+    mvhd = box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, 75000) + bytes(80))
+    upload_file = tmp_path / "file.mp4"
+    upload_file.write_bytes(
+        box(b"ftyp", b"isom" + bytes(4))
+        + box(b"mdat", os.urandom(int(settings.FILE_CHUNK_SIZE_BYTES * 1.6)))
+        + box(b"moov", mvhd)
+    )
+    sha256sum = hashlib.sha256(upload_file.read_bytes()).hexdigest()
+
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksum_sha256": sha256sum,
+    }
+    with upload_file.open('rb') as f:
+        response = client.post("/v1/videos", data=data_in, files={'video': f}, headers=access_token_headers)
+    assert response.status_code == 200
+    video_id = uuid.UUID(response.json()["video_id"])
+
+    video = session.get(models.Video, video_id)
+    session.refresh(video)
+    assert video.duration_seconds == 75.0
+    assert video.width is None
+
+    # videos can be queried by duration
+    short_videos = session.exec(select(models.Video).where(models.Video.duration_seconds < 120)).all()
+    assert [v.video_id for v in short_videos] == [video_id]
+
+
+@pytest.mark.parametrize("mirror_wait", [True, False])
+@pytest.mark.parametrize("mirror_exists", [True, False])
+def test_create_video_mirrored(
+    session: Session,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+    mocked_user_id: uuid.UUID,
+    monkeypatch,
+    mirror_wait: bool,
+    mirror_exists: bool,
+):
+    # add an infant with a consent
+    infant = models.Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    consent = models.Consent(
+        collected_physically=True,
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(consent)
+    session.commit()
+
+    # override video library and configure the mirror
+    settings.VIDEO_LIBRARY_PATH = str(tmp_path / "videos")
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_WAIT", mirror_wait)
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+    if mirror_exists:
+        os.makedirs(settings.VIDEO_MIRROR_PATH)
+
+    # create a file
+    upload_file = tmp_path / "file.mp4"
+    upload_file.write_bytes(os.urandom(int(settings.FILE_CHUNK_SIZE_BYTES * 1.6)))
+    sha256sum = hashlib.sha256(upload_file.read_bytes()).hexdigest()
+
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksum_sha256": sha256sum,
+    }
+    with upload_file.open('rb') as f:
+        response = client.post("/v1/videos", data=data_in, files={'video': f}, headers=access_token_headers)
+
+    # the upload succeeds even if the mirror fails
+    assert response.status_code == 200
+    video_name = response.json()["video_name"]
+
+    # wait for any mirror threads to finish
+    for thread in threading.enumerate():
+        if thread.name == f"mirror-{video_name}":
+            thread.join()
+
+    primary_path = os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)
+    mirror_path = os.path.join(settings.VIDEO_MIRROR_PATH, video_name)
+    if mirror_exists:
+        with open(primary_path, "rb") as fp, open(mirror_path, "rb") as fm:
+            assert fp.read() == fm.read()
+        assert not os.path.exists(settings.VIDEO_MIRROR_REPAIR_LOG)
+    else:
+        assert not os.path.exists(mirror_path)
+        with open(settings.VIDEO_MIRROR_REPAIR_LOG) as fh:
+            assert video_name in fh.read()
+
+
+def test_create_video_checksum_mismatch_mirror_removed(
+    session: Session,
+    client: TestClient,
+    access_token_headers: dict[str, str],
+    tmp_path,
+    mocked_user_id: uuid.UUID,
+    monkeypatch,
+):
+    infant = models.Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    consent = models.Consent(
+        collected_physically=True,
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(consent)
+    session.commit()
+
+    settings.VIDEO_LIBRARY_PATH = str(tmp_path / "videos")
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+    os.makedirs(settings.VIDEO_MIRROR_PATH)
+
+    upload_file = tmp_path / "file.mp4"
+    upload_file.write_bytes(os.urandom(1024))
+
+    data_in = {
+        "nhi_number": "123xyz",
+        "checksum_sha256": "abcd" * 16,
+    }
+    with upload_file.open('rb') as f:
+        response = client.post("/v1/videos", data=data_in, files={'video': f}, headers=access_token_headers)
+    assert response.status_code == 409
+
+    for thread in threading.enumerate():
+        if thread.name.startswith("mirror-"):
+            thread.join()
+    assert os.listdir(settings.VIDEO_MIRROR_PATH) == []
+    assert not os.path.exists(settings.VIDEO_MIRROR_REPAIR_LOG)
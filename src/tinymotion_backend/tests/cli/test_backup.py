@@ -0,0 +1,115 @@
+import os
+import uuid
+import hashlib
+import datetime
+
+import pytest
+import sqlalchemy
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from click.testing import CliRunner
+
+from tinymotion_backend.cli import cli
+from tinymotion_backend.models import Infant, Video
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.core import manifest
+from tinymotion_backend.core.config import settings
+
+
+@pytest.fixture(name="library")
+def library_fixture(monkeypatch, session: Session, read_engine: Engine, mocked_user_id: uuid.UUID, tmp_path) -> Infant:
+    monkeypatch.setattr("tinymotion_backend.database.engine", session.get_bind())
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+
+    return infant
+
+
+def add_video(session: Session, infant: Infant, video_name: str, content: bytes | None,
+              created_at: datetime.datetime | None = None, sha256sum_enc: str | None = None) -> Video:
+    """Store a video (with its content standing in for the encrypted file), or one still being uploaded"""
+    if content is not None:
+        with open(os.path.join(settings.VIDEO_LIBRARY_PATH, video_name), "wb") as fh:
+            fh.write(content)
+    video = Video(
+        video_name=video_name,
+        sha256sum="a" * 64,
+        sha256sum_enc=sha256sum_enc or (None if content is None else hashlib.sha256(content).hexdigest()),
+        video_size=None if content is None else len(content),
+        infant_id=infant.infant_id,
+        created_by=infant.created_by,
+        created_at=created_at or datetime.datetime.now(datetime.timezone.utc),
+    )
+    session.add(video)
+    session.commit()
+    session.refresh(video)
+
+    return video
+
+
+def test_cli_backup(session: Session, library: Infant, tmp_path):
+    contents = {f"video{i}.enc": os.urandom(1000 + i) for i in range(3)}
+    for i, (video_name, content) in enumerate(contents.items()):
+        created_at = datetime.datetime(2024, 1, 1 + i, tzinfo=datetime.timezone.utc)
+        add_video(session, library, video_name, content, created_at=created_at)
+    add_video(session, library, "uploading.enc", None)
+    # the first video is in cold storage
+    video_service = VideoService(session, None)
+    assert video_service.move_to_cold_storage(datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)) == 1
+
+    backup_path = tmp_path / "backup"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["backup", str(backup_path), "--pages-per-step", "2", "--step-pause-ms", "0"])
+    assert result.exit_code == 0, result.output
+    assert "Copied 3 video(s) (3003 bytes), 0 unchanged, 0 removed" in result.output
+
+    assert sorted(os.listdir(backup_path)) == ["manifest.jsonl", "tinymotion.db", "videos"]
+    assert {name: (backup_path / "videos" / name).read_bytes() for name in os.listdir(backup_path / "videos")} == \
+        contents
+    assert sorted(manifest.read_manifest(str(backup_path / "manifest.jsonl"))) == sorted(contents)
+
+    # the snapshot has every video in the backup's video directory
+    backup_engine = sqlalchemy.create_engine(f"sqlite:///{backup_path / 'tinymotion.db'}")
+    with Session(backup_engine) as backup_session:
+        videos = backup_session.exec(select(Video)).all()
+        assert sorted(video.video_name for video in videos) == sorted([*contents, "uploading.enc"])
+        assert all(video.storage_tier == "hot" and video.pack_name is None for video in videos)
+    backup_engine.dispose()
+
+    # again, after adding a video and deleting another
+    add_video(session, library, "video3.enc", b"new")
+    video = video_service.get_by_video_name("video2.enc")
+    video_service.delete(video.video_id)
+
+    result = runner.invoke(cli, ["backup", str(backup_path)])
+    assert result.exit_code == 0, result.output
+    assert "Copied 1 video(s) (3 bytes), 2 unchanged, 1 removed" in result.output
+    assert sorted(os.listdir(backup_path / "videos")) == ["video0.enc", "video1.enc", "video3.enc"]
+
+
+def test_cli_backup_checksum_mismatch(session: Session, library: Infant, tmp_path):
+    add_video(session, library, "video0.enc", b"content")
+    add_video(session, library, "corrupt.enc", b"content", sha256sum_enc="0" * 64)
+
+    backup_path = tmp_path / "backup"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["backup", str(backup_path)])
+    assert result.exit_code != 0
+    assert "Error: failed to copy video corrupt.enc: Copy of video corrupt.enc does not match" in result.output
+    assert "Error: 1 video(s) could not be copied" in result.output
+
+    # the rest is backed up, and the video is tried again next time
+    assert os.listdir(backup_path / "videos") == ["video0.enc"]
+    assert list(manifest.read_manifest(str(backup_path / "manifest.jsonl"))) == ["video0.enc"]
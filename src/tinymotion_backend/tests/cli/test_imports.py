@@ -0,0 +1,130 @@
+import os
+import json
+import uuid
+import datetime
+
+import pytest
+from sqlmodel import Session, select
+from click.testing import CliRunner
+
+from tinymotion_backend.cli import cli
+from tinymotion_backend.models import Infant, Consent
+from tinymotion_backend.core.blind_index import blind_index
+
+
+INFANTS_CSV = """\
+full_name,nhi_number,birth_date,due_date
+Infant One,ABC0001,2024-01-01,2024-01-02
+Infant Two,ABC0002,2024-02-01,2024-02-02
+Infant Three,ABC0003,20240301,2024-03-02
+Infant Four,ABC0001,2024-04-01,2024-04-02
+"Infant, Five",ABC0005,2024-05-01,2024-05-02
+"""
+
+
+def read_errors(path: str) -> dict[int, str]:
+    with open(path) as f:
+        return {error["record"]: error["error"] for error in map(json.loads, f)}
+
+
+@pytest.mark.parametrize("batch_size", ["1", "2", "500"])
+def test_cli_import_infants_csv(monkeypatch, tmp_path, session: Session, mocked_user_id: uuid.UUID, batch_size: str):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    import_path = tmp_path / "infants.csv"
+    import_path.write_text(INFANTS_CSV)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(import_path), "-t", "infant", "-u", str(mocked_user_id),
+                                 "-b", batch_size])
+
+    assert result.exit_code == 0
+    assert "Imported 3 infant records, 2 failed" in result.output
+    infants = session.exec(select(Infant)).all()
+    assert sorted(infant.full_name for infant in infants) == ["Infant One", "Infant Two", "Infant, Five"]
+    assert all(infant.created_by == mocked_user_id for infant in infants)
+
+    # record 3 has an invalid date and record 4 repeats an NHI number
+    errors = read_errors(f"{import_path}.errors.jsonl")
+    assert sorted(errors) == [3, 4]
+    assert errors[3].startswith("birth_date:")
+    assert "ABC0001" not in json.dumps(errors)
+
+    # the import finished, so there is nothing to resume
+    assert not os.path.exists(f"{import_path}.checkpoint")
+
+
+def test_cli_import_consents_jsonl(monkeypatch, tmp_path, session: Session, mocked_user_id: uuid.UUID):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    infant = Infant(
+        full_name="An Infant",
+        nhi_number="ABC0001",
+        birth_date=datetime.date(2024, 1, 1),
+        due_date=datetime.date(2024, 1, 2),
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+
+    import_path = tmp_path / "consents.jsonl"
+    import_path.write_text("\n".join([
+        json.dumps({"nhi_number": "ABC0001", "consent_giver_name": "A Parent", "consent_giver_email": "a@test.com"}),
+        json.dumps({"nhi_number": "ABC0001", "collected_physically": True}),
+        "",
+        json.dumps({"nhi_number": "NOTANHI", "collected_physically": True}),
+        "{not json",
+        json.dumps({"nhi_number": "ABC0001", "consent_giver_name": "A Parent"}),
+    ]) + "\n")
+    error_report = tmp_path / "errors.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(import_path), "-t", "consent", "-u", str(mocked_user_id),
+                                 "-e", str(error_report)])
+
+    assert result.exit_code == 0
+    assert "Imported 2 consent records, 3 failed" in result.output
+    consents = session.exec(select(Consent)).all()
+    assert len(consents) == 2
+    assert all(consent.infant_id == infant.infant_id for consent in consents)
+    assert sorted(read_errors(error_report)) == [3, 4, 5]
+
+
+def test_cli_import_resume(monkeypatch, tmp_path, session: Session, mocked_user_id: uuid.UUID):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    import_path = tmp_path / "infants.csv"
+    import_path.write_text(INFANTS_CSV)
+    checkpoint = tmp_path / "infants.csv.checkpoint"
+    # as if an earlier run was interrupted after committing the first two records
+    checkpoint.write_text(json.dumps({"record_type": "infant", "records_done": 2}))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(import_path), "-t", "infant", "-u", str(mocked_user_id)])
+
+    assert result.exit_code == 0
+    assert "Resuming after record 2" in result.output
+    assert "Imported 2 infant records, 1 failed" in result.output
+    nhi_number_bidxs = session.exec(select(Infant.nhi_number_bidx)).all()
+    assert sorted(nhi_number_bidxs) == sorted([blind_index("ABC0001"), blind_index("ABC0005")])
+    assert not checkpoint.exists()
+
+    # a checkpoint for the other record type is rejected
+    checkpoint.write_text(json.dumps({"record_type": "infant", "records_done": 2}))
+    result = runner.invoke(cli, ["import", str(import_path), "-t", "consent", "-u", str(mocked_user_id)])
+    assert result.exit_code == 1
+    assert "is for importing infant records" in result.output
+
+
+def test_cli_import_invalid_user(monkeypatch, tmp_path, session: Session):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    import_path = tmp_path / "infants.csv"
+    import_path.write_text(INFANTS_CSV)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(import_path), "-t", "infant", "-u", str(uuid.uuid4())])
+
+    assert result.exit_code == 1
+    assert "Error: specified user id is not valid" in result.output
+    assert len(session.exec(select(Infant)).all()) == 0
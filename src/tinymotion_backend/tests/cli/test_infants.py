@@ -1,14 +1,20 @@
+import os
 import uuid
+import hashlib
 import datetime
 
 import pytest
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, select
 from click.testing import CliRunner
 
 from tinymotion_backend.cli import cli
 from tinymotion_backend.models import Infant, Consent, Video
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.core.config import settings
 from tinymotion_backend.tests.mock_data import MOCK_USERS
 from tinymotion_backend.core.exc import NotFoundError
+from tinymotion_backend.core.blind_index import blind_index
 
 
 @pytest.mark.parametrize("user_id,full_name,nhi_number,birth_date,due_date,exit_code,expected_output", [
@@ -48,7 +54,7 @@ def test_cli_infant_create(monkeypatch, session: Session, mocked_user_id: uuid.U
 
     if exit_code == 0:
         infant: Infant = session.exec(
-            select(Infant).where(Infant.nhi_number == nhi_number)
+            select(Infant).where(Infant.nhi_number_bidx == blind_index(nhi_number))
         ).one()
         assert infant.full_name == full_name
         assert infant.birth_date == datetime.datetime.strptime(birth_date, "%Y-%m-%d").date()
@@ -254,12 +260,64 @@ def test_cli_infant_delete_cascade(monkeypatch, session: Session, mocked_user_id
         assert video is not None
 
 
+def test_cli_infant_delete_cold_storage(monkeypatch, session: Session, mocked_user_id: uuid.UUID, tmp_path):
+    monkeypatch.setattr('tinymotion_backend.database.engine', session.get_bind())
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    # an infant with a video in cold storage, and another infant's video in the same pack
+    infants = []
+    for nhi_number in ["abc12345", "abc12346"]:
+        infant = Infant(
+            full_name="Infants Name",
+            nhi_number=nhi_number,
+            birth_date=datetime.date(2023, 1, 3),
+            due_date=datetime.date(2023, 1, 2),
+            created_by=mocked_user_id,
+        )
+        session.add(infant)
+        session.commit()
+        session.refresh(infant)
+        content = os.urandom(1000)
+        with open(os.path.join(settings.VIDEO_LIBRARY_PATH, nhi_number), "wb") as fh:
+            fh.write(content)
+        session.add(Video(
+            infant_id=infant.infant_id,
+            created_by=mocked_user_id,
+            video_name=nhi_number,
+            sha256sum="abcdefgh"*8,
+            sha256sum_enc=hashlib.sha256(content).hexdigest(),
+            video_size=len(content),
+            created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        ))
+        session.commit()
+        infants.append(infant)
+    VideoService(session, None).move_to_cold_storage(datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["infant", "delete", str(infants[0].infant_id)], input="y")
+    assert result.exit_code == 0, result.output
+
+    # the video stays in its pack until the packs are compacted, then only the other infant's video is left
+    assert sum(os.path.getsize(tmp_path / "cold" / name) for name in os.listdir(tmp_path / "cold")
+               if name.endswith(".pack")) == 2000
+    result = runner.invoke(cli, ["video", "compact"])
+    assert result.exit_code == 0, result.output
+    assert "Compacted 1 pack(s), reclaiming 1000 bytes" in result.output
+    session.expire_all()
+    video = VideoService(session, None).get_by_video_name("abc12346")
+    packs = [name for name in os.listdir(settings.VIDEO_COLD_STORAGE_PATH) if name.endswith(".pack")]
+    assert packs == [video.pack_name]
+    assert os.path.getsize(tmp_path / "cold" / video.pack_name) == 1000
+
+
 @pytest.mark.parametrize("num_add", [
     0,
     1,
     4,
 ])
-def test_cli_infant_list(monkeypatch, session: Session, mocked_user_id: uuid.UUID, num_add: int):
+def test_cli_infant_list(monkeypatch, session: Session, read_engine: Engine, mocked_user_id: uuid.UUID, num_add: int):
     engine = session.get_bind()
     monkeypatch.setattr('tinymotion_backend.database.engine', engine)
 
@@ -279,3 +337,31 @@ def test_cli_infant_list(monkeypatch, session: Session, mocked_user_id: uuid.UUI
 
     assert result.exit_code == 0
     assert f"Found {num_add} Infants" in result.output
+
+
+def test_cli_infant_recount(monkeypatch, session: Session, mocked_user_id: uuid.UUID):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+
+    infant = Infant(
+        full_name="An Infant",
+        nhi_number="abc123",
+        birth_date=datetime.date(2024, 3, 1),
+        due_date=datetime.date(2024, 3, 2),
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.add(Consent(infant_id=infant.infant_id, collected_physically=True, created_by=mocked_user_id))
+    session.commit()
+    infant.consent_count = 0
+    session.add(infant)
+    session.commit()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["infant", "recount"])
+
+    assert result.exit_code == 0
+    assert "Repaired the counters of 1 infant(s)" in result.output
+    session.refresh(infant)
+    assert infant.consent_count == 1
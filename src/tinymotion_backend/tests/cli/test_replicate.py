@@ -0,0 +1,65 @@
+import os
+import datetime
+
+from sqlmodel import Session
+from click.testing import CliRunner
+
+from tinymotion_backend.cli import cli
+from tinymotion_backend.models import Infant
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.core import manifest
+from tinymotion_backend.tests.cli.test_backup import add_video, library_fixture  # noqa: F401
+
+
+def test_cli_replicate(session: Session, library: Infant, tmp_path):
+    contents = {f"video{i}.enc": os.urandom(1000 + i) for i in range(4)}
+    for i, (video_name, content) in enumerate(contents.items()):
+        created_at = datetime.datetime(2024, 1, 1 + i, tzinfo=datetime.timezone.utc)
+        add_video(session, library, video_name, content, created_at=created_at)
+    add_video(session, library, "uploading.enc", None)
+    video_service = VideoService(session, None)
+    video_service.move_to_cold_storage(datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc))
+
+    target_path = tmp_path / "replica"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["replicate", str(target_path), "--jobs", "2", "--bwlimit-kib", "1000"])
+    assert result.exit_code == 0, result.output
+    assert "4 video(s) to copy, 0 unchanged, 0 to remove" in result.output
+    assert "Copied 4 video(s) (4006 bytes), removed 0" in result.output
+    assert {name: (target_path / name).read_bytes() for name in contents} == contents
+    assert sorted(manifest.read_manifest(str(target_path / "manifest.jsonl"))) == sorted(contents)
+
+    # nothing has changed
+    result = runner.invoke(cli, ["replicate", str(target_path)])
+    assert result.exit_code == 0, result.output
+    assert "0 video(s) to copy, 4 unchanged, 0 to remove" in result.output
+
+    # interrupted while appending to the manifest, after the last copy
+    manifest_lines = (target_path / "manifest.jsonl").read_text().splitlines(keepends=True)
+    (target_path / "manifest.jsonl").write_text("".join(manifest_lines[:-1]) + manifest_lines[-1][:10])
+    add_video(session, library, "video4.enc", b"new")
+    video_service.delete(video_service.get_by_video_name("video1.enc").video_id)
+
+    result = runner.invoke(cli, ["replicate", str(target_path)])
+    assert result.exit_code == 0, result.output
+    assert "2 video(s) to copy, 2 unchanged, 1 to remove" in result.output
+    assert sorted(os.listdir(target_path)) == ["manifest.jsonl", "video0.enc", "video2.enc", "video3.enc", "video4.enc"]
+    assert sorted(manifest.read_manifest(str(target_path / "manifest.jsonl"))) == \
+        ["video0.enc", "video2.enc", "video3.enc", "video4.enc"]
+
+
+def test_cli_replicate_checksum_mismatch(session: Session, library: Infant, tmp_path):
+    add_video(session, library, "video0.enc", b"content")
+    add_video(session, library, "corrupt.enc", b"content", sha256sum_enc="0" * 64)
+
+    target_path = tmp_path / "replica"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["replicate", str(target_path)])
+    assert result.exit_code != 0
+    assert "Error: failed to copy video corrupt.enc: Copy of video corrupt.enc does not match" in result.output
+    assert "Error: 1 video(s) could not be copied" in result.output
+    assert sorted(os.listdir(target_path)) == ["manifest.jsonl", "video0.enc"]
+
+    # only the video that failed is tried again
+    result = runner.invoke(cli, ["replicate", str(target_path)])
+    assert "1 video(s) to copy, 1 unchanged, 0 to remove" in result.output
@@ -1,6 +1,8 @@
+import json
 import uuid
 
 import pytest
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, select
 from click.testing import CliRunner
 
@@ -8,6 +10,7 @@ from tinymotion_backend.cli import cli
 from tinymotion_backend.models import User
 from tinymotion_backend.tests.mock_data import MOCK_USERS
 from tinymotion_backend.core.exc import NotFoundError
+from tinymotion_backend.core.blind_index import blind_index
 
 
 @pytest.mark.parametrize("email,key,disabled,exit_code", [
@@ -34,7 +37,7 @@ def test_cli_user_create(monkeypatch, session: Session, email, key, disabled, ex
 
     if exit_code == 0:
         user = session.exec(
-            select(User).where(User.access_key == key)
+            select(User).where(User.access_key_bidx == blind_index(key))
         ).one()
         assert user.email == email
         assert user.disabled is False if not disabled else True
@@ -107,7 +110,7 @@ def test_cli_user_delete(monkeypatch, session: Session, mocked_user_id: uuid.UUI
     1,
     4,
 ])
-def test_cli_user_list(monkeypatch, session: Session, num_add):
+def test_cli_user_list(monkeypatch, session: Session, read_engine: Engine, num_add):
     engine = session.get_bind()
     monkeypatch.setattr('tinymotion_backend.database.engine', engine)
 
@@ -125,3 +128,24 @@ def test_cli_user_list(monkeypatch, session: Session, num_add):
 
     assert result.exit_code == 0
     assert f"Found {num_add + 1} Users" in result.output
+
+    result = runner.invoke(cli, ["user", "list", "-j"])
+
+    assert result.exit_code == 0
+    users = json.loads(result.output)
+    assert len(users) == num_add + 1
+    assert {f"an{i}@email.com" for i in range(num_add)} <= {user["email"] for user in users}
+
+
+def test_cli_query_stats(monkeypatch, session: Session, read_engine: Engine):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["user", "list"])
+    assert result.exit_code == 0
+    assert "Database: " not in result.output
+
+    result = runner.invoke(cli, ["--query-stats", "user", "list"])
+    assert result.exit_code == 0
+    assert "Database: 2 queries in " in result.stderr
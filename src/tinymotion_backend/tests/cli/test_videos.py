@@ -0,0 +1,139 @@
+import io
+import os
+import uuid
+import hashlib
+import datetime
+
+from sqlmodel import Session
+from click.testing import CliRunner
+
+from tinymotion_backend.cli import cli
+from tinymotion_backend.models import Infant, Video
+from tinymotion_backend.core import storage
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.encryption import encrypt_file
+
+
+def test_cli_video_mirror_repair(monkeypatch, session: Session, mocked_user_id: uuid.UUID, tmp_path):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+    os.makedirs(settings.VIDEO_MIRROR_PATH)
+
+    # an infant with a stored video
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    content = os.urandom(1000)
+    (tmp_path / "videos" / "video1.enc").write_bytes(content)
+    video = Video(
+        video_name="video1.enc",
+        sha256sum="a" * 64,
+        sha256sum_enc=hashlib.sha256(content).hexdigest(),
+        video_size=len(content),
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(video)
+    session.commit()
+
+    # repair tasks for the video and for one that has since been deleted
+    storage.log_mirror_repair("video1.enc", "OSError()")
+    storage.log_mirror_repair("deleted.enc", "OSError()")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["video", "mirror-repair"])
+    assert result.exit_code == 0
+    assert "Found 2 mirror repair task(s)" in result.output
+    assert "2 resolved, 0 remaining" in result.output
+
+    assert (tmp_path / "mirror" / "video1.enc").read_bytes() == content
+    assert storage.read_mirror_repair_log() == []
+
+
+def test_cli_video_mirror_repair_not_configured(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", None)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["video", "mirror-repair"])
+    assert result.exit_code == 1
+    assert "Error: no mirror is configured" in result.output
+
+
+def test_cli_video_tier_with_mirror(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["video", "tier", "--older-than-days", "30"])
+    assert result.exit_code == 1
+    assert "Error: videos in cold storage are not mirrored" in result.output
+
+
+def test_cli_video_tier_and_decrypt(monkeypatch, session: Session, mocked_user_id: uuid.UUID, tmp_path):
+    engine = session.get_bind()
+    monkeypatch.setattr('tinymotion_backend.database.engine', engine)
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 2, 1),
+        due_date=datetime.date(2024, 1, 1),
+        nhi_number="123xyz",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    content = os.urandom(5000)
+    orig_hash, enc_hash = encrypt_file(io.BytesIO(content), str(tmp_path / "videos" / "video1.enc"))
+    video = Video(
+        video_name="video1.enc",
+        sha256sum=orig_hash,
+        sha256sum_enc=enc_hash,
+        video_size=os.path.getsize(tmp_path / "videos" / "video1.enc"),
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+        created_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=40),
+    )
+    session.add(video)
+    session.commit()
+    session.refresh(video)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["video", "tier", "--older-than-days", "60"])
+    assert result.exit_code == 0
+    assert "Moved 0 video(s) to cold storage" in result.output
+
+    result = runner.invoke(cli, ["video", "tier", "--older-than-days", "30"])
+    assert result.exit_code == 0
+    assert "Moved 1 video(s) to cold storage" in result.output
+    assert not os.path.exists(tmp_path / "videos" / "video1.enc")
+
+    result = runner.invoke(cli, ["video", "decrypt", str(video.video_id), str(tmp_path / "out.mp4")])
+    assert result.exit_code == 0
+    assert (tmp_path / "out.mp4").read_bytes() == content
+
+    result = runner.invoke(cli, ["video", "compact"])
+    assert result.exit_code == 0
+    assert "Compacted 0 pack(s), reclaiming 0 bytes" in result.output
+
+    # deleting the video leaves it in its pack, until the packs are compacted
+    result = runner.invoke(cli, ["video", "delete", str(video.video_id)], input="y\n")
+    assert result.exit_code == 0, result.output
+    assert len(os.listdir(tmp_path / "cold")) == 2
+    result = runner.invoke(cli, ["video", "compact"])
+    assert result.exit_code == 0
+    assert f"Compacted 1 pack(s), reclaiming {video.video_size} bytes" in result.output
+    assert os.listdir(tmp_path / "cold") == []
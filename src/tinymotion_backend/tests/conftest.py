@@ -1,41 +1,92 @@
 import uuid
+from pathlib import Path
 
 import pytest
+from alembic.config import Config
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine, select
-from sqlmodel.pool import StaticPool
-from sqlalchemy import event
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import NullPool
 
 from tinymotion_backend.main import app
-from tinymotion_backend.api.deps import get_session
+from tinymotion_backend.api.deps import get_session, get_async_session, get_read_session, get_async_read_session
+from tinymotion_backend import database
 from tinymotion_backend import models  # noqa
 from tinymotion_backend.tests import mock_data
+from tinymotion_backend.core.blind_index import blind_index
 
 
-@pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
+@pytest.fixture(name="alembic_config")
+def alembic_config_fixture() -> Config:
+    # note alembic's env.py runs the migrations using the engine from the database module
+    repo_root = Path(__file__).parents[3]
+    alembic_config = Config(str(repo_root / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(repo_root / "alembic"))
+
+    return alembic_config
 
-    # enable foreign keys, from https://stackoverflow.com/a/7831210
-    def _fk_pragma_on_connect(dbapi_con, con_record):
-        dbapi_con.execute('pragma foreign_keys=ON')
 
-    event.listen(engine, 'connect', _fk_pragma_on_connect)
+@pytest.fixture(name="database_uri")
+def database_uri_fixture(tmp_path) -> str:
+    # a database file rather than in memory, so the API's async engine can share it
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture(name="session")
+def session_fixture(database_uri: str):
+    engine = database.create_db_engine(database_uri)
 
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         mock_data.insert_mocked_data(session)
         yield session
 
+    engine.dispose()
+
+
+@pytest.fixture(name="read_engine")
+def read_engine_fixture(monkeypatch, session: Session, database_uri: str):
+    # also used by the CLI's read-only commands
+    engine = database.create_db_engine(database_uri, read_only=True)
+    monkeypatch.setattr("tinymotion_backend.database.read_engine", engine)
+    yield engine
+
+    engine.dispose()
+
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(database_uri: str) -> AsyncEngine:
+    # the test client runs each request in a new event loop, so connections can't be pooled between them
+    return database.create_async_db_engine(database.async_database_uri(database_uri), poolclass=NullPool)
+
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine: AsyncEngine, read_engine: Engine, database_uri: str):
+    async_read_engine = database.create_async_db_engine(
+        database.async_database_uri(database_uri), read_only=True, poolclass=NullPool,
+    )
+
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    def get_read_session_override():
+        with Session(read_engine, expire_on_commit=False) as read_session:
+            yield read_session
+
+    async def get_async_read_session_override():
+        async with AsyncSession(async_read_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_read_session] = get_read_session_override
+    app.dependency_overrides[get_async_read_session] = get_async_read_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -58,7 +109,7 @@ def access_token_headers(client: TestClient) -> dict[str, str]:
 def mocked_user_id(session: Session) -> uuid.UUID:
     mocked_user_access_key: str = mock_data.MOCK_USERS[0]["access_key"]
     user: models.User = session.exec(
-        select(models.User).where(models.User.access_key == mocked_user_access_key)
+        select(models.User).where(models.User.access_key_bidx == blind_index(mocked_user_access_key))
     ).one()
 
     return user.user_id
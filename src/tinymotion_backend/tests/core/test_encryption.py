@@ -1,11 +1,19 @@
 import os
 import hashlib
+import itertools
 
 import pytest
+import sqlalchemy
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy_utils import StringEncryptedType
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
 
-from tinymotion_backend.core.encryption import encrypt_file, decrypt_file
+from tinymotion_backend.core.encryption import (
+    encrypt_file, decrypt_file, encrypt_column_value, decrypt_column_value, encrypt_column_value_legacy, DecryptCache,
+)
 from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.storage import encrypted_file_size
 
 
 def test_file_encryption_decryption(tmp_path):
@@ -118,3 +126,138 @@ def test_file_encryption_decryption_fails(tmp_path):
     out_file = str(tmp_path / "myfile2.txt")
     with pytest.raises(InvalidToken):
         decrypt_file(enc_file, out_file)
+
+
+@pytest.mark.parametrize("size", [0, 1, 15, 16, 17, 1000, 1024 * 1024])
+def test_encrypted_file_size(tmp_path, monkeypatch, size):
+    monkeypatch.setattr(settings, "FILE_CHUNK_SIZE_BYTES", 4096)
+    tmp_file = tmp_path / "input.dat"
+    tmp_file.write_bytes(os.urandom(size))
+
+    enc_file = tmp_path / "encrypted.dat"
+    with tmp_file.open('rb') as fin:
+        encrypt_file(fin, enc_file)
+
+    assert os.path.getsize(enc_file) == encrypted_file_size(size, 4096)
+
+
+@pytest.mark.parametrize("durability", ["none", "fsync", "fsync_dir"])
+@pytest.mark.parametrize("preallocate", [True, False])
+@pytest.mark.parametrize("expected_size_offset", [None, 0, -1000, 1000])
+def test_file_encryption_durability(tmp_path, monkeypatch, durability, preallocate, expected_size_offset):
+    monkeypatch.setattr(settings, "VIDEO_DURABILITY", durability)
+    monkeypatch.setattr(settings, "VIDEO_PREALLOCATE", preallocate)
+    size = int(settings.FILE_CHUNK_SIZE_BYTES * 1.4)
+    tmp_file = tmp_path / "input.dat"
+    tmp_file.write_bytes(os.urandom(size))
+
+    # the expected size may be wrong, the file should still be correct
+    expected_size = None if expected_size_offset is None else size + expected_size_offset
+    enc_file = tmp_path / "encrypted.dat"
+    with tmp_file.open('rb') as fin:
+        orig_hash, enc_hash = encrypt_file(fin, enc_file, expected_size=expected_size)
+
+    assert os.path.getsize(enc_file) == encrypted_file_size(size, settings.FILE_CHUNK_SIZE_BYTES)
+    with open(enc_file, 'rb') as fin:
+        assert hashlib.file_digest(fin, 'sha256').hexdigest() == enc_hash
+
+    out_file = str(tmp_path / "output.dat")
+    assert decrypt_file(enc_file, out_file) == orig_hash
+    assert orig_hash == hashlib.sha256(tmp_file.read_bytes()).hexdigest()
+
+
+@pytest.mark.parametrize("value", ["", "ABC1234", "x" * 16, "Ünïcödé name", "a" * 1000])
+def test_column_encryption(value):
+    encrypted = encrypt_column_value(value)
+
+    assert encrypted[:1] == b"\x01"
+    assert value.encode("utf-8") not in encrypted or not value
+    assert decrypt_column_value(encrypted) == value
+    # randomised, so the same value encrypts differently each time
+    assert encrypt_column_value(value) != encrypted
+
+
+@pytest.mark.parametrize("value", ["", "ABC1234", "x" * 16, "Ünïcödé name"])
+def test_column_encryption_legacy_format(value):
+    # values written by sqlalchemy_utils' StringEncryptedType before the switch to AES-GCM
+    legacy_type = StringEncryptedType(sqlalchemy.VARCHAR, settings.DATABASE_SECRET_KEY, AesEngine, 'pkcs5')
+    legacy_encrypted = legacy_type.process_bind_param(value, None)
+
+    assert decrypt_column_value(legacy_encrypted) == value
+    assert decrypt_column_value(legacy_encrypted.encode("ascii")) == value
+    assert encrypt_column_value_legacy(value) == legacy_encrypted
+
+
+def test_column_encryption_tampered():
+    encrypted = bytearray(encrypt_column_value("ABC1234"))
+    encrypted[-1] ^= 1
+
+    with pytest.raises(InvalidTag):
+        decrypt_column_value(bytes(encrypted))
+
+
+def test_column_encryption_wrong_key(monkeypatch):
+    encrypted = encrypt_column_value("ABC1234")
+    monkeypatch.setattr(settings, "DATABASE_SECRET_KEY", "another key")
+
+    with pytest.raises(InvalidTag):
+        decrypt_column_value(encrypted)
+
+
+def test_decrypt_cache_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_DECRYPT_CACHE_SIZE", 0)
+    cache = DecryptCache()
+    encrypted = encrypt_column_value("ABC1234")
+
+    assert cache.decrypt(encrypted) == "ABC1234"
+    assert cache.decrypt(encrypted) == "ABC1234"
+    assert cache.info() == (0, 0, 0, 0)
+
+
+def test_decrypt_cache_lru(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_DECRYPT_CACHE_SIZE", 2)
+    cache = DecryptCache()
+    encrypted = [encrypt_column_value(f"value{i}") for i in range(3)]
+
+    assert cache.decrypt(encrypted[0]) == "value0"
+    assert cache.decrypt(encrypted[1]) == "value1"
+    assert cache.decrypt(encrypted[0]) == "value0"
+    assert cache.info() == (1, 2, 2, 2)
+
+    # evicts the least recently used value (value1)
+    assert cache.decrypt(encrypted[2]) == "value2"
+    assert cache.decrypt(encrypted[0]) == "value0"
+    assert cache.info() == (2, 3, 2, 2)
+    assert cache.decrypt(encrypted[1]) == "value1"
+    assert cache.info() == (2, 4, 2, 2)
+
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 2)
+
+
+def test_decrypt_cache_ttl(monkeypatch):
+    clock = itertools.count(start=100, step=10)
+    monkeypatch.setattr("tinymotion_backend.core.encryption.time.monotonic", lambda: next(clock))
+    monkeypatch.setattr(settings, "DATABASE_DECRYPT_CACHE_SIZE", 10)
+    monkeypatch.setattr(settings, "DATABASE_DECRYPT_CACHE_TTL_SECONDS", 15)
+    cache = DecryptCache()
+    encrypted = encrypt_column_value("ABC1234")
+
+    cache.decrypt(encrypted)  # t=100, cached until 115
+    cache.decrypt(encrypted)  # t=110, hit
+    cache.decrypt(encrypted)  # t=120, expired
+    assert cache.info()[:2] == (1, 2)
+
+
+def test_decrypt_cache_key_change(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_DECRYPT_CACHE_SIZE", 10)
+    cache = DecryptCache()
+    encrypted = encrypt_column_value("ABC1234")
+    assert cache.decrypt(encrypted) == "ABC1234"
+    assert cache.info().size == 1
+
+    # the cached value must not be returned once the key has changed
+    monkeypatch.setattr(settings, "DATABASE_SECRET_KEY", "another key")
+    with pytest.raises(InvalidTag):
+        cache.decrypt(encrypted)
+    assert cache.info().size == 0
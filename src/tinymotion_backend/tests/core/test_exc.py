@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+import sqlalchemy
+
+from tinymotion_backend.core.exc import is_unique_violation
+
+
+class FakePostgresError(Exception):
+    def __init__(self, message: str, sqlstate: str):
+        super().__init__(message)
+        self.sqlstate = sqlstate
+
+
+@pytest.mark.parametrize("orig,expected", [
+    (sqlite3.IntegrityError("UNIQUE constraint failed: user.access_key"), True),
+    (sqlite3.IntegrityError("FOREIGN KEY constraint failed"), False),
+    (FakePostgresError('duplicate key value violates unique constraint "ix_user_access_key"', "23505"), True),
+    (FakePostgresError('insert or update on table "infant" violates foreign key constraint', "23503"), False),
+])
+def test_is_unique_violation(orig, expected):
+    exc = sqlalchemy.exc.IntegrityError("INSERT ...", {}, orig)
+
+    assert is_unique_violation(exc) is expected
@@ -0,0 +1,70 @@
+import time
+import uuid
+
+import pytest
+from sqlmodel import Session
+
+from tinymotion_backend.core import ids
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.models import InfantCreate
+from tinymotion_backend.services.infant_service import InfantService
+
+
+def test_uuid7():
+    before = time.time()
+    id = ids.uuid7()
+    after = time.time()
+
+    assert id.version == 7
+    assert id.variant == uuid.RFC_4122
+    assert before - 0.001 <= ids.uuid7_timestamp(id) <= after
+
+    with pytest.raises(ValueError, match="Not a version 7 UUID"):
+        ids.uuid7_timestamp(uuid.uuid4())
+
+
+def test_uuid7_increasing():
+    generated = [ids.uuid7() for _ in range(10000)]
+
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+@pytest.mark.parametrize("clock", [
+    # the same millisecond, more ids than the counter can take
+    lambda call: 1_700_000_000_000_000_000,
+    # going backwards
+    lambda call: 1_700_000_000_000_000_000 - call * 1_000_000,
+])
+def test_uuid7_increasing_same_or_earlier_time(monkeypatch, clock):
+    calls = iter(range(10000))
+    monkeypatch.setattr(ids.time, "time_ns", lambda: clock(next(calls)))
+    monkeypatch.setattr(ids, "_last_timestamp_ms", 0)
+
+    generated = [ids.uuid7() for _ in range(10000)]
+
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert ids.uuid7_timestamp(generated[0]) == 1_700_000_000
+    # the timestamp is advanced when the counter runs out
+    assert ids.uuid7_timestamp(generated[-1]) > 1_700_000_000
+
+
+def test_new_id_generator(monkeypatch, session: Session, mocked_user_id: uuid.UUID):
+    infant_service = InfantService(session, mocked_user_id)
+
+    # existing random ids and new time-ordered ones can be mixed in the same table
+    monkeypatch.setattr(settings, "DATABASE_ID_GENERATOR", "uuid4")
+    assert ids.new_id().version == 4
+    infant = infant_service.create(
+        InfantCreate(full_name="Infant 1", nhi_number="ABC1", birth_date="2024-01-01", due_date="2024-01-02")
+    )
+    assert infant.infant_id.version == 4
+
+    monkeypatch.setattr(settings, "DATABASE_ID_GENERATOR", "uuid7")
+    infant = infant_service.create(
+        InfantCreate(full_name="Infant 2", nhi_number="ABC2", birth_date="2024-01-01", due_date="2024-01-02")
+    )
+    assert infant.infant_id.version == 7
+
+    assert sorted(infant.infant_id.version for infant in infant_service.list()) == [4, 7]
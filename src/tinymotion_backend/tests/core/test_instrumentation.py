@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+from sqlmodel import Session, select
+
+from tinymotion_backend.models import User
+from tinymotion_backend.core.instrumentation import QueryStats, track_queries, assert_max_queries
+
+
+def test_track_queries(session: Session):
+    # statements outside of a tracked block aren't counted anywhere
+    session.exec(select(User)).all()
+
+    with track_queries() as stats:
+        for _ in range(3):
+            session.exec(select(User.user_id)).all()
+        session.exec(select(User)).all()
+
+    assert stats.count == 4
+    assert stats.duration > 0
+    assert len(stats.statements) == 2
+    assert list(stats.repeated(3).values()) == [3]
+    assert str(stats).startswith("4 queries in ")
+
+
+def test_track_queries_nested(session: Session):
+    with track_queries() as outer:
+        session.exec(select(User)).all()
+        with track_queries() as inner:
+            session.exec(select(User)).all()
+        session.exec(select(User)).all()
+
+    assert outer.count == 2
+    assert inner.count == 1
+
+
+def test_track_queries_thread(session: Session):
+    # statements on other threads are only counted if the thread was started with a copy of the context
+    engine = session.get_bind()
+
+    def query():
+        with Session(engine) as thread_session:
+            thread_session.exec(select(User)).all()
+
+    with track_queries() as stats:
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+
+    assert stats.count == 0
+
+
+def test_assert_max_queries(session: Session):
+    with assert_max_queries(2) as stats:
+        session.exec(select(User)).all()
+        session.exec(select(User)).all()
+    assert isinstance(stats, QueryStats)
+
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, ran 2"):
+        with assert_max_queries(1):
+            session.exec(select(User)).all()
+            session.exec(select(User)).all()
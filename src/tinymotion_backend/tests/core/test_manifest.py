@@ -0,0 +1,76 @@
+import io
+import hashlib
+import datetime
+
+import pytest
+
+from tinymotion_backend.core import manifest
+from tinymotion_backend.core.exc import ChecksumMismatchError
+
+
+def entry(video_name: str, size: int = 10, sha256sum_enc: str = "a" * 64) -> manifest.ManifestEntry:
+    return manifest.ManifestEntry(video_name, size, sha256sum_enc, datetime.datetime(2024, 1, 1))
+
+
+def test_manifest_read_write(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    assert manifest.read_manifest(path) == {}
+
+    manifest.write_manifest(path, [entry("video0.enc"), entry("video1.enc")])
+    manifest.append_manifest(path, entry("video1.enc", size=20))
+    manifest.append_manifest(path, entry("video2.enc"))
+    # an append that was interrupted
+    with open(path, "a") as fh:
+        fh.write(entry("video3.enc").to_json()[:20])
+
+    assert manifest.read_manifest(path) == {
+        "video0.enc": entry("video0.enc"),
+        "video1.enc": entry("video1.enc", size=20),
+        "video2.enc": entry("video2.enc"),
+    }
+
+
+def test_diff_manifests():
+    source = {name: entry(name) for name in ["video0.enc", "video1.enc", "video2.enc"]}
+    target = {
+        "video0.enc": entry("video0.enc"),
+        "video1.enc": entry("video1.enc", sha256sum_enc="b" * 64),
+        "deleted.enc": entry("deleted.enc"),
+    }
+
+    diff = manifest.diff_manifests(source, target)
+
+    assert diff.to_copy == [source["video1.enc"], source["video2.enc"]]
+    assert diff.to_delete == ["deleted.enc"]
+    assert diff.unchanged == 1
+
+
+def test_copy_video(tmp_path):
+    content = b"x" * 2500
+    target_path = str(tmp_path / "video.enc")
+    copied = entry("video.enc", size=len(content), sha256sum_enc=hashlib.sha256(content).hexdigest())
+
+    manifest.copy_video(io.BytesIO(content), target_path, copied)
+    assert (tmp_path / "video.enc").read_bytes() == content
+
+    with pytest.raises(ChecksumMismatchError):
+        manifest.copy_video(io.BytesIO(b"changed"), target_path, copied)
+    # the previous copy is left in place
+    assert (tmp_path / "video.enc").read_bytes() == content
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["video.enc"]
+
+
+def test_bandwidth_limiter(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(manifest.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(manifest.time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+
+    limiter = manifest.BandwidthLimiter(1000)
+    for _ in range(4):
+        limiter.consume(500)
+    assert clock[0] == pytest.approx(102.0)
+
+    # time spent elsewhere isn't made up for afterwards
+    clock[0] += 10
+    limiter.consume(500)
+    assert clock[0] == pytest.approx(112.5)
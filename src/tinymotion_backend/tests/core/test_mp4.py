@@ -0,0 +1,117 @@
+import os
+import struct
+
+import pytest
+
+from tinymotion_backend.core.mp4 import Mp4MetadataParser
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type: bytes, version: int, payload: bytes) -> bytes:
+    return box(box_type, struct.pack(">B3s", version, b"\x00\x00\x00") + payload)
+
+
+def make_moov(duration: int, timescale: int, width: int, height: int, codec: bytes,
+              sample_count: int, sample_delta: int, media_timescale: int, version: int = 0) -> bytes:
+    if version == 1:
+        mvhd = full_box(b"mvhd", 1, struct.pack(">QQIQ", 0, 0, timescale, duration) + bytes(80))
+        tkhd = full_box(b"tkhd", 1, struct.pack(">QQIIQ", 0, 0, 1, 0, duration) + bytes(52)
+                        + struct.pack(">II", width << 16, height << 16))
+        mdhd = full_box(b"mdhd", 1, struct.pack(">QQIQ", 0, 0, media_timescale, sample_count * sample_delta)
+                        + bytes(4))
+    else:
+        mvhd = full_box(b"mvhd", 0, struct.pack(">IIII", 0, 0, timescale, duration) + bytes(80))
+        tkhd = full_box(b"tkhd", 0, struct.pack(">IIIII", 0, 0, 1, 0, duration) + bytes(52)
+                        + struct.pack(">II", width << 16, height << 16))
+        mdhd = full_box(b"mdhd", 0, struct.pack(">IIII", 0, 0, media_timescale, sample_count * sample_delta)
+                        + bytes(4))
+    hdlr = full_box(b"hdlr", 0, bytes(4) + b"vide" + bytes(12) + b"VideoHandler\x00")
+    stsd = full_box(b"stsd", 0, struct.pack(">I", 1) + box(codec, bytes(78)))
+    stts = full_box(b"stts", 0, struct.pack(">III", 1, sample_count, sample_delta))
+    stbl = box(b"stbl", stsd + stts)
+    minf = box(b"minf", stbl)
+    mdia = box(b"mdia", mdhd + hdlr + minf)
+    # an audio track first, which should be ignored
+    audio_hdlr = full_box(b"hdlr", 0, bytes(4) + b"soun" + bytes(12) + b"SoundHandler\x00")
+    audio_trak = box(b"trak", box(b"mdia", audio_hdlr))
+    trak = box(b"trak", tkhd + mdia)
+
+    return box(b"moov", mvhd + audio_trak + trak)
+
+
+@pytest.mark.parametrize("moov_first", [True, False])
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096, 10 * 1024 * 1024])
+@pytest.mark.parametrize("version", [0, 1])
+def test_mp4_metadata_parser(moov_first, chunk_size, version):
+    ftyp = box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41")
+    mdat = box(b"mdat", os.urandom(50000))
+    moov = make_moov(
+        duration=90 * 600,
+        timescale=600,
+        width=1920,
+        height=1080,
+        codec=b"avc1",
+        sample_count=2700,
+        sample_delta=1000,
+        media_timescale=30000,
+        version=version,
+    )
+    data = ftyp + moov + mdat if moov_first else ftyp + mdat + moov
+
+    parser = Mp4MetadataParser()
+    for i in range(0, len(data), chunk_size):
+        parser.feed(data[i:i + chunk_size])
+
+    assert parser.done
+    assert parser.metadata is not None
+    assert parser.metadata.duration_seconds == pytest.approx(90.0)
+    assert parser.metadata.width == 1920
+    assert parser.metadata.height == 1080
+    assert parser.metadata.codec == "avc1"
+    assert parser.metadata.frame_rate == pytest.approx(30.0)
+
+
+def test_mp4_metadata_parser_largesize_mdat():
+    ftyp = box(b"ftyp", b"qt  " + bytes(4))
+    payload = os.urandom(1000)
+    mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + len(payload)) + payload
+    moov = make_moov(
+        duration=1200,
+        timescale=600,
+        width=640,
+        height=480,
+        codec=b"hvc1",
+        sample_count=50,
+        sample_delta=1,
+        media_timescale=25,
+    )
+    data = ftyp + mdat + moov
+
+    parser = Mp4MetadataParser()
+    for i in range(0, len(data), 3):
+        parser.feed(data[i:i + 3])
+
+    assert parser.metadata.duration_seconds == pytest.approx(2.0)
+    assert parser.metadata.width == 640
+    assert parser.metadata.height == 480
+    assert parser.metadata.codec == "hvc1"
+    assert parser.metadata.frame_rate == pytest.approx(25.0)
+
+
+def test_mp4_metadata_parser_not_mp4():
+    parser = Mp4MetadataParser()
+    parser.feed(os.urandom(100000))
+
+    assert parser.done
+    assert parser.metadata is None
+
+
+def test_mp4_metadata_parser_no_moov():
+    parser = Mp4MetadataParser()
+    parser.feed(box(b"ftyp", b"isom" + bytes(4)) + box(b"mdat", os.urandom(1000)))
+
+    assert not parser.done
+    assert parser.metadata is None
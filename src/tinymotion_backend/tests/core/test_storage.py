@@ -0,0 +1,125 @@
+import os
+import json
+import errno
+import hashlib
+
+import pytest
+
+from tinymotion_backend.core import storage
+from tinymotion_backend.core.config import settings
+
+
+def test_mirror_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+    os.makedirs(settings.VIDEO_MIRROR_PATH)
+
+    chunks = [os.urandom(1000) for _ in range(10)]
+    mirror = storage.start_mirror("video.enc")
+    for chunk in chunks:
+        mirror.write(chunk)
+    mirror.close()
+
+    assert mirror.wait()
+    with open(tmp_path / "mirror" / "video.enc", "rb") as fh:
+        assert fh.read() == b"".join(chunks)
+    assert storage.read_mirror_repair_log() == []
+
+
+def test_mirror_writer_abort(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+    os.makedirs(settings.VIDEO_MIRROR_PATH)
+
+    mirror = storage.start_mirror("video.enc")
+    mirror.write(os.urandom(1000))
+    mirror.abort()
+
+    assert mirror.wait()
+    assert not os.path.exists(tmp_path / "mirror" / "video.enc")
+    assert storage.read_mirror_repair_log() == []
+
+
+def test_mirror_writer_failure_logs_repair(tmp_path, monkeypatch):
+    # mirror directory does not exist so the write fails
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", str(tmp_path / "mirror"))
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_REPAIR_LOG", str(tmp_path / "repair.jsonl"))
+
+    mirror = storage.start_mirror("video.enc")
+    # more chunks than the queue holds, the writer must not block
+    for _ in range(20):
+        mirror.write(os.urandom(1000))
+    mirror.close()
+
+    assert not mirror.wait()
+    tasks = storage.read_mirror_repair_log()
+    assert len(tasks) == 1
+    assert tasks[0]["video_name"] == "video.enc"
+    with open(tmp_path / "repair.jsonl") as fh:
+        assert json.loads(fh.readline())["video_name"] == "video.enc"
+
+
+def test_no_mirror_configured(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_MIRROR_PATH", None)
+
+    assert storage.start_mirror("video.enc") is None
+    assert storage.mirror_file_path("video.enc") is None
+    storage.finish_mirror(None)
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fallocate"), reason="posix_fallocate is not available")
+def test_preallocate_not_supported(tmp_path, monkeypatch):
+    error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    def posix_fallocate(fd, offset, size):
+        raise error
+
+    monkeypatch.setattr(os, "posix_fallocate", posix_fallocate)
+    with open(tmp_path / "video.enc", "wb") as fh:
+        assert not storage.preallocate(fh.fileno(), 1000)
+
+        # running out of space still fails up front
+        error = OSError(errno.ENOSPC, "No space left on device")
+        with pytest.raises(OSError):
+            storage.preallocate(fh.fileno(), 1000)
+
+
+def test_pack_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    monkeypatch.setattr(settings, "VIDEO_PACK_MAX_SIZE_BYTES", 10000)
+
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"video{i}.enc"
+        source.write_bytes(os.urandom(3000))
+        sources.append(source)
+
+    with storage.PackWriter() as pack:
+        locations = [
+            pack.append(str(source), source.name, hashlib.sha256(source.read_bytes()).hexdigest())
+            for source in sources
+        ]
+
+        # a copy that doesn't match the checksum is removed from the pack again
+        with pytest.raises(ValueError):
+            pack.append(str(sources[0]), "bad.enc", "a" * 64)
+
+    assert [offset for _, offset in locations] == [0, 3000, 6000]
+    pack_path = tmp_path / "cold" / locations[0][0]
+    assert os.path.getsize(pack_path) == 9000
+    with open(str(pack_path) + ".idx") as fh:
+        index = [json.loads(line) for line in fh]
+    assert [entry["video_name"] for entry in index] == ["video0.enc", "video1.enc", "video2.enc"]
+
+    # ranged reads return each video's content
+    for source, (pack_name, offset) in zip(sources, locations):
+        with storage.PackRangeReader(str(tmp_path / "cold" / pack_name), offset, 3000) as fh:
+            assert fh.read(1000) + fh.read() == source.read_bytes()
+            assert fh.read() == b""
+
+    # a new writer continues the same pack until it is full
+    with storage.PackWriter() as pack:
+        sha256sum = hashlib.sha256(sources[0].read_bytes()).hexdigest()
+        pack_name, offset = pack.append(str(sources[0]), "again.enc", sha256sum)
+    assert pack_name != locations[0][0]
+    assert offset == 0
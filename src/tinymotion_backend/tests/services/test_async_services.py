@@ -0,0 +1,192 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tinymotion_backend import database, models
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.exc import (
+    InvalidAccessKeyError, InvalidInputError, NotFoundError, UniqueConstraintError,
+)
+from tinymotion_backend.services.consent_service import AsyncConsentService
+from tinymotion_backend.services.infant_service import AsyncInfantService
+from tinymotion_backend.services.user_service import AsyncUserService
+from tinymotion_backend.tests import mock_data
+
+
+def run_with_session(async_engine: AsyncEngine, fn):
+    async def _run():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            return await fn(async_session)
+
+    return asyncio.run(_run())
+
+
+def new_infant(nhi_number: str = "ABC1234") -> models.InfantCreate:
+    return models.InfantCreate(
+        full_name="An Infant",
+        birth_date=datetime.date(2024, 1, 1),
+        due_date=datetime.date(2024, 1, 2),
+        nhi_number=nhi_number,
+    )
+
+
+def test_async_user_service(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID):
+    async def _test(async_session):
+        user_service = AsyncUserService(async_session)
+        user = await user_service.authenticate(mock_data.MOCK_USERS[0]["access_key"])
+        assert user.user_id == mocked_user_id
+        assert not user_service.is_disabled(user)
+
+        with pytest.raises(InvalidAccessKeyError):
+            await user_service.authenticate("notakey")
+
+        updated = await user_service.update(user.user_id, models.UserUpdate(disabled=True))
+        assert updated.disabled
+
+    run_with_session(async_engine, _test)
+
+    assert session.get(models.User, mocked_user_id, populate_existing=True).disabled
+
+
+def test_async_user_service_read_session(session: Session, async_engine: AsyncEngine, database_uri: str,
+                                         mocked_user_id: uuid.UUID):
+    async_read_engine = database.create_async_db_engine(database.async_database_uri(database_uri), read_only=True)
+
+    async def _test(async_session):
+        async with AsyncSession(async_read_engine, expire_on_commit=False) as read_session:
+            user_service = AsyncUserService(async_session, read_session=read_session)
+            user = await user_service.authenticate(mock_data.MOCK_USERS[0]["access_key"])
+            assert user in read_session and user not in async_session
+            assert not user.disabled
+            user_id = user.user_id
+
+            # the user read is expired by the write, and loaded again
+            await user_service.update(user_id, models.UserUpdate(disabled=True))
+            assert (await user_service.get(user_id)) is user
+            assert user.disabled
+
+        await async_read_engine.dispose()
+
+    run_with_session(async_engine, _test)
+
+
+def test_async_infant_service(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID):
+    async def _test(async_session):
+        infant_service = AsyncInfantService(async_session, mocked_user_id)
+        infant = await infant_service.create(new_infant())
+        infant_id = infant.infant_id
+        assert infant_id is not None
+        assert infant.created_by == mocked_user_id
+        assert infant.created_at is not None
+
+        assert (await infant_service.get_by_nhi_number("ABC1234")).infant_id == infant_id
+        with pytest.raises(NotFoundError):
+            await infant_service.get_by_nhi_number("XYZ9876")
+        with pytest.raises(UniqueConstraintError):
+            await infant_service.create(new_infant())
+
+        return infant_id
+
+    infant_id = run_with_session(async_engine, _test)
+
+    assert session.get(models.Infant, infant_id).nhi_number == "ABC1234"
+
+
+def test_async_infant_service_page_and_iter(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID):
+    async def _test(async_session):
+        infant_service = AsyncInfantService(async_session, mocked_user_id)
+        for i in range(5):
+            await infant_service.create(new_infant(f"ABC{i}"))
+
+        page = await infant_service.page(limit=3)
+        last_page = await infant_service.page(after=page.next_cursor, limit=3)
+        assert last_page.next_cursor is None
+        paged = [infant.infant_id for infant in page.items + last_page.items]
+
+        assert [infant.infant_id async for infant in infant_service.iter(batch_size=2)] == paged
+        assert await infant_service.count() == 5
+        assert await infant_service.count([models.Infant.infant_id == paged[0]]) == 1
+
+    run_with_session(async_engine, _test)
+
+
+def test_async_infant_service_pii_deferred(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID):
+    async def _test(async_session):
+        infant_service = AsyncInfantService(async_session, mocked_user_id)
+        infant_id = (await infant_service.create(new_infant())).infant_id
+        async_session.expunge_all()
+
+        infant = await infant_service.get(infant_id)
+        assert "full_name" in sqlalchemy.inspect(infant).unloaded
+
+        infant = await infant_service.get_by_nhi_number("ABC1234", options=[models.LOAD_PII])
+        assert infant.full_name == "An Infant"
+
+        # written objects are returned with their encrypted columns loaded
+        async_session.expunge_all()
+        updated = await infant_service.update(infant_id, models.InfantUpdate(full_name="Renamed Infant"))
+        assert updated.full_name == "Renamed Infant"
+        assert updated.nhi_number == "ABC1234"
+
+    run_with_session(async_engine, _test)
+
+
+def test_async_infant_service_delete(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID,
+                                     tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path))
+    infant = models.Infant(**new_infant().model_dump(), created_by=mocked_user_id)
+    session.add(infant)
+    session.commit()
+    session.add(models.Consent(collected_physically=True, infant_id=infant.infant_id, created_by=mocked_user_id))
+    session.add(models.Video(
+        video_name="video.mp4.enc",
+        sha256sum="a" * 64,
+        sha256sum_enc="b" * 64,
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    ))
+    session.commit()
+    infant_id = infant.infant_id
+    (tmp_path / "video.mp4.enc").write_bytes(b"video")
+
+    async def _test(async_session):
+        await AsyncInfantService(async_session, mocked_user_id).delete(infant_id)
+
+        with pytest.raises(NotFoundError):
+            await AsyncInfantService(async_session, mocked_user_id).delete(infant_id)
+
+    run_with_session(async_engine, _test)
+
+    session.expunge_all()
+    assert session.get(models.Infant, infant_id) is None
+    assert not len(session.exec(select(models.Video)).all())
+    assert not len(session.exec(select(models.Consent)).all())
+    assert not os.path.exists(tmp_path / "video.mp4.enc")
+
+
+def test_async_consent_service(session: Session, async_engine: AsyncEngine, mocked_user_id: uuid.UUID):
+    async def _test(async_session):
+        await AsyncInfantService(async_session, mocked_user_id).create(new_infant())
+
+        consent_service = AsyncConsentService(async_session, mocked_user_id)
+        with pytest.raises(InvalidInputError):
+            await consent_service.create_using_nhi_number(
+                models.ConsentCreateViaNHI(nhi_number="ABC1234", consent_giver_name="Consent Giver")
+            )
+        consent = await consent_service.create_using_nhi_number(
+            models.ConsentCreateViaNHI(nhi_number="ABC1234", collected_physically=True)
+        )
+        assert consent.consent_id is not None
+
+        return consent.consent_id
+
+    consent_id = run_with_session(async_engine, _test)
+
+    assert session.get(models.Consent, consent_id).infant.nhi_number == "ABC1234"
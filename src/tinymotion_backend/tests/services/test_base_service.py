@@ -0,0 +1,271 @@
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.user_service import UserService
+from tinymotion_backend.services.base import BulkResult, LookupStatement, _bulk_insert, _write_in_batches
+from tinymotion_backend.models import Infant, InfantCreate, InfantUpdate, User, UserCreate, UserUpdate, LOAD_PII
+from tinymotion_backend.core.blind_index import blind_index
+from tinymotion_backend.core.instrumentation import track_queries
+from tinymotion_backend.core.exc import InvalidAccessKeyError, InvalidInputError, NotFoundError, UniqueConstraintError
+from tinymotion_backend.tests import mock_data
+
+
+def add_infants(session: Session, created_by: uuid.UUID, count: int) -> list[uuid.UUID]:
+    # all created at the same time, so the pages are ordered by id within the same created_at
+    created_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    infants = []
+    for i in range(count):
+        infant = Infant(
+            full_name=f"Infant {i}",
+            nhi_number=f"ABC{i:04d}",
+            birth_date=datetime.date(2024, 1, 1),
+            due_date=datetime.date(2024, 1, 2),
+            created_by=created_by,
+            created_at=created_at + datetime.timedelta(seconds=i // 3),
+        )
+        session.add(infant)
+        infants.append(infant)
+    session.commit()
+
+    return [infant.infant_id for infant in infants]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 10, 11])
+@pytest.mark.parametrize("descending", [False, True])
+def test_base_service_page(session: Session, mocked_user_id: uuid.UUID, limit: int, descending: bool):
+    add_infants(session, mocked_user_id, 10)
+    infant_service = InfantService(session, mocked_user_id)
+    expected = sorted(infant_service.list(), key=lambda infant: (infant.created_at, infant.infant_id.hex),
+                      reverse=descending)
+
+    seen = []
+    after = None
+    while True:
+        page = infant_service.page(after=after, limit=limit, descending=descending)
+        assert len(page.items) <= limit
+        seen.extend(page.items)
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+
+    assert [infant.infant_id for infant in seen] == [infant.infant_id for infant in expected]
+
+
+def test_base_service_page_filters(session: Session, mocked_user_id: uuid.UUID):
+    add_infants(session, mocked_user_id, 10)
+    infant_service = InfantService(session, mocked_user_id)
+    filters = [Infant.created_at >= datetime.datetime(2024, 1, 1, 0, 0, 2, tzinfo=datetime.timezone.utc)]
+
+    page = infant_service.page(limit=3, filters=filters)
+    assert len(page.items) == 3
+    page = infant_service.page(after=page.next_cursor, limit=3, filters=filters)
+    assert len(page.items) == 1
+    assert page.next_cursor is None
+    assert infant_service.count(filters) == 4
+    assert infant_service.count() == 10
+
+
+def test_base_service_page_without_created_at(session: Session):
+    # users are ordered by id only
+    user_service = UserService(session)
+    for i in range(4):
+        session.add(User(email=f"user{i}@example.com", access_key=f"key{i}"))
+    session.commit()
+
+    page = user_service.page(limit=3)
+    assert page.next_cursor is not None
+    last_page = user_service.page(after=page.next_cursor, limit=3)
+    assert last_page.next_cursor is None
+    user_ids = [user.user_id for user in page.items + last_page.items]
+    assert len(user_ids) == 5
+    assert user_ids == sorted(user_ids, key=lambda user_id: user_id.hex)
+
+
+@pytest.mark.parametrize("cursor", ["notacursor", "WyJhIl0=", "WzFd"])
+def test_base_service_page_invalid_cursor(session: Session, mocked_user_id: uuid.UUID, cursor: str):
+    with pytest.raises(InvalidInputError):
+        InfantService(session, mocked_user_id).page(after=cursor)
+
+
+def test_base_service_iter(session: Session, mocked_user_id: uuid.UUID):
+    infant_ids = add_infants(session, mocked_user_id, 10)
+    infant_service = InfantService(session, mocked_user_id)
+
+    iterated = [infant.infant_id for infant in infant_service.iter(batch_size=3)]
+    assert sorted(iterated) == sorted(infant_ids)
+    assert iterated == [infant.infant_id for infant in infant_service.page(limit=10).items]
+
+    filtered = infant_service.iter(filters=[Infant.infant_id == infant_ids[0]])
+    assert [infant.infant_id for infant in filtered] == [infant_ids[0]]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 500])
+def test_base_service_create_many(session: Session, batch_size: int):
+    user_service = UserService(session)
+    users_in = [UserCreate(email=f"user{i}@example.com", access_key=f"key{i % 3}") for i in range(5)]
+    users_in.append(UserCreate(email="mock@example.com", access_key=mock_data.MOCK_USERS[0]["access_key"]))
+
+    result = user_service.create_many(users_in, batch_size=batch_size)
+
+    # the repeated access keys fail, the other rows are created
+    assert set(result.errors) == {3, 4, 5}
+    assert all(isinstance(error, UniqueConstraintError) for error in result.errors.values())
+    assert [user is None for user in result.items] == [False, False, False, True, True, True]
+    assert result.items[1].email == "user1@example.com"
+    assert user_service.get_by_access_key("key2").user_id == result.items[2].user_id
+    assert user_service.count() == 4
+
+
+def test_base_service_update_many(session: Session):
+    user_service = UserService(session)
+    users = user_service.create_many(
+        [UserCreate(email=f"user{i}@example.com", access_key=f"key{i}") for i in range(3)]
+    ).items
+    missing_id = uuid.uuid4()
+
+    result = user_service.update_many([
+        (users[0].user_id, UserUpdate(disabled=True)),
+        (missing_id, UserUpdate(disabled=True)),
+        (users[1].user_id, UserUpdate(access_key="key2")),
+        (users[2].user_id, UserUpdate(access_key="newkey")),
+    ], batch_size=3)
+
+    assert isinstance(result.errors[1], NotFoundError)
+    assert isinstance(result.errors[2], UniqueConstraintError)
+    assert set(result.errors) == {1, 2}
+    session.expire_all()
+    assert user_service.get(users[0].user_id).disabled
+    assert user_service.get(users[1].user_id).access_key == "key1"
+    assert user_service.get_by_access_key("newkey").user_id == users[2].user_id
+
+
+def test_base_service_write_in_batches_integrity_error(session: Session):
+    user_service = UserService(session)
+    users = [User(email=f"user{i}@example.com", access_key=f"key{i}") for i in range(5)]
+    # the second batch has a repeated access key, which makes its rows be written one at a time, then a missing email
+    users[3].access_key = "key0"
+    users.append(User(email=None, access_key="key5"))
+    result = BulkResult(items=[None] * len(users), errors={})
+
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        _write_in_batches(session, list(enumerate(users)), _bulk_insert, 3, result)
+
+    # the first batch is committed, none of the second batch is
+    assert [user is not None for user in result.items] == [True, True, True, False, False, False]
+    assert user_service.get_by_access_key("key2").user_id == result.items[2].user_id
+    with pytest.raises(InvalidAccessKeyError):
+        user_service.get_by_access_key("key4")
+    assert user_service.count() == len(mock_data.MOCK_USERS) + 3
+
+
+def test_infant_service_create_many(session: Session, mocked_user_id: uuid.UUID):
+    add_infants(session, mocked_user_id, 1)
+    infant_service = InfantService(session, mocked_user_id)
+    infants_in = [
+        InfantCreate(full_name="New Infant", birth_date="2024-01-01", due_date="2024-01-02", nhi_number=nhi_number)
+        for nhi_number in ["NEW0001", "ABC0000", "NEW0002", "NEW0001"]
+    ]
+
+    result = infant_service.create_many(infants_in)
+
+    # the NHI numbers already stored or repeated are found before inserting
+    assert set(result.errors) == {1, 3}
+    assert infant_service.get_ids_by_nhi_numbers(["NEW0001", "NEW0002", "NOTANHI"]) == {
+        "NEW0001": result.items[0].infant_id,
+        "NEW0002": result.items[2].infant_id,
+    }
+    assert infant_service.get_by_nhi_number("NEW0002").full_name == "New Infant"
+
+
+def test_lookup_statement(session: Session, mocked_user_id: uuid.UUID):
+    infant_ids = add_infants(session, mocked_user_id, 3)
+    session.expunge_all()
+    by_nhi_number = LookupStatement(Infant.nhi_number_bidx)
+
+    # the same statement is used for each value, and for each set of options
+    assert by_nhi_number() is by_nhi_number([])
+    assert by_nhi_number([LOAD_PII]) is by_nhi_number([LOAD_PII])
+    assert by_nhi_number() is not by_nhi_number([LOAD_PII])
+
+    with track_queries() as stats:
+        for i in range(2):
+            infant = session.exec(by_nhi_number(), params={"nhi_number_bidx": blind_index(f"ABC{i:04d}")}).one()
+            assert infant.infant_id == infant_ids[i]
+            assert "full_name" not in infant.__dict__
+        infant = session.exec(by_nhi_number([LOAD_PII]), params={"nhi_number_bidx": blind_index("ABC0002")}).one()
+        assert infant.infant_id == infant_ids[2]
+        assert infant.__dict__["full_name"] == "Infant 2"
+
+    # the second lookup is compiled from the cache
+    assert stats.count == 3
+    assert stats.cache_hits >= 1
+    assert str(stats).endswith(f"({stats.cache_hits} cached, {stats.cache_misses} compiled)")
+
+
+def test_lookup_statement_bounded():
+    by_nhi_number = LookupStatement(Infant.nhi_number_bidx, maxsize=2)
+    statement = by_nhi_number([LOAD_PII])
+
+    # options built on each call are new objects, they don't stay cached
+    for _ in range(10):
+        by_nhi_number([sqlalchemy.orm.undefer(Infant.full_name)])
+    assert by_nhi_number._statement.cache_info().currsize == 2
+    assert by_nhi_number([LOAD_PII]) is not statement
+
+
+def test_lookup_statement_services_cached(session: Session, mocked_user_id: uuid.UUID):
+    add_infants(session, mocked_user_id, 2)
+    infant_service = InfantService(session, mocked_user_id)
+    user_service = UserService(session)
+
+    # every statement of the lookups (including the loading of deferred columns, of the infant by primary key and
+    # of the pages after a cursor) is compiled at most once, and then taken from the cache
+    with track_queries() as stats:
+        for i in range(2):
+            infant = infant_service.get_by_nhi_number(f"ABC{i:04d}")
+            assert infant.full_name == f"Infant {i}"
+            session.expunge_all()
+            assert infant_service.get(infant.infant_id).nhi_number == f"ABC{i:04d}"
+            user_service.get_by_access_key(mock_data.MOCK_USERS[0]["access_key"])
+            session.expunge_all()
+        page = infant_service.page(limit=1)
+        while page.next_cursor is not None:
+            page = infant_service.page(after=page.next_cursor, limit=1)
+
+    assert stats.cache_hits + stats.cache_misses == stats.count
+    assert stats.cache_misses <= len(stats.statements)
+
+
+def test_base_service_read_session(session: Session, read_engine: Engine, mocked_user_id: uuid.UUID):
+    infant_ids = add_infants(session, mocked_user_id, 2)
+    with Session(read_engine, expire_on_commit=False) as read_session:
+        infant_service = InfantService(session, mocked_user_id, read_session=read_session)
+
+        # the reads are made with the read session
+        infant = infant_service.get(infant_ids[0], options=[LOAD_PII])
+        assert infant in read_session and infant not in session
+        assert infant.full_name == "Infant 0"
+        assert infant_service.get_by_nhi_number("ABC0001").infant_id == infant_ids[1]
+        assert infant_service.count() == 2
+        assert [infant.infant_id for infant in infant_service.iter()] == sorted(infant_ids)
+
+        # which see the writes made since
+        infant_service.update(infant_ids[0], InfantUpdate(full_name="Renamed"))
+        assert infant_service.get(infant_ids[0]).full_name == "Renamed"
+        infant_service.create(
+            InfantCreate(full_name="Infant 2", nhi_number="ABC0002", birth_date="2024-01-01", due_date="2024-01-02")
+        )
+        assert infant_service.count() == 3
+
+        # objects read before a write are expired, not detached, so their deferred columns can still be loaded
+        infant = infant_service.get(infant_ids[1])
+        assert "full_name" not in infant.__dict__
+        infant_service.update(infant_ids[0], InfantUpdate(full_name="Renamed again"))
+        assert infant in read_session
+        assert infant.full_name == "Infant 1"
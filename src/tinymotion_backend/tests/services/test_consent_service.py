@@ -8,7 +8,7 @@ from freezegun import freeze_time
 
 from tinymotion_backend.services.consent_service import ConsentService
 from tinymotion_backend.models import ConsentCreateViaNHI, Infant
-from tinymotion_backend.core.exc import NotFoundError
+from tinymotion_backend.core.exc import NotFoundError, InvalidInputError
 
 
 def test_consent_service_create_consent_nhi(session: Session, client: TestClient, mocked_user_id: uuid.UUID):
@@ -66,3 +66,30 @@ def test_consent_service_create_consent_invalid_nhi(session: Session, client: Te
     )
     with pytest.raises(NotFoundError):
         consent_service.create_using_nhi_number(consent_in)
+
+
+def test_consent_service_create_many_using_nhi_number(session: Session, mocked_user_id: uuid.UUID):
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2023, 6, 1),
+        due_date=datetime.date(2023, 7, 1),
+        nhi_number="abcdefg",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+
+    consent_service = ConsentService(session, created_by=mocked_user_id)
+    result = consent_service.create_many_using_nhi_number([
+        ConsentCreateViaNHI(consent_giver_name="Giver", consent_giver_email="giver@test.com", nhi_number="abcdefg"),
+        ConsentCreateViaNHI(consent_giver_name="Giver", consent_giver_email="giver@test.com", nhi_number="notanhi"),
+        ConsentCreateViaNHI(consent_giver_name="Giver", nhi_number="abcdefg"),
+        ConsentCreateViaNHI(collected_physically=True, nhi_number="abcdefg"),
+    ])
+
+    assert isinstance(result.errors[1], NotFoundError)
+    assert isinstance(result.errors[2], InvalidInputError)
+    assert set(result.errors) == {1, 2}
+    assert result.items[0].infant_id == infant.infant_id
+    assert result.items[3].collected_physically
+    assert consent_service.count() == 2
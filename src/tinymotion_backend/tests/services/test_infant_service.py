@@ -8,7 +8,12 @@ from pydantic import ValidationError
 import sqlalchemy
 
 from tinymotion_backend.services.infant_service import InfantService
-from tinymotion_backend.models import InfantCreate
+from tinymotion_backend.services.consent_service import ConsentService
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.services.base import BulkResult, _write_in_batches
+from tinymotion_backend.models import (
+    InfantCreate, ConsentCreate, VideoCreate, VideoCreateViaNHI, VideoUpdate, Infant, Consent, Video, LOAD_PII,
+)
 
 
 def test_infant_service_create_user(session: Session, client: TestClient, mocked_user_id: uuid.UUID):
@@ -38,3 +43,119 @@ def test_infant_service_create_user_foreign_key_constraint_failed(
     with pytest.raises(sqlalchemy.exc.IntegrityError) as exc_info:
         infant_service.create(infant_in)
     assert "FOREIGN KEY constraint failed" in str(exc_info.value)
+
+
+def test_infant_service_pii_deferred(session: Session, mocked_user_id: uuid.UUID):
+    infant_service = InfantService(session, mocked_user_id)
+    infant_in = InfantCreate(full_name="An Infant", birth_date="2024-01-01", due_date="2024-01-02", nhi_number="123456")
+    infant_id = infant_service.create(infant_in).infant_id
+    pii_columns = {"full_name", "nhi_number", "birth_date", "due_date"}
+
+    # the encrypted columns are not loaded (or decrypted) until one of them is accessed
+    session.expunge_all()
+    infant = infant_service.get(infant_id)
+    assert pii_columns <= sqlalchemy.inspect(infant).unloaded
+    assert "nhi_number" not in infant.model_dump()
+    assert infant.full_name == "An Infant"
+    assert not pii_columns & sqlalchemy.inspect(infant).unloaded
+
+    # unless they are asked for up front
+    session.expunge_all()
+    infant = infant_service.get_by_nhi_number("123456", options=[LOAD_PII])
+    assert not pii_columns & sqlalchemy.inspect(infant).unloaded
+    assert infant.model_dump()["birth_date"] == datetime.date(2024, 1, 1)
+
+    session.expunge_all()
+    infants = infant_service.list()
+    assert pii_columns <= sqlalchemy.inspect(infants[0]).unloaded
+
+
+def test_infant_service_counters(session: Session, mocked_user_id: uuid.UUID):
+    infant_service = InfantService(session, mocked_user_id)
+    consent_service = ConsentService(session, mocked_user_id)
+    video_service = VideoService(session, mocked_user_id)
+    infant = infant_service.create(
+        InfantCreate(full_name="An Infant", birth_date="2024-01-01", due_date="2024-01-02", nhi_number="123456")
+    )
+    infant_id = infant.infant_id
+    sha256sum = "0" * 64
+
+    def counters() -> tuple[int, int, int]:
+        session.expire_all()
+        infant = infant_service.get(infant_id)
+        return infant.consent_count, infant.video_count, infant.video_bytes
+
+    assert counters() == (0, 0, 0)
+
+    consent = consent_service.create(ConsentCreate(infant_id=infant_id, collected_physically=True))
+    consent_service.create(ConsentCreate(infant_id=infant_id, collected_physically=True))
+    assert counters() == (2, 0, 0)
+
+    video = video_service.create(VideoCreate(infant_id=infant_id, video_name="a.mp4", sha256sum=sha256sum))
+    assert counters() == (2, 1, 0)
+    video_service.update(video.video_id, VideoUpdate(video_size=1000))
+    assert counters() == (2, 1, 1000)
+
+    # bulk inserts don't run the ORM events
+    result = video_service.create_many_using_nhi_number([
+        VideoCreateViaNHI(nhi_number="123456", video_name=f"{i}.mp4", sha256sum=sha256sum) for i in range(3)
+    ])
+    assert not result.errors
+    assert counters() == (2, 4, 1000)
+
+    video_service.delete(video.video_id)
+    consent_service.delete(consent.consent_id)
+    assert counters() == (1, 3, 0)
+
+    # counters changed behind the backend's back are repaired by recounting
+    session.exec(sqlalchemy.update(Infant).values(consent_count=5, video_bytes=-1))
+    session.commit()
+    assert infant_service.recount() == 1
+    assert counters() == (1, 3, 0)
+    assert infant_service.recount([infant_id]) == 0
+
+
+def test_infant_service_counters_loaded_infant(session: Session, mocked_user_id: uuid.UUID):
+    infant_service = InfantService(session, mocked_user_id)
+    infant = infant_service.create(
+        InfantCreate(full_name="An Infant", birth_date="2024-01-01", due_date="2024-01-02", nhi_number="123456")
+    )
+
+    # the infant loaded in the session is kept in step, including by bulk inserts which don't expire it otherwise
+    ConsentService(session, mocked_user_id).create_many(
+        [ConsentCreate(infant_id=infant.infant_id, collected_physically=True)] * 2
+    )
+    assert infant_service.get(infant.infant_id).consent_count == 2
+
+
+def test_infant_service_counters_batch_retried(session: Session, mocked_user_id: uuid.UUID):
+    infant_service = InfantService(session, mocked_user_id)
+    infant = infant_service.create(
+        InfantCreate(full_name="An Infant", birth_date="2024-01-01", due_date="2024-01-02", nhi_number="123456")
+    )
+    sha256sum = "0" * 64
+    ConsentService(session, mocked_user_id).create(ConsentCreate(infant_id=infant.infant_id, collected_physically=True))
+    VideoService(session, mocked_user_id).create(
+        VideoCreate(infant_id=infant.infant_id, video_name="a.mp4", sha256sum=sha256sum)
+    )
+    assert (infant.consent_count, infant.video_count) == (1, 1)
+
+    def write(session: Session, objs: list) -> list:
+        for obj in objs:
+            session.add(obj)
+            session.flush()
+        return objs
+
+    # the counters added before the duplicate video fails are rolled back and added again when the rows are retried
+    rows = [
+        Consent(infant_id=infant.infant_id, collected_physically=True, created_by=mocked_user_id),
+        Video(infant_id=infant.infant_id, video_name="b.mp4", sha256sum=sha256sum, created_by=mocked_user_id),
+        Video(infant_id=infant.infant_id, video_name="a.mp4", sha256sum=sha256sum, created_by=mocked_user_id),
+    ]
+    result = BulkResult(items=[None] * len(rows), errors={})
+    _write_in_batches(session, list(enumerate(rows)), write, len(rows), result)
+    assert list(result.errors) == [2]
+
+    assert (infant.consent_count, infant.video_count) == (2, 2)
+    session.refresh(infant)
+    assert (infant.consent_count, infant.video_count) == (2, 2)
@@ -0,0 +1,97 @@
+import uuid
+
+import pytest
+from sqlmodel import Session, select
+
+from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.consent_service import ConsentService
+from tinymotion_backend.services.user_service import UserService
+from tinymotion_backend.services.video_service import VideoService
+from tinymotion_backend.models import (
+    ConsentCreateViaNHI, InfantCreate, InfantUpdate, User, VideoCreateViaNHI, VideoUpdate,
+)
+from tinymotion_backend.core.instrumentation import assert_no_full_scans
+from tinymotion_backend.tests import mock_data
+
+
+SHA256SUM = "0" * 64
+
+
+@pytest.fixture(name="services")
+def services_fixture(session: Session, mocked_user_id: uuid.UUID) -> dict:
+    services = {
+        "user": UserService(session),
+        "infant": InfantService(session, mocked_user_id),
+        "consent": ConsentService(session, mocked_user_id),
+        "video": VideoService(session, mocked_user_id),
+    }
+
+    # a few rows in each table, so that the lookups have something to find
+    for i in range(3):
+        services["infant"].create(
+            InfantCreate(full_name=f"Infant {i}", nhi_number=f"ABC{i}", birth_date="2024-01-01", due_date="2024-01-02")
+        )
+        services["consent"].create_using_nhi_number(
+            ConsentCreateViaNHI(nhi_number=f"ABC{i}", collected_physically=True)
+        )
+        services["video"].create_using_nhi_number(
+            VideoCreateViaNHI(nhi_number=f"ABC{i}", video_name=f"{i}.mp4", sha256sum=SHA256SUM)
+        )
+
+    return services
+
+
+def test_query_plans_lookups(services: dict):
+    with assert_no_full_scans():
+        user = services["user"].get_by_access_key(mock_data.MOCK_USERS[0]["access_key"])
+        services["user"].get(user.user_id)
+
+        infant = services["infant"].get_by_nhi_number("ABC0")
+        services["infant"].get(infant.infant_id)
+        services["infant"].get_ids_by_nhi_numbers(["ABC0", "ABC1", "XYZ"])
+        services["infant"].existing_ids([infant.infant_id, uuid.uuid4()])
+
+        services["video"].get_by_video_name("0.mp4")
+        services["video"].get_infant_for_upload("ABC0")
+
+
+def test_query_plans_pages(services: dict):
+    with assert_no_full_scans():
+        for service in services.values():
+            page = service.page(limit=1)
+            while page.next_cursor is not None:
+                page = service.page(after=page.next_cursor, limit=1)
+            service.page(limit=1, descending=True)
+
+
+def test_query_plans_writes(services: dict):
+    with assert_no_full_scans():
+        infant = services["infant"].get_by_nhi_number("ABC0")
+        services["infant"].update(infant.infant_id, InfantUpdate(full_name="Renamed"))
+
+        consent = services["consent"].create_using_nhi_number(
+            ConsentCreateViaNHI(nhi_number="ABC0", collected_physically=True)
+        )
+        video = services["video"].create_using_nhi_number(
+            VideoCreateViaNHI(nhi_number="ABC0", video_name="new.mp4", sha256sum=SHA256SUM)
+        )
+        services["video"].update(video.video_id, VideoUpdate(video_size=100))
+        services["video"].create_many_using_nhi_number([
+            VideoCreateViaNHI(nhi_number=f"ABC{i}", video_name=f"many{i}.mp4", sha256sum=SHA256SUM) for i in range(3)
+        ])
+
+        services["video"].delete(video.video_id)
+        services["consent"].delete(consent.consent_id)
+        # also deletes (and so loads) the infant's consents and videos
+        services["infant"].delete(infant.infant_id)
+
+
+def test_query_plans_full_scan_detected(session: Session):
+    with pytest.raises(AssertionError, match="1 queries scanned a whole table"):
+        with assert_no_full_scans() as full_scans:
+            session.exec(select(User).where(User.disabled == False)).all()  # noqa: E712
+    assert [scan.table for scan in full_scans] == ["user"]
+
+    # only the given tables are checked
+    with assert_no_full_scans(tables=["infant"]):
+        session.exec(select(User).where(User.disabled == False)).all()  # noqa: E712
@@ -3,9 +3,10 @@ from sqlmodel import Session
 import pytest
 
 from tinymotion_backend.services.user_service import UserService
-from tinymotion_backend.models import UserCreate
+from tinymotion_backend.models import User, UserCreate, UserUpdate
 from tinymotion_backend.tests import mock_data
 from tinymotion_backend.core.exc import UniqueConstraintError
+from tinymotion_backend.core.instrumentation import track_queries
 
 
 def test_user_service_create_user(session: Session):
@@ -23,3 +24,20 @@ def test_user_service_create_user_duplicate_access_key(session: Session):
     user_in = UserCreate(email="new@test.com", access_key=mock_data.MOCK_USERS[0]["access_key"])
     with pytest.raises(UniqueConstraintError):
         user_service.create(user_in)
+
+
+def test_user_service_update_blind_index(session: Session):
+    user_service = UserService(session)
+    user = user_service.create(UserCreate(email="test@example.com", access_key="myverysecretkey"))
+    session.expunge_all()
+
+    # changing another column doesn't load the (deferred) access key to recompute its blind index
+    user = session.get(User, user.user_id)
+    user.disabled = True
+    with track_queries() as stats:
+        session.commit()
+    assert list(stats.statements) == ["UPDATE user SET disabled=? WHERE user.user_id = ?"]
+
+    # changing the access key does update it
+    user_service.update(user.user_id, UserUpdate(access_key="mynewsecretkey"))
+    assert user_service.get_by_access_key("mynewsecretkey").user_id == user.user_id
@@ -1,3 +1,5 @@
+import os
+import io
 import datetime
 import uuid
 
@@ -7,8 +9,12 @@ from sqlmodel import Session
 from freezegun import freeze_time
 
 from tinymotion_backend.services.video_service import VideoService
-from tinymotion_backend.models import VideoCreateViaNHI, Infant, Consent
-from tinymotion_backend.core.exc import NotFoundError, NoConsentError
+from tinymotion_backend.models import VideoCreateViaNHI, VideoCreateBatch, Infant, Consent, Video
+from tinymotion_backend.core import storage
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.encryption import encrypt_file, decrypt_stream
+from tinymotion_backend.core.exc import NotFoundError, NoConsentError, UniqueConstraintError
+from tinymotion_backend.core.instrumentation import assert_max_queries
 
 
 def test_video_service_create_video_nhi(session: Session, client: TestClient, mocked_user_id: uuid.UUID):
@@ -41,7 +47,8 @@ def test_video_service_create_video_nhi(session: Session, client: TestClient, mo
         sha256sum="qwertyuiopasdfghjklzxcvbnm123456qwertyuiopasdfghjklzxcvbnm123456",
         nhi_number="abcdefg",
     )
-    with freeze_time("2024-03-01 16:31:23"):
+    # look up the infant, insert the video, update the infant's counters and read the video back
+    with freeze_time("2024-03-01 16:31:23"), assert_max_queries(4):
         video = video_service.create_using_nhi_number(video_in)
     assert video.video_name == "myvideo.mp4"
     assert video.sha256sum == "qwertyuiopasdfghjklzxcvbnm123456qwertyuiopasdfghjklzxcvbnm123456"
@@ -109,3 +116,239 @@ def test_video_service_create_video_no_consent(session: Session, client: TestCli
 
     with pytest.raises(NoConsentError):
         video_service.create_using_nhi_number(video_in)
+
+
+def test_video_service_create_batch(session: Session, client: TestClient, mocked_user_id: uuid.UUID):
+    # create an infant with a consent
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2023, 6, 1),
+        due_date=datetime.date(2023, 7, 1),
+        nhi_number="abcdefg",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+    consent = Consent(
+        consent_giver_name="Consent Giver",
+        consent_giver_email="consent@test.com",
+        infant_id=infant.infant_id,
+        created_by=mocked_user_id,
+    )
+    session.add(consent)
+    session.commit()
+
+    video_service = VideoService(session, created_by=mocked_user_id)
+    upload_infant = video_service.get_infant_for_upload("abcdefg")
+    assert upload_infant.infant_id == infant.infant_id
+
+    videos_in = [
+        VideoCreateBatch(
+            video_name=f"myvideo{i}.mp4.enc",
+            sha256sum="a" * 64,
+            video_size=100 + i,
+            sha256sum_enc="b" * 64,
+        )
+        for i in range(3)
+    ]
+    videos = video_service.create_batch(upload_infant, videos_in)
+    assert len(videos) == 3
+    for i, video in enumerate(videos):
+        assert video.video_name == f"myvideo{i}.mp4.enc"
+        assert video.video_size == 100 + i
+        assert video.infant_id == infant.infant_id
+        assert video.created_by == mocked_user_id
+
+    # a duplicate name fails the whole batch
+    videos_in = [
+        VideoCreateBatch(video_name="another.mp4.enc", sha256sum="a" * 64, video_size=1, sha256sum_enc="b" * 64),
+        VideoCreateBatch(video_name="myvideo0.mp4.enc", sha256sum="a" * 64, video_size=1, sha256sum_enc="b" * 64),
+    ]
+    with pytest.raises(UniqueConstraintError):
+        video_service.create_batch(upload_infant, videos_in)
+    assert len(video_service.list()) == 3
+
+
+def test_video_service_get_infant_for_upload_no_consent(session: Session, client: TestClient,
+                                                        mocked_user_id: uuid.UUID):
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2023, 6, 1),
+        due_date=datetime.date(2023, 7, 1),
+        nhi_number="abcdefg",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+
+    video_service = VideoService(session, created_by=mocked_user_id)
+    with pytest.raises(NoConsentError):
+        video_service.get_infant_for_upload("abcdefg")
+    with pytest.raises(NotFoundError):
+        video_service.get_infant_for_upload("abcdefh")
+
+
+def test_video_service_move_to_cold_storage(session: Session, client: TestClient, mocked_user_id: uuid.UUID,
+                                            tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    # small packs so that the videos are split over several packs
+    monkeypatch.setattr(settings, "VIDEO_PACK_MAX_SIZE_BYTES", 6000)
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2023, 6, 1),
+        due_date=datetime.date(2023, 7, 1),
+        nhi_number="abcdefg",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+
+    # store some encrypted videos, all but the last one are old
+    contents = [os.urandom(2000 + i) for i in range(4)]
+    created = [datetime.datetime(2024, 1, 1 + i, tzinfo=datetime.timezone.utc) for i in range(3)]
+    created.append(datetime.datetime.now(datetime.timezone.utc))
+    for i, (content, created_at) in enumerate(zip(contents, created)):
+        video_name = f"video{i}.mp4.enc"
+        orig_hash, enc_hash = encrypt_file(io.BytesIO(content), os.path.join(settings.VIDEO_LIBRARY_PATH, video_name))
+        session.add(Video(
+            video_name=video_name,
+            sha256sum=orig_hash,
+            sha256sum_enc=enc_hash,
+            video_size=os.path.getsize(os.path.join(settings.VIDEO_LIBRARY_PATH, video_name)),
+            infant_id=infant.infant_id,
+            created_by=mocked_user_id,
+            created_at=created_at,
+        ))
+    session.commit()
+
+    video_service = VideoService(session, created_by=None)
+    # small batches so that the videos are committed in several batches
+    older_than = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+    assert video_service.move_to_cold_storage(older_than, batch_size=2) == 3
+    assert len([name for name in os.listdir(settings.VIDEO_COLD_STORAGE_PATH) if name.endswith(".pack")]) == 2
+    assert os.listdir(settings.VIDEO_LIBRARY_PATH) == ["video3.mp4.enc"]
+
+    # all videos can still be read and decrypted
+    for i, content in enumerate(contents):
+        video = video_service.get_by_video_name(f"video{i}.mp4.enc")
+        assert video.storage_tier == ("cold" if i < 3 else "hot")
+        with storage.open_video(video) as fin:
+            decrypt_stream(fin, str(tmp_path / "out.mp4"))
+        assert (tmp_path / "out.mp4").read_bytes() == content
+
+    # nothing left to move
+    assert video_service.move_to_cold_storage(older_than) == 0
+
+
+def test_video_service_create_many_using_nhi_number(session: Session, mocked_user_id: uuid.UUID):
+    infants = []
+    for nhi_number in ["abcdefg", "nocnsnt"]:
+        infant = Infant(
+            full_name="An Infant",
+            birth_date=datetime.date(2023, 6, 1),
+            due_date=datetime.date(2023, 7, 1),
+            nhi_number=nhi_number,
+            created_by=mocked_user_id,
+        )
+        session.add(infant)
+        infants.append(infant)
+    session.commit()
+    session.add(Consent(collected_physically=True, infant_id=infants[0].infant_id, created_by=mocked_user_id))
+    session.commit()
+
+    video_service = VideoService(session, created_by=mocked_user_id)
+    sha256sum = "a" * 64
+    result = video_service.create_many_using_nhi_number([
+        VideoCreateViaNHI(video_name="video1.mp4", sha256sum=sha256sum, nhi_number="abcdefg"),
+        VideoCreateViaNHI(video_name="video2.mp4", sha256sum=sha256sum, nhi_number="nocnsnt"),
+        VideoCreateViaNHI(video_name="video3.mp4", sha256sum=sha256sum, nhi_number="notanhi"),
+        VideoCreateViaNHI(video_name="video1.mp4", sha256sum=sha256sum, nhi_number="abcdefg"),
+        VideoCreateViaNHI(video_name="video4.mp4", sha256sum=sha256sum, nhi_number="abcdefg"),
+    ])
+
+    assert isinstance(result.errors[1], NoConsentError)
+    assert isinstance(result.errors[2], NotFoundError)
+    assert isinstance(result.errors[3], UniqueConstraintError)
+    assert set(result.errors) == {1, 2, 3}
+    assert result.items[4].infant_id == infants[0].infant_id
+    assert result.items[4].created_by == mocked_user_id
+    assert video_service.count() == 2
+
+
+def test_video_service_compact_cold_storage(session: Session, mocked_user_id: uuid.UUID, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_LIBRARY_PATH", str(tmp_path / "videos"))
+    monkeypatch.setattr(settings, "VIDEO_COLD_STORAGE_PATH", str(tmp_path / "cold"))
+    # two videos per pack
+    monkeypatch.setattr(settings, "VIDEO_PACK_MAX_SIZE_BYTES", 6000)
+    os.makedirs(settings.VIDEO_LIBRARY_PATH)
+
+    infant = Infant(
+        full_name="An Infant",
+        birth_date=datetime.date(2023, 6, 1),
+        due_date=datetime.date(2023, 7, 1),
+        nhi_number="abcdefg",
+        created_by=mocked_user_id,
+    )
+    session.add(infant)
+    session.commit()
+    session.refresh(infant)
+
+    contents = [os.urandom(2000 + i) for i in range(4)]
+    encrypted = []
+    for i, content in enumerate(contents):
+        video_path = os.path.join(settings.VIDEO_LIBRARY_PATH, f"video{i}.mp4.enc")
+        orig_hash, enc_hash = encrypt_file(io.BytesIO(content), video_path)
+        with open(video_path, "rb") as fh:
+            encrypted.append(fh.read())
+        session.add(Video(
+            video_name=f"video{i}.mp4.enc",
+            sha256sum=orig_hash,
+            sha256sum_enc=enc_hash,
+            video_size=len(encrypted[-1]),
+            infant_id=infant.infant_id,
+            created_by=mocked_user_id,
+            created_at=datetime.datetime(2024, 1, 1 + i, tzinfo=datetime.timezone.utc),
+        ))
+    session.commit()
+
+    video_service = VideoService(session, created_by=None)
+    video_service.move_to_cold_storage(datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc))
+    old_packs = storage.list_packs()
+    assert len(old_packs) == 2
+    assert video_service.compact_cold_storage() == (0, 0)
+
+    # the first pack keeps one of its videos, the second none
+    for i in range(1, 4):
+        video_service.delete(video_service.get_by_video_name(f"video{i}.mp4.enc").video_id)
+
+    # a pack whose videos can't be copied is kept as it is
+    video = video_service.get_by_video_name("video0.mp4.enc")
+    sha256sum_enc = video.sha256sum_enc
+    video.sha256sum_enc = "0" * 64
+    session.add(video)
+    session.commit()
+    assert video_service.compact_cold_storage() == (1, len(encrypted[2]) + len(encrypted[3]))
+    assert storage.list_packs() == old_packs[:1]
+
+    video.sha256sum_enc = sha256sum_enc
+    session.add(video)
+    session.commit()
+    assert video_service.compact_cold_storage() == (1, len(encrypted[1]))
+    assert video_service.compact_cold_storage() == (0, 0)
+
+    # only the remaining video is left in cold storage, and it can still be read
+    packs = storage.list_packs()
+    assert len(packs) == 1 and packs[0] not in old_packs
+    assert sorted(os.listdir(settings.VIDEO_COLD_STORAGE_PATH)) == [packs[0], packs[0] + ".idx"]
+    with open(storage.pack_file_path(packs[0]), "rb") as fh:
+        assert fh.read() == encrypted[0]
+    video = video_service.get_by_video_name("video0.mp4.enc")
+    assert (video.pack_name, video.pack_offset) == (packs[0], 0)
+    with storage.open_video(video) as fin:
+        decrypt_stream(fin, str(tmp_path / "out.mp4"))
+    assert (tmp_path / "out.mp4").read_bytes() == contents[0]
@@ -0,0 +1,245 @@
+import time
+import asyncio
+import threading
+
+import pytest
+import sqlalchemy
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tinymotion_backend import database, models
+from tinymotion_backend.core.config import settings
+from tinymotion_backend.core.exc import UniqueConstraintError, NotFoundError
+from tinymotion_backend.database import create_db_engine
+from tinymotion_backend.services.user_service import AsyncUserService, UserService
+from tinymotion_backend.services import write_coordinator
+from tinymotion_backend.services.write_coordinator import WriteCoordinator, stop_write_coordinators
+
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(name="use_coordinator")
+def use_coordinator_fixture(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_WRITE_COORDINATOR", True)
+    yield
+    stop_write_coordinators()
+
+
+def add_user(access_key: str):
+    def _write(session: Session) -> models.User:
+        user = models.User(email=f"{access_key}@example.com", access_key=access_key)
+        session.add(user)
+        session.flush()
+        return user
+
+    return _write
+
+
+def run_threads(target, count: int):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def count_users(engine) -> int:
+    """Number of users committed, as seen by another connection"""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("select count(*) from user").scalar()
+
+
+def test_write_coordinator_group_commit(file_engine):
+    coordinator = WriteCoordinator(file_engine, max_batch_size=100, max_batch_delay=0.05)
+    # the first write holds up the writer thread until the others are waiting, so they make one batch
+    started, release = threading.Event(), threading.Event()
+    first = add_user("first")
+
+    def _first(session: Session) -> models.User:
+        started.set()
+        release.wait()
+        return first(session)
+
+    first_thread = threading.Thread(target=coordinator.submit, args=(_first,))
+    first_thread.start()
+    started.wait()
+
+    # while the batch is written, none of its writes (each released from its savepoint) is committed yet
+    visible = []
+
+    def _check(write):
+        def _write(session: Session) -> models.User:
+            user = write(session)
+            visible.append(count_users(file_engine))
+            return user
+
+        return _write
+
+    results = [None] * 5
+
+    def _submit(i):
+        results[i] = coordinator.submit(_check(add_user(f"key{i}")))
+
+    threads = [threading.Thread(target=_submit, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    while coordinator._queue.qsize() < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in [first_thread, *threads]:
+        thread.join()
+    coordinator.stop()
+
+    assert sorted(user.access_key for user in results) == sorted(f"key{i}" for i in range(5))
+    assert visible == [1] * 5
+    assert count_users(file_engine) == 6
+
+
+def test_write_coordinator_rolled_back_batch_retried(file_engine, monkeypatch):
+    coordinator = WriteCoordinator(file_engine, max_batch_size=100, max_batch_delay=0.05)
+    # the first commit of a batch fails, after its writes have been made
+    commits = []
+
+    def _commit(session_commit):
+        def _failing_commit(self):
+            commits.append(self)
+            if len(commits) == 1:
+                raise sqlalchemy.exc.OperationalError("commit", {}, Exception("disk I/O error"))
+            return session_commit(self)
+
+        return _failing_commit
+
+    monkeypatch.setattr(Session, "commit", _commit(Session.commit))
+    results = [None] * 3
+
+    def _submit(i):
+        results[i] = coordinator.submit(add_user(f"key{i}"))
+
+    run_threads(_submit, 3)
+    coordinator.stop()
+
+    # each write was committed exactly once, by the retries
+    assert sorted(user.access_key for user in results) == ["key0", "key1", "key2"]
+    assert count_users(file_engine) == 3
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_write_coordinator_stopped(file_engine, monkeypatch):
+    coordinator = WriteCoordinator(file_engine, max_batch_size=100, max_batch_delay=0.05)
+    coordinator.stop()
+    with pytest.raises(RuntimeError, match="write coordinator has stopped"):
+        coordinator.submit(add_user("key0"))
+
+    # the writer thread dies with writes waiting
+    coordinator = WriteCoordinator(file_engine, max_batch_size=100, max_batch_delay=0.05)
+
+    def _crash(batch):
+        raise SystemExit()
+
+    monkeypatch.setattr(coordinator, "_commit_batch", _crash)
+    with pytest.raises(RuntimeError, match="write coordinator has stopped"):
+        coordinator.submit(add_user("key0"))
+    with pytest.raises(RuntimeError, match="write coordinator has stopped"):
+        coordinator.submit(add_user("key1"))
+    assert count_users(file_engine) == 0
+
+
+def test_write_coordinator_failed_write_isolated(file_engine):
+    coordinator = WriteCoordinator(file_engine, max_batch_size=100, max_batch_delay=0.05)
+    coordinator.submit(add_user("key0"))
+    results = []
+    errors = []
+
+    def _submit(i):
+        # key0 already exists so the first write fails
+        try:
+            results.append(coordinator.submit(add_user(f"key{i}")))
+        except Exception as exc:
+            errors.append(exc)
+
+    run_threads(_submit, 4)
+    coordinator.stop()
+
+    assert len(errors) == 1
+    assert "UNIQUE constraint failed" in str(errors[0])
+    assert sorted(user.access_key for user in results) == ["key1", "key2", "key3"]
+    with Session(file_engine) as session:
+        assert len(session.exec(select(models.User)).all()) == 4
+
+
+def test_service_writes_through_coordinator(file_engine, use_coordinator):
+    with Session(file_engine) as session:
+        user_service = UserService(session)
+        user = user_service.create(models.UserCreate(email="user@example.com", access_key="key0"))
+        assert user.user_id is not None
+        assert user_service.get(user.user_id).email == "user@example.com"
+
+        with pytest.raises(UniqueConstraintError):
+            user_service.create(models.UserCreate(email="other@example.com", access_key="key0"))
+
+        updated = user_service.update(user.user_id, models.UserUpdate(disabled=True))
+        assert updated.disabled
+        assert user_service.get(user.user_id).disabled
+
+        user_id = user.user_id
+        user_service.delete(user_id)
+        with pytest.raises(NotFoundError):
+            user_service.get(user_id)
+        with pytest.raises(NotFoundError):
+            user_service.update(user_id, models.UserUpdate(disabled=False))
+
+
+def test_async_service_writes_through_coordinator(file_engine, use_coordinator, monkeypatch):
+    monkeypatch.setattr(database, "engine", file_engine)
+    async_engine = database.create_async_db_engine(database.async_database_uri(str(file_engine.url)))
+
+    async def _test():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            user_service = AsyncUserService(session)
+            users = [
+                await user_service.create(models.UserCreate(email=f"user{i}@example.com", access_key=f"key{i}"))
+                for i in range(3)
+            ]
+            # the writes were made by the coordinator of the synchronous engine, and merged into the session
+            assert file_engine in write_coordinator._coordinators
+            assert all(user in session for user in users)
+            assert (await user_service.get(users[0].user_id)).email == "user0@example.com"
+            user_ids = [user.user_id for user in users]
+
+            with pytest.raises(UniqueConstraintError):
+                await user_service.create(models.UserCreate(email="other@example.com", access_key="key0"))
+
+            updated = await user_service.update(user_ids[0], models.UserUpdate(disabled=True))
+            assert updated.disabled
+            await user_service.delete(user_ids[1])
+            with pytest.raises(NotFoundError):
+                await user_service.get(user_ids[1])
+
+        await async_engine.dispose()
+
+    asyncio.run(_test())
+
+    assert count_users(file_engine) == 2
+
+
+def test_service_concurrent_writes_through_coordinator(file_engine, use_coordinator):
+    errors = []
+
+    def _create(i):
+        with Session(file_engine) as session:
+            try:
+                UserService(session).create(models.UserCreate(email=f"user{i}@example.com", access_key=f"key{i % 5}"))
+            except UniqueConstraintError as exc:
+                errors.append(exc)
+
+    run_threads(_create, 20)
+
+    assert len(errors) == 15
+    with Session(file_engine) as session:
+        assert len(session.exec(select(models.User)).all()) == 5
@@ -0,0 +1,197 @@
+import datetime
+import uuid
+
+import pytest
+import sqlalchemy
+from alembic import command
+from alembic.config import Config
+from sqlalchemy_utils import StringEncryptedType, UUIDType
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+from sqlmodel import Session, select
+
+from tinymotion_backend import database, models
+from tinymotion_backend.core.blind_index import blind_index
+from tinymotion_backend.core.config import settings
+
+
+def encrypted_string() -> StringEncryptedType:
+    return StringEncryptedType(sqlalchemy.VARCHAR, settings.DATABASE_SECRET_KEY, AesEngine, 'pkcs5')
+
+
+@pytest.fixture(name="migration_engine")
+def migration_engine_fixture(tmp_path, monkeypatch):
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_migrations_upgrade_downgrade(alembic_config: Config, migration_engine):
+    command.upgrade(alembic_config, "head")
+    command.downgrade(alembic_config, "base")
+    command.upgrade(alembic_config, "head")
+
+
+def test_migration_backfills_blind_indexes(alembic_config: Config, migration_engine):
+    command.upgrade(alembic_config, "3faaf18c4161")
+
+    # more rows than the backfill batch size
+    user_table = sqlalchemy.table(
+        "user",
+        sqlalchemy.column("user_id", UUIDType(binary=False)),
+        sqlalchemy.column("email", encrypted_string()),
+        sqlalchemy.column("access_key", encrypted_string()),
+    )
+    infant_table = sqlalchemy.table(
+        "infant",
+        sqlalchemy.column("infant_id", UUIDType(binary=False)),
+        sqlalchemy.column("created_at", sqlalchemy.DateTime()),
+        sqlalchemy.column("created_by", UUIDType(binary=False)),
+        sqlalchemy.column("full_name", encrypted_string()),
+        sqlalchemy.column("nhi_number", encrypted_string()),
+        sqlalchemy.column("birth_date", encrypted_string()),
+        sqlalchemy.column("due_date", encrypted_string()),
+    )
+    user_ids = [uuid.uuid4() for _ in range(2500)]
+    with migration_engine.begin() as conn:
+        conn.execute(user_table.insert(), [
+            {"user_id": user_id, "email": f"user{i}@example.com", "access_key": f"key{i}"}
+            for i, user_id in enumerate(user_ids)
+        ])
+        conn.execute(infant_table.insert(), [
+            {
+                "infant_id": uuid.uuid4(),
+                "created_at": datetime.datetime(2024, 1, 1),
+                "created_by": user_ids[0],
+                "full_name": "An Infant",
+                "nhi_number": f"NHI{i}",
+                "birth_date": "2024-01-01",
+                "due_date": "2024-01-02",
+            }
+            for i in range(3)
+        ])
+
+    command.upgrade(alembic_config, "head")
+
+    with Session(migration_engine) as session:
+        users = session.exec(select(models.User)).all()
+        assert len(users) == 2500
+        assert all(user.access_key_bidx == blind_index(user.access_key) for user in users)
+        infants = session.exec(select(models.Infant)).all()
+        assert sorted(infant.nhi_number_bidx for infant in infants) == sorted(blind_index(f"NHI{i}") for i in range(3))
+
+
+def test_migrations_offline(alembic_config: Config, monkeypatch, capsys):
+    # SQL scripts are generated for PostgreSQL (SQLite's batch mode needs the live database)
+    monkeypatch.setattr(settings, "DATABASE_URI", "postgresql://tinymotion@localhost/tinymotion")
+    command.upgrade(alembic_config, "3faaf18c4161:b83fb7a90c1c", sql=True)
+
+    # the blind indexes can't be computed in the script, so they are left out
+    script = capsys.readouterr().out
+    assert "-- infant.nhi_number_bidx is not filled in for existing rows" in script
+    assert "ALTER TABLE infant ALTER COLUMN nhi_number_bidx SET NOT NULL" in script
+
+    # nor can the values be re-encrypted when downgrading from binary columns
+    command.downgrade(alembic_config, "28bde77155ea:b83fb7a90c1c", sql=True)
+    script = capsys.readouterr().out
+    assert "-- infant values are not converted back to the legacy format" in script
+
+
+def test_migration_encrypted_columns_to_binary(alembic_config: Config, migration_engine):
+    command.upgrade(alembic_config, "b83fb7a90c1c")
+    user_table = sqlalchemy.table(
+        "user",
+        sqlalchemy.column("user_id", UUIDType(binary=False)),
+        sqlalchemy.column("email", encrypted_string()),
+        sqlalchemy.column("access_key", encrypted_string()),
+        sqlalchemy.column("access_key_bidx", sqlalchemy.String()),
+    )
+    user_ids = [uuid.uuid4() for _ in range(2)]
+    with migration_engine.begin() as conn:
+        conn.execute(user_table.insert(), [
+            {"user_id": user_id, "email": f"user{i}@example.com", "access_key": f"key{i}",
+             "access_key_bidx": blind_index(f"key{i}")}
+            for i, user_id in enumerate(user_ids)
+        ])
+
+    command.upgrade(alembic_config, "head")
+
+    # values in the old format can still be read, and are rewritten in the new format when updated
+    with Session(migration_engine) as session:
+        user = session.get(models.User, user_ids[0])
+        assert user.email == "user0@example.com"
+        assert user.access_key == "key0"
+        user.email = "updated@example.com"
+        session.add(user)
+        session.commit()
+    with migration_engine.connect() as conn:
+        emails = dict(conn.execute(sqlalchemy.text("select user_id, email from user")).all())
+    assert emails[user_ids[0].bytes][:1] == b"\x01"
+
+    command.downgrade(alembic_config, "b83fb7a90c1c")
+
+    with migration_engine.connect() as conn:
+        users = {row.user_id: row for row in conn.execute(sqlalchemy.select(user_table)).all()}
+    assert users[user_ids[0]].email == "updated@example.com"
+    assert users[user_ids[1]].email == "user1@example.com"
+    assert users[user_ids[1]].access_key == "key1"
+
+
+def test_migration_uuids_to_binary(alembic_config: Config, migration_engine):
+    command.upgrade(alembic_config, "18c65669be67")
+
+    def table(name: str, *columns: str) -> sqlalchemy.TableClause:
+        return sqlalchemy.table(name, *[
+            sqlalchemy.column(column, UUIDType(binary=False)) if column.endswith(("_id", "_by")) else
+            sqlalchemy.column(column) for column in columns
+        ])
+
+    user_table = table("user", "user_id", "email", "access_key", "access_key_bidx")
+    infant_table = table(
+        "infant", "infant_id", "created_at", "created_by", "full_name", "nhi_number", "nhi_number_bidx", "birth_date",
+        "due_date",
+    )
+    consent_table = table("consent", "consent_id", "infant_id", "created_at", "created_by", "collected_physically")
+    video_table = table("video", "video_id", "infant_id", "created_at", "created_by", "video_name", "sha256sum")
+
+    # more users than the conversion batch size
+    user_ids = [uuid.uuid4() for _ in range(2500)]
+    infant_id, consent_id, video_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    created_at = datetime.datetime(2024, 1, 1)
+    with migration_engine.begin() as conn:
+        conn.execute(user_table.insert(), [
+            {"user_id": user_id, "email": b"x", "access_key": b"x", "access_key_bidx": user_id.hex}
+            for user_id in user_ids
+        ])
+        conn.execute(infant_table.insert(), [{
+            "infant_id": infant_id, "created_at": created_at, "created_by": user_ids[-1], "full_name": b"x",
+            "nhi_number": b"x", "nhi_number_bidx": "x", "birth_date": b"x", "due_date": b"x",
+        }])
+        conn.execute(consent_table.insert(), [{
+            "consent_id": consent_id, "infant_id": infant_id, "created_at": created_at, "created_by": user_ids[0],
+            "collected_physically": True,
+        }])
+        conn.execute(video_table.insert(), [{
+            "video_id": video_id, "infant_id": infant_id, "created_at": created_at, "created_by": user_ids[1],
+            "video_name": "a.mp4", "sha256sum": "0" * 64,
+        }])
+
+    command.upgrade(alembic_config, "head")
+
+    with migration_engine.connect() as conn:
+        assert conn.execute(sqlalchemy.text("select count(*) from user where typeof(user_id) != 'blob'")).scalar() == 0
+        assert conn.execute(sqlalchemy.text("select length(created_by) from infant")).scalar() == 16
+    with Session(migration_engine) as session:
+        assert len(session.exec(select(models.User.user_id)).all()) == 2500
+        infant = session.get(models.Infant, infant_id)
+        assert infant.created_by == user_ids[-1]
+        assert [consent.consent_id for consent in infant.consents] == [consent_id]
+        assert [video.video_id for video in infant.videos] == [video_id]
+        assert session.get(models.Video, video_id).created_by == user_ids[1]
+
+    command.downgrade(alembic_config, "18c65669be67")
+
+    with migration_engine.connect() as conn:
+        assert set(conn.execute(sqlalchemy.select(user_table.c.user_id)).scalars()) == set(user_ids)
+        assert conn.execute(sqlalchemy.select(consent_table.c.created_by)).scalar() == user_ids[0]
+        assert conn.execute(sqlalchemy.text("select video_id from video")).scalar() == video_id.hex
@@ -0,0 +1,82 @@
+"""
+Tests against a real PostgreSQL server, skipped unless TINYMOTION_TEST_POSTGRES_URI is set.
+
+The tables are created by running the alembic migrations, and dropped again afterwards
+by downgrading, so the database should be an empty one dedicated to testing.
+
+"""
+import os
+import uuid
+
+import pytest
+import sqlalchemy
+from alembic import command
+from alembic.config import Config
+from sqlmodel import Session
+
+from tinymotion_backend import database, models
+from tinymotion_backend.core.exc import UniqueConstraintError
+from tinymotion_backend.services.infant_service import InfantService
+from tinymotion_backend.services.user_service import UserService
+
+
+POSTGRES_URI = os.environ.get("TINYMOTION_TEST_POSTGRES_URI")
+
+pytestmark = pytest.mark.skipif(POSTGRES_URI is None, reason="TINYMOTION_TEST_POSTGRES_URI is not set")
+
+
+@pytest.fixture(name="pg_engine")
+def pg_engine_fixture(alembic_config: Config):
+    engine = database.create_db_engine(POSTGRES_URI)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "engine", engine)
+        command.upgrade(alembic_config, "head")
+        yield engine
+        command.downgrade(alembic_config, "base")
+
+    engine.dispose()
+
+
+@pytest.fixture(name="pg_session")
+def pg_session_fixture(pg_engine):
+    with Session(pg_engine) as session:
+        yield session
+
+    with pg_engine.begin() as conn:
+        for table in ("video", "consent", "infant", '"user"'):
+            conn.execute(sqlalchemy.text(f"delete from {table}"))
+
+
+def test_postgres_migrations_match_models(pg_engine):
+    inspector = sqlalchemy.inspect(pg_engine)
+    for table in models.SQLModel.metadata.sorted_tables:
+        db_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert db_columns == {column.name for column in table.columns}
+
+
+def test_postgres_services(pg_session):
+    user_service = UserService(pg_session)
+    user = user_service.create(models.UserCreate(email="user@example.com", access_key="key0"))
+    assert user_service.get_by_access_key("key0").user_id == user.user_id
+
+    with pytest.raises(UniqueConstraintError):
+        user_service.create(models.UserCreate(email="other@example.com", access_key="key0"))
+
+    infant_service = InfantService(pg_session, user.user_id)
+    infant = infant_service.create(models.InfantCreate(
+        full_name="An Infant",
+        birth_date="2024-01-01",
+        due_date="2024-01-02",
+        nhi_number="ABC1234",
+    ))
+    assert infant_service.get_by_nhi_number("ABC1234").infant_id == infant.infant_id
+
+    # foreign key violations are not reported as unique constraint errors
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        InfantService(pg_session, uuid.uuid4()).create(models.InfantCreate(
+            full_name="Another Infant",
+            birth_date="2024-01-01",
+            due_date="2024-01-02",
+            nhi_number="XYZ9876",
+        ))